@@ -17,12 +17,14 @@ fileConfig(config.config_file_name)
 # Import your models here so that 'autogenerate' can detect them
 from sqlmodel import SQLModel
 import app.models  # noqa: F401 (ensure models are imported)
+from app.database import sync_url
 
 target_metadata = SQLModel.metadata
 
 
 def get_url():
-    return os.environ.get("DATABASE_URL") or "sqlite:///./database.db"
+    # Migrations always run on the sync driver, even for async DATABASE_URLs.
+    return sync_url(os.environ.get("DATABASE_URL") or "sqlite:///./database.db")
 
 
 def run_migrations_offline():
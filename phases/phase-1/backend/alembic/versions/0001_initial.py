@@ -1,18 +1,60 @@
 """initial
 
 Revision ID: 0001_initial
-Revises: 
+Revises:
 Create Date: 2026-01-07
+
+Databases created by `init_db` (`create_all`) before migrations existed
+already have these tables; they are left as they are, so `alembic upgrade
+head` works on those too.
 """
 
 from alembic import op
 import sqlalchemy as sa
+import sqlmodel
+
+revision = "0001_initial"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
 
 
 def upgrade():
-    # Placeholder initial migration - use `alembic revision --autogenerate` locally
-    pass
+    if not _has_table("user"):
+        op.create_table(
+            "user",
+            sa.Column("id", sqlmodel.sql.sqltypes.GUID(), nullable=False),
+            sa.Column("username", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+            sa.Column("token", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_user_id", "user", ["id"])
+        op.create_index("ix_user_username", "user", ["username"], unique=True)
+        op.create_index("ix_user_token", "user", ["token"])
+    if not _has_table("todo"):
+        op.create_table(
+            "todo",
+            sa.Column("title", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+            sa.Column("description", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+            sa.Column("status", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+            sa.Column("priority", sa.Integer(), nullable=False),
+            sa.Column("due_date", sa.DateTime(), nullable=True),
+            sa.Column("id", sqlmodel.sql.sqltypes.GUID(), nullable=False),
+            sa.Column("owner_id", sqlmodel.sql.sqltypes.GUID(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["owner_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_todo_id", "todo", ["id"])
+        op.create_index("ix_todo_owner_id", "todo", ["owner_id"])
 
 
 def downgrade():
-    pass
+    op.drop_table("todo")
+    op.drop_table("user")
@@ -0,0 +1,59 @@
+"""change versions, tombstones and per-owner stats
+
+Revision ID: 0002_versions_and_stats
+Revises: 0001_initial
+Create Date: 2026-10-18
+
+Counters in `todostats` are filled by `stats.ensure_todo_stats` on startup
+when the table is empty, so this only creates the structure.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = "0002_versions_and_stats"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def upgrade():
+    inspector = _inspector()
+    if "change_version" not in {c["name"] for c in inspector.get_columns("todo")}:
+        op.add_column("todo", sa.Column("change_version", sa.Integer(), nullable=False, server_default="0"))
+    if "ix_todo_owner_change_version" not in {i["name"] for i in inspector.get_indexes("todo")}:
+        op.create_index("ix_todo_owner_change_version", "todo", ["owner_id", "change_version"])
+    if not inspector.has_table("todostats"):
+        op.create_table(
+            "todostats",
+            sa.Column("owner_key", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+            sa.Column("total", sa.Integer(), nullable=False),
+            sa.Column("completed", sa.Integer(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+            sa.PrimaryKeyConstraint("owner_key"),
+        )
+    elif "version" not in {c["name"] for c in inspector.get_columns("todostats")}:
+        op.add_column("todostats", sa.Column("version", sa.Integer(), nullable=False, server_default="0"))
+    if not inspector.has_table("todotombstone"):
+        op.create_table(
+            "todotombstone",
+            sa.Column("todo_id", sqlmodel.sql.sqltypes.GUID(), nullable=False),
+            sa.Column("owner_key", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("deleted_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("todo_id"),
+        )
+        op.create_index("ix_todotombstone_owner_version", "todotombstone", ["owner_key", "version"])
+
+
+def downgrade():
+    op.drop_table("todotombstone")
+    op.drop_table("todostats")
+    op.drop_index("ix_todo_owner_change_version", table_name="todo")
+    with op.batch_alter_table("todo") as batch_op:
+        batch_op.drop_column("change_version")
@@ -0,0 +1,53 @@
+"""indexes for the todo list queries; unique user tokens
+
+Revision ID: 0003_list_query_indexes
+Revises: 0002_versions_and_stats
+Create Date: 2026-10-18
+
+Composite indexes matching `crud.list_todos` / `list_todos_page`: every
+owner-scoped listing is an index range on `owner_id` followed by the status
+filter or the sort column, with `id` as the keyset tie-breaker. Check the
+resulting plans with `scripts/check_query_plans.py`.
+
+`user.token` becomes a unique index; tokens are random UUID hex, so
+existing rows cannot collide.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_list_query_indexes"
+down_revision = "0002_versions_and_stats"
+branch_labels = None
+depends_on = None
+
+TODO_INDEXES = (
+    ("ix_todo_owner_status", ["owner_id", "status"]),
+    ("ix_todo_owner_created_id", ["owner_id", "created_at", "id"]),
+    ("ix_todo_owner_due_date_id", ["owner_id", "due_date", "id"]),
+    ("ix_todo_owner_priority_id", ["owner_id", "priority", "id"]),
+    ("ix_todo_created_id", ["created_at", "id"]),
+)
+
+
+def _indexes(table):
+    return {i["name"]: i for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    existing = _indexes("todo")
+    for name, columns in TODO_INDEXES:
+        if name not in existing:
+            op.create_index(name, "todo", columns)
+    token_index = _indexes("user").get("ix_user_token")
+    if token_index is None or not token_index["unique"]:
+        if token_index is not None:
+            op.drop_index("ix_user_token", table_name="user")
+        op.create_index("ix_user_token", "user", ["token"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_user_token", table_name="user")
+    op.create_index("ix_user_token", "user", ["token"])
+    for name, _ in reversed(TODO_INDEXES):
+        op.drop_index(name, table_name="todo")
@@ -0,0 +1,31 @@
+"""replica heartbeat
+
+Revision ID: 0004_replica_heartbeat
+Revises: 0003_list_query_indexes
+Create Date: 2026-10-18
+
+`replicaheartbeat` holds the timestamp that `app/replicas.py` writes to the
+primary and reads back from each read replica to measure its lag.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_replica_heartbeat"
+down_revision = "0003_list_query_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("replicaheartbeat"):
+        op.create_table(
+            "replicaheartbeat",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("beat_at", sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade():
+    op.drop_table("replicaheartbeat")
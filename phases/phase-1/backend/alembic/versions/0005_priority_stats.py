@@ -0,0 +1,43 @@
+"""per-priority counters; index for the due-date stats
+
+Revision ID: 0005_priority_stats
+Revises: 0004_replica_heartbeat
+Create Date: 2026-10-18
+
+`todoprioritystats` holds each owner's todo count per priority, filled by
+`stats.ensure_todo_stats` on startup when empty, like `todostats`.
+`ix_todo_owner_status_due_date` replaces `ix_todo_owner_status` (its
+prefix), so the overdue and due-this-week counts are index range scans.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = "0005_priority_stats"
+down_revision = "0004_replica_heartbeat"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("todoprioritystats"):
+        op.create_table(
+            "todoprioritystats",
+            sa.Column("owner_key", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+            sa.Column("priority", sa.Integer(), nullable=False),
+            sa.Column("total", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("owner_key", "priority"),
+        )
+    indexes = {i["name"] for i in inspector.get_indexes("todo")}
+    if "ix_todo_owner_status_due_date" not in indexes:
+        op.create_index("ix_todo_owner_status_due_date", "todo", ["owner_id", "status", "due_date"])
+    if "ix_todo_owner_status" in indexes:
+        op.drop_index("ix_todo_owner_status", table_name="todo")
+
+
+def downgrade():
+    op.create_index("ix_todo_owner_status", "todo", ["owner_id", "status"])
+    op.drop_index("ix_todo_owner_status_due_date", table_name="todo")
+    op.drop_table("todoprioritystats")
@@ -1 +1,246 @@
-# Placeholder AI client wrapper for Phase III
+"""Async client for the OpenAI-compatible endpoint behind `/chat`.
+
+One `LLMClient` per process keeps a pooled keep-alive `httpx.AsyncClient`,
+bounds the number of in-flight upstream calls, trips a circuit breaker after
+repeated failures and caches parsed intents per normalized message. Every
+failure path returns None so the caller can fall back to the rule-based
+parser.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import httpx
+
+from . import metrics
+from .cache import TTLCache
+
+INTENTS = ("create", "list", "delete", "update")
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; after
+    `reset_timeout` seconds one trial call is let through (half-open) and its
+    outcome closes or re-opens the circuit."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """An allowed call ended without an outcome (e.g. it was cancelled):
+        free the half-open trial slot for the next caller."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+def normalize_message(message: str) -> str:
+    """Cache key for a chat message: surrounding and repeated whitespace
+    removed. Case is kept because it ends up in todo titles."""
+    return " ".join(message.split())
+
+
+def intent_prompt(message: str) -> str:
+    return f"Interpret this user message as a Todo intent and return a JSON object with intent and payload: {message}"
+
+
+def reply_text(data) -> Optional[str]:
+    """Text of the first choice of a chat/completions response body, or
+    None when the body does not have that shape."""
+    choices = data.get("choices") if isinstance(data, dict) else None
+    if not isinstance(choices, list) or not choices or not isinstance(choices[0], dict):
+        return None
+    message = choices[0].get("message")
+    text = (message.get("content") if isinstance(message, dict) else None) or choices[0].get("text")
+    return text if isinstance(text, str) and text else None
+
+
+def parse_intent_reply(reply: str) -> Optional[Tuple[str, dict]]:
+    """Decode a model reply of the form {"intent": ..., "payload": {...}}."""
+    try:
+        parsed = json.loads(reply)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(parsed, dict) or parsed.get("intent") not in INTENTS:
+        return None
+    payload = parsed.get("payload") or {}
+    if not isinstance(payload, dict):
+        return None
+    return parsed["intent"], payload
+
+
+class LLMClient:
+    def __init__(
+        self,
+        api_key: str,
+        url: str = "https://api.openai.com/v1/chat/completions",
+        model: str = "gpt-4o-mini",
+        timeout: float = 5.0,
+        max_connections: int = 20,
+        max_concurrency: int = 8,
+        queue_timeout: float = 0.5,
+        cache_size: int = 1024,
+        cache_ttl: float = 3600.0,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url
+        self.model = model
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    async def complete(self, prompt: str) -> Optional[str]:
+        """Return the model's text for `prompt`, or None when the circuit is
+        open, no concurrency slot frees up within `queue_timeout`, or the
+        upstream call fails."""
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            metrics.LLM_CALLS.inc("async", "rejected")
+            return None
+        try:
+            if not self.breaker.allow():
+                self.rejected += 1
+                metrics.LLM_CALLS.inc("async", "rejected")
+                return None
+            self.calls += 1
+            payload = {
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": 256,
+            }
+            start = time.perf_counter()
+            try:
+                r = await self._http.post(self.url, json=payload)
+                r.raise_for_status()
+                # A reply without the expected shape counts as a failure.
+                text = reply_text(r.json())
+            except (httpx.HTTPError, ValueError):
+                text = None
+            except BaseException:
+                # Cancelled (or worse) mid-call: no outcome to record, but a
+                # half-open trial must not keep the circuit shut for good.
+                self.breaker.release()
+                raise
+            if text is None:
+                self.failures += 1
+                self.breaker.record_failure()
+                metrics.observe_llm_call("async", start, "error")
+                return None
+        finally:
+            self._semaphore.release()
+        metrics.observe_llm_call("async", start, "ok")
+        self.breaker.record_success()
+        return text
+
+    async def parse_intent(self, message: str) -> Optional[Tuple[str, dict]]:
+        key = normalize_message(message)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        reply = await self.complete(intent_prompt(key))
+        parsed = parse_intent_reply(reply) if reply else None
+        if parsed is not None:
+            self.cache.set(key, parsed)
+        return parsed
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "breaker": self.breaker.state,
+            "cache": self.cache.stats(),
+        }
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+_client: Optional[LLMClient] = None
+
+
+def get_client() -> Optional[LLMClient]:
+    """Process-wide client configured from the AI_* env vars, or None when
+    `AI_API_KEY` is not set."""
+    global _client
+    api_key = os.environ.get("AI_API_KEY")
+    if not api_key:
+        return None
+    if _client is None:
+        _client = LLMClient(
+            api_key=api_key,
+            url=os.environ.get("AI_API_URL", "https://api.openai.com/v1/chat/completions"),
+            model=os.environ.get("AI_MODEL", "gpt-4o-mini"),
+            timeout=float(os.environ.get("AI_TIMEOUT", "5")),
+            max_connections=int(os.environ.get("AI_MAX_CONNECTIONS", "20")),
+            max_concurrency=int(os.environ.get("AI_MAX_CONCURRENCY", "8")),
+            cache_size=int(os.environ.get("AI_CACHE_SIZE", "1024")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get("AI_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.environ.get("AI_BREAKER_RESET", "30")),
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
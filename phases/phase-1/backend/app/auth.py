@@ -1,35 +1,152 @@
-from fastapi import Depends, HTTPException, status, Header
-from typing import Optional
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from fastapi import Depends, HTTPException, status, Header, Query
+from typing import Callable, Optional
+from uuid import UUID
 
-from .database import get_session
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .database import RequestDB, get_db, get_session
 from .crud import get_user_by_token
+from .models import User
 
+# Token -> User cache shared by the auth dependencies so repeat callers skip
+# the database. Entries hold detached copies and are dropped whenever a User
+# row is updated or deleted (a new user has no entries to drop); the TTL
+# bounds staleness for writes made by other workers.
+token_cache = TTLCache(
+    maxsize=int(os.environ.get("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("AUTH_CACHE_TTL", "60")),
+)
 
-def get_current_user(authorization: Optional[str] = Header(None)):
-    # Expect header: Authorization: Token <token>
-    if not authorization:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing authorization header")
+# Stream tokens: short-lived signed stand-ins for the API token in URLs
+# (`GET /todos/events?token=`), which end up in access logs and browser
+# history. Set STREAM_TOKEN_SECRET when several processes serve the API so
+# they accept each other's tokens; by default each process picks its own.
+STREAM_TOKEN_TTL = int(os.environ.get("STREAM_TOKEN_TTL", "60"))
+_STREAM_TOKEN_SECRET = (os.environ.get("STREAM_TOKEN_SECRET") or secrets.token_hex(32)).encode()
+
+
+def invalidate_user(user: User) -> None:
+    token_cache.pop(user.token)
+    token_cache.discard_where(lambda _token, cached: cached.id == user.id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _on_user_write(mapper, connection, target):
+    invalidate_user(target)
+
+
+def _parse_token(authorization: str) -> str:
     parts = authorization.split()
     if len(parts) != 2 or parts[0].lower() != "token":
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authorization header format")
-    token = parts[1]
+    return parts[1]
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_STREAM_TOKEN_SECRET, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue_stream_token(user: User, now: Optional[float] = None) -> str:
+    """`<user id>.<expiry>.<signature>`, valid for STREAM_TOKEN_TTL seconds."""
+    expires = int((time.time() if now is None else now) + STREAM_TOKEN_TTL)
+    payload = f"{user.id.hex}.{expires}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_stream_token(token: str, now: Optional[float] = None) -> Optional[UUID]:
+    """The user id a stream token was issued for, or None if it is forged,
+    malformed or expired."""
+    try:
+        user_hex, expires, signature = token.split(".")
+        user_id, expires_at = UUID(hex=user_hex), int(expires)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _sign(f"{user_hex}.{expires}")):
+        return None
+    if expires_at < (time.time() if now is None else now):
+        return None
+    return user_id
+
+
+def _detached(user: User) -> User:
+    # A transient copy: the loaded instance belongs to its session and would
+    # expire (and fail to reload) once that session is gone.
+    return User(id=user.id, username=user.username, token=user.token, created_at=user.created_at)
+
+
+async def _user_for_token(db: RequestDB, token: str) -> User:
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    reader = db.replica()
+    found = await reader.run(get_user_by_token, token)
+    if not found and reader is not db:
+        # The user may be too new to have reached the replica.
+        found = await db.run(get_user_by_token, token)
+    if not found:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    user = _detached(found)
+    token_cache.set(token, user)
+    return user
+
+
+async def get_current_user(authorization: Optional[str] = Header(None), db: RequestDB = Depends(get_db)):
+    # Expect header: Authorization: Token <token>
+    if not authorization:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing authorization header")
+    return await _user_for_token(db, _parse_token(authorization))
+
+
+def _load_user(lookup: Callable, key) -> Optional[User]:
     with get_session() as session:
-        user = get_user_by_token(session, token)
-        if not user:
+        found = lookup(session, key)
+        return _detached(found) if found else None
+
+
+def _get_user(session, user_id: UUID) -> Optional[User]:
+    return session.get(User, user_id)
+
+
+async def get_stream_user(authorization: Optional[str] = Header(None), token: Optional[str] = Query(None)):
+    # For long-lived streaming endpoints. EventSource cannot set headers, so
+    # the query may carry `?token=` instead: a stream token from
+    # `POST /todos/events/token`, never the API token itself. The lookup runs
+    # in the threadpool on its own short-lived session rather than the
+    # request-scoped `get_db` connection, which would otherwise stay checked
+    # out for the life of the stream.
+    if authorization:
+        api_token = _parse_token(authorization)
+        user = token_cache.get(api_token)
+        if user is None:
+            user = await run_in_threadpool(_load_user, get_user_by_token, api_token)
+            if user is not None:
+                token_cache.set(api_token, user)
+        if user is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
         return user
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing authorization header")
+    user_id = verify_stream_token(token)
+    user = user_id and await run_in_threadpool(_load_user, _get_user, user_id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired stream token")
+    return user
+
+
 # Optional current user dependency: returns `None` when no header provided,
 # otherwise validates the token and returns the user (or raises 401).
-def optional_current_user(authorization: Optional[str] = Header(None)):
+async def optional_current_user(authorization: Optional[str] = Header(None), db: RequestDB = Depends(get_db)):
     if not authorization:
         return None
-    parts = authorization.split()
-    if len(parts) != 2 or parts[0].lower() != "token":
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authorization header format")
-    token = parts[1]
-    with get_session() as session:
-        user = get_user_by_token(session, token)
-        if not user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return user
+    return await _user_for_token(db, _parse_token(authorization))
 # Placeholder for Phase II auth (to be implemented)
@@ -1,6 +1,9 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+import asyncio
 import os
+import time
 import requests
+from . import ai_client, intents, metrics
 from .models import TodoCreate
 
 
@@ -18,61 +21,37 @@ def _call_llm(prompt: str) -> Optional[str]:
         "messages": [{"role": "user", "content": prompt}],
         "max_tokens": 256,
     }
+    start = time.perf_counter()
     try:
         r = requests.post(url, json=payload, headers=headers, timeout=5)
         r.raise_for_status()
         data = r.json()
-        if "choices" in data and len(data["choices"]) > 0:
-            return data["choices"][0].get("message", {}).get("content") or data["choices"][0].get("text")
-        return None
     except Exception:
+        metrics.observe_llm_call("sync", start, "error")
         return None
+    metrics.observe_llm_call("sync", start, "ok")
+    if "choices" in data and len(data["choices"]) > 0:
+        return data["choices"][0].get("message", {}).get("content") or data["choices"][0].get("text")
+    return None
 
 
 def _rule_based_parse(message: str):
-    m = message.strip().lower()
-    if m.startswith("create todo") or m.startswith("add todo"):
-        # support formats: 'create todo: Title | description', 'add todo: Title',
-        # and 'add todo Title' (no colon)
-        if ":" in message:
-            parts = message.split(":", 1)
-            if len(parts) == 2:
-                title_desc = parts[1].split("|", 1)
-                title = title_desc[0].strip()
-                desc = title_desc[1].strip() if len(title_desc) > 1 else ""
-                return ("create", {"title": title, "description": desc})
-        # fallback: 'add todo Title'
-        tokens = message.split()
-        if len(tokens) >= 3:
-            title = " ".join(tokens[2:]).strip()
-            return ("create", {"title": title, "description": ""})
-    if m.startswith("list todos") or m.startswith("show todos"):
-        return ("list", {})
-    if m.startswith("delete todo"):
-        parts = message.split()
-        if len(parts) >= 3:
-            return ("delete", {"id": parts[2]})
-    if m.startswith("update todo"):
-        # support 'update todo <id>: Title | description | status'
-        parts = message.split(":", 1)
-        if len(parts) == 2:
-            left = parts[0].split()
-            tid = left[2] if len(left) >= 3 else None
-            fields = parts[1].split("|")
-            title = fields[0].strip() if len(fields) > 0 else None
-            desc = fields[1].strip() if len(fields) > 1 else None
-            status = fields[2].strip() if len(fields) > 2 else None
-            data = {k: v for k, v in [("title", title), ("description", desc), ("status", status)] if v}
-            return ("update", {"id": tid, "data": data})
-        # support 'update todo <id> title New title'
-        tokens = message.split()
-        if len(tokens) >= 5:
-            tid = tokens[2]
-            field = tokens[3].lower()
-            value = " ".join(tokens[4:]).strip()
-            if field in ("title", "description", "status"):
-                return ("update", {"id": tid, "data": {field: value}})
-    return ("unknown", {})
+    """Deterministic parser for the first command in `message` (see `app.intents`)."""
+    return intents.parse_first(message)
+
+
+def parse_chat(message: str):
+    """Return (intent, payload) for `message`: the LLM's reply when
+    `AI_API_KEY` is set and the reply is usable, else the rule-based parse."""
+    # One key lookup; without a key no prompt is built.
+    enabled = bool(os.environ.get("AI_API_KEY"))
+    if enabled:
+        llm_resp = _call_llm(ai_client.intent_prompt(message))
+        parsed = ai_client.parse_intent_reply(llm_resp) if llm_resp else None
+        if parsed:
+            return parsed
+    metrics.CHAT_FALLBACKS.inc("sync", "llm_failed" if enabled else "disabled")
+    return _rule_based_parse(message)
 
 
 def handle_chat(message: str, user=None) -> Dict[str, Any]:
@@ -81,19 +60,7 @@ def handle_chat(message: str, user=None) -> Dict[str, Any]:
     path is optional and will not be used during tests unless the environment
     variable is provided.
     """
-    llm_prompt = f"Interpret this user message as a Todo intent and return a JSON object with intent and payload: {message}"
-    llm_resp = _call_llm(llm_prompt)
-    if llm_resp:
-        try:
-            import json
-
-            parsed = json.loads(llm_resp)
-            intent = parsed.get("intent")
-            payload = parsed.get("payload", {})
-        except Exception:
-            intent, payload = _rule_based_parse(message)
-    else:
-        intent, payload = _rule_based_parse(message)
+    intent, payload = parse_chat(message)
 
     # If called without a `user` (direct function use in tests), return a
     # simple result dictionary (backwards-compatible). If a `user` is
@@ -111,19 +78,27 @@ def handle_chat(message: str, user=None) -> Dict[str, Any]:
         return {"result": "unknown"}
 
 
-def parse_chat(message: str):
-    """Convenience wrapper that returns (intent, payload)."""
-    out = handle_chat(message)
-    # If handle_chat returned a result dict (no user case), convert to intent/payload
-    if "intent" in out and "payload" in out:
-        return out.get("intent"), out.get("payload")
-    # translate result back to intent/payload
-    if out.get("result") == "created":
-        return "create", {"title": out["todo"]["title"], "description": out["todo"].get("description", "")}
-    if out.get("result") == "list":
-        return "list", {}
-    if out.get("result") == "delete_requested":
-        return "delete", {"id": out.get("id")}
-    if out.get("result") == "update_requested":
-        return "update", out.get("payload", {})
-    return "unknown", {}
+async def parse_chat_async(message: str):
+    """Async (intent, payload) parser used by the `/chat` endpoint. Goes
+    through the pooled `ai_client` when `AI_API_KEY` is set and falls back to
+    the rule-based parser whenever the LLM path yields nothing (no key, open
+    circuit, saturated, upstream error or an unusable reply)."""
+    client = ai_client.get_client()
+    if client is not None:
+        parsed = await client.parse_intent(message)
+        if parsed is not None:
+            return parsed
+    metrics.CHAT_FALLBACKS.inc("async", "disabled" if client is None else "llm_failed")
+    return _rule_based_parse(message)
+
+
+async def parse_chat_commands_async(message: str) -> List[intents.Intent]:
+    """(intent, payload) for every command in `message` (see
+    `intents.split_commands`). With an LLM configured each command is sent
+    separately, concurrently; otherwise this is `intents.parse_commands`."""
+    if ai_client.get_client() is None:
+        parsed = intents.parse_commands(message)
+        metrics.CHAT_FALLBACKS.inc("async", "disabled", amount=len(parsed))
+        return parsed
+    commands = intents.split_commands(message)
+    return list(await asyncio.gather(*(parse_chat_async(c) for c in commands)))
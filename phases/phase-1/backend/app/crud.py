@@ -1,10 +1,19 @@
-from typing import List, Optional
+import math
+import os
+import time
+import weakref
+from typing import Iterator, List, Optional, Tuple
 from uuid import UUID
 from datetime import datetime
 
+from sqlalchemy import and_, bindparam, event, or_
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, select
 
-from .models import Todo, TodoCreate, User
+from . import events, response_cache, search, stats, sync
+from .database import execute_returning, supports_returning
+from .models import Status, Todo, TodoCreate, TodoRead, User
+from .utils import encode_cursor, decode_cursor
 
 
 def create_todo(session: Session, todo_in: TodoCreate, owner: Optional[User] = None) -> Todo:
@@ -12,14 +21,55 @@ def create_todo(session: Session, todo_in: TodoCreate, owner: Optional[User] = N
 	if owner:
 		data["owner_id"] = owner.id
 	todo = Todo(**data)
+	versions = stats.record(session, [(todo.owner_id, 1, stats.is_completed(todo.status))], [(todo.owner_id, todo.priority, 1)])
+	response_cache.invalidate_on_commit(session, versions)
+	todo.change_version = versions[stats.owner_key(todo.owner_id)]
 	session.add(todo)
+	search.index_todos(session, [todo])
+	events.publish(session, "created", todo.id, todo.owner_id, todo.change_version, todo)
 	session.commit()
 	session.refresh(todo)
 	return todo
 
 
-def list_todos(session: Session, owner: Optional[User] = None, completed: Optional[bool] = None, sort_by: Optional[str] = None) -> List[Todo]:
-	q = select(Todo)
+def create_todos(session: Session, entries: List[Tuple[TodoCreate, Optional[UUID]]]) -> List[Todo]:
+	"""Create todos for several owners in one transaction (the group commit
+	flush): one counter upsert, one executemany INSERT and one commit. The
+	returned todos are detached copies carrying the values written, so no
+	refresh round trip is needed."""
+	table = Todo.__table__
+	todos = [Todo(**todo_in.dict(), owner_id=owner_id) for todo_in, owner_id in entries]
+	versions = stats.record(
+		session,
+		[(todo.owner_id, 1, stats.is_completed(todo.status)) for todo in todos],
+		[(todo.owner_id, todo.priority, 1) for todo in todos],
+	)
+	response_cache.invalidate_on_commit(session, versions)
+	rows = []
+	for todo in todos:
+		todo.change_version = versions[stats.owner_key(todo.owner_id)]
+		rows.append({c.name: getattr(todo, c.name) for c in table.columns})
+	session.execute(table.insert(), rows)
+	search.index_todos(session, rows)
+	for todo in todos:
+		events.publish(session, "created", todo.id, todo.owner_id, todo.change_version, todo)
+	session.commit()
+	return todos
+
+
+# Orderings accepted by `list_todos_page`. Each maps to a composite index on
+# (owner_id, <column>, id) so a page is a bounded index range scan.
+SORT_FIELDS = ("created_at", "due_date", "priority")
+DEFAULT_PAGE_SORT = "created_at"
+
+
+# Columns of the `TodoRead` shape, in field order, for the tuple-returning
+# listing path (`as_rows=True`) that skips ORM hydration.
+READ_COLUMNS = tuple(Todo.__table__.c[name] for name in TodoRead.__fields__)
+
+
+def _filtered_query(owner: Optional[User] = None, completed: Optional[bool] = None, as_rows: bool = False):
+	q = select(*READ_COLUMNS) if as_rows else select(Todo)
 	if owner:
 		q = q.where(Todo.owner_id == owner.id)
 	if completed is not None:
@@ -28,20 +78,175 @@ def list_todos(session: Session, owner: Optional[User] = None, completed: Option
 			q = q.where(Todo.status == Status.completed)
 		else:
 			q = q.where(Todo.status == Status.pending)
-	if sort_by:
-		# support 'due_date' or '-due_date' for descending
-		if sort_by == "due_date":
-			q = q.order_by(Todo.due_date)
-		elif sort_by == "-due_date":
-			q = q.order_by(Todo.due_date.desc())
-	return session.exec(q).all()
+	return q
+
+
+def list_todos(session: Session, owner: Optional[User] = None, completed: Optional[bool] = None, sort_by: Optional[str] = None, as_rows: bool = False) -> List[Todo]:
+	"""Todos as ORM objects, or with `as_rows` as plain row tuples in
+	`READ_COLUMNS` order (see `serialization.encode_todo_rows`).
+
+	Every page of `list_todos_page` in one list: the same sorts (by default
+	`created_at`), the same order with NULL due dates last, and `ValueError`
+	for an unknown sort.
+	"""
+	field, descending = parse_sort(sort_by)
+	return _keyset_rows(session, _filtered_query(owner, completed, as_rows), field, descending, None, None, as_rows)
+
+
+def parse_sort(sort_by: Optional[str]) -> Tuple[str, bool]:
+	"""Return `(field, descending)` for a keyset sort spec such as '-due_date'."""
+	sort_by = sort_by or DEFAULT_PAGE_SORT
+	descending = sort_by.startswith("-")
+	field = sort_by.lstrip("-")
+	if field not in SORT_FIELDS:
+		raise ValueError(f"unsupported sort: {sort_by}")
+	return field, descending
+
+
+def cursor_for(todo: Todo, field: str, descending: bool) -> str:
+	"""The `list_todos_page` cursor for a page ending at `todo`."""
+	value = getattr(todo, field)
+	if isinstance(value, datetime):
+		value = value.isoformat()
+	return encode_cursor([field, descending, value, todo.id.hex])
+
+
+def decode_page_cursor(cursor: str, field: str, descending: bool):
+	"""The `(value, id)` keyset position in a `cursor_for` cursor; ValueError
+	when it is malformed or was made for another sort."""
+	values = decode_cursor(cursor)
+	if len(values) != 4 or values[0] != field or values[1] != descending:
+		raise ValueError("cursor does not match the requested sort")
+	value, raw_id = values[2], values[3]
+	try:
+		if value is not None and field in ("created_at", "due_date"):
+			value = datetime.fromisoformat(value)
+		elif value is not None:
+			value = int(value)
+		return value, UUID(hex=raw_id)
+	except (TypeError, ValueError) as exc:
+		raise ValueError("invalid cursor") from exc
+
+
+def list_todos_page(
+	session: Session,
+	owner: Optional[User] = None,
+	completed: Optional[bool] = None,
+	sort_by: Optional[str] = None,
+	limit: int = 100,
+	after: Optional[str] = None,
+	as_rows: bool = False,
+) -> Tuple[List[Todo], Optional[str]]:
+	"""Keyset-paginated listing ordered by `(sort column, id)`.
+
+	`after` is the opaque cursor returned for the previous page. Rows whose sort
+	column is NULL (only `due_date`) come last in both directions, so the page
+	walk first covers the non-NULL range and then the NULL range ordered by id.
+	Returns the page and the cursor for the next one (None on the last page);
+	`as_rows` returns row tuples as `list_todos` does. Raises `ValueError`
+	for unknown sorts or malformed cursors.
+	"""
+	field, descending = parse_sort(sort_by)
+	key = decode_page_cursor(after, field, descending) if after else None
+	rows = _keyset_rows(session, _filtered_query(owner, completed, as_rows), field, descending, key, limit + 1, as_rows)
+	if len(rows) <= limit:
+		return rows, None
+	rows = rows[:limit]
+	return rows, cursor_for(rows[-1], field, descending)
+
+
+def _keyset_rows(session: Session, base, field: str, descending: bool, key, limit: Optional[int], as_rows: bool) -> list:
+	"""Up to `limit` (None: all) rows of `base` past the `(value, id)`
+	position `key`, ordered by `(field, id)` with NULL values last."""
+	col = getattr(Todo, field)
+	nullable = Todo.__table__.c[field].nullable
+	fetch = session.execute if as_rows else session.exec
+
+	def order(c):
+		return c.desc() if descending else c
+
+	def beyond(c, v):
+		return c < v if descending else c > v
+
+	rows: list = []
+	in_null_range = nullable and key is not None and key[0] is None
+	if not in_null_range:
+		q = base.where(col.is_not(None)) if nullable else base
+		if key:
+			# The redundant `col >= v` (`<=` descending) bound keeps this a single
+			# index range; with the OR alone SQLite may fall back to a temp sort.
+			at_or_beyond = col <= key[0] if descending else col >= key[0]
+			q = q.where(at_or_beyond, or_(beyond(col, key[0]), and_(col == key[0], beyond(Todo.id, key[1]))))
+		q = q.order_by(order(col), order(Todo.id))
+		rows = list(fetch(q if limit is None else q.limit(limit)).all())
+	if nullable and (limit is None or len(rows) < limit):
+		q = base.where(col.is_(None))
+		if in_null_range:
+			q = q.where(beyond(Todo.id, key[1]))
+		q = q.order_by(order(Todo.id))
+		rows.extend(fetch(q if limit is None else q.limit(limit - len(rows))).all())
+	return rows
+
+
+def _merge_key(field: str, descending: bool):
+	# Sorted with `reverse=descending`, this is the order of
+	# `list_todos_page`: non-NULL values first in both directions, then NULLs
+	# by id.
+	if descending:
+		return lambda row: (getattr(row, field) is not None, getattr(row, field), row.id)
+	return lambda row: (getattr(row, field) is None, getattr(row, field), row.id)
+
+
+def merge_todo_lists(lists: List[list], sort_by: Optional[str] = None) -> list:
+	"""Combine `list_todos` results from several shards, keeping the
+	`sort_by` order (that of `list_todos_page`)."""
+	field, descending = parse_sort(sort_by)
+	return sorted((row for part in lists for row in part), key=_merge_key(field, descending), reverse=descending)
+
+
+def merge_todo_pages(pages: List[Tuple[list, Optional[str]]], sort_by: Optional[str], limit: int) -> Tuple[list, Optional[str]]:
+	"""Combine `list_todos_page` results fetched with the same arguments
+	from several shards into one page and its cursor. Each shard's page holds
+	its first `limit` rows past the cursor, so the first `limit` of the merged
+	rows are the page; the cursor works for every shard."""
+	field, descending = parse_sort(sort_by)
+	rows = sorted((row for page, _ in pages for row in page), key=_merge_key(field, descending), reverse=descending)
+	more = len(rows) > limit or any(cursor for _, cursor in pages)
+	rows = rows[:limit]
+	return rows, cursor_for(rows[-1], field, descending) if more and rows else None
+
+
+# Columns written by the export path, in output order.
+EXPORT_COLUMNS = ("id", "owner_id", "title", "description", "status", "priority", "due_date", "created_at", "updated_at")
+
+
+def iter_todo_rows(session: Session, owner: Optional[User] = None, chunk_size: int = 1000) -> Iterator[list]:
+	"""Yield lists of up to `chunk_size` column mappings for the owner's todos
+	(or the whole table). Uses a server-side cursor where the driver supports it
+	and selects plain columns, so no ORM objects are built and memory stays flat
+	regardless of the table size."""
+	table = Todo.__table__
+	q = select(*(table.c[name] for name in EXPORT_COLUMNS))
+	if owner:
+		q = q.where(table.c.owner_id == owner.id)
+	q = q.order_by(table.c.created_at, table.c.id)
+	result = session.execute(q, execution_options={"stream_results": True, "max_row_buffer": chunk_size})
+	try:
+		for rows in result.mappings().partitions(chunk_size):
+			yield rows
+	finally:
+		result.close()
 
 
 def get_todo(session: Session, todo_id: UUID) -> Optional[Todo]:
 	return session.get(Todo, todo_id)
 
 
-def update_todo(session: Session, todo: Todo, todo_in: TodoCreate) -> Todo:
+def update_todo(session: Session, todo: Todo, todo_in: TodoCreate, commit: bool = True) -> Todo:
+	change = (todo.owner_id, 0, stats.is_completed(todo_in.status) - stats.is_completed(todo.status))
+	versions = stats.record(session, [change], [(todo.owner_id, todo.priority, -1), (todo.owner_id, todo_in.priority, 1)])
+	response_cache.invalidate_on_commit(session, versions)
+	todo.change_version = versions[stats.owner_key(todo.owner_id)]
 	todo.title = todo_in.title
 	todo.description = todo_in.description
 	todo.status = todo_in.status
@@ -49,16 +254,342 @@ def update_todo(session: Session, todo: Todo, todo_in: TodoCreate) -> Todo:
 	todo.due_date = todo_in.due_date
 	todo.updated_at = datetime.utcnow()
 	session.add(todo)
-	session.commit()
-	session.refresh(todo)
+	search.index_todos(session, [todo])
+	events.publish(session, "updated", todo.id, todo.owner_id, todo.change_version, todo)
+	if commit:
+		session.commit()
+		session.refresh(todo)
+	else:
+		session.flush()
 	return todo
 
 
 def delete_todo(session: Session, todo: Todo) -> None:
+	todo_id, owner_id = todo.id, todo.owner_id
+	versions = stats.record(session, [(owner_id, -1, -stats.is_completed(todo.status))], [(owner_id, todo.priority, -1)])
+	response_cache.invalidate_on_commit(session, versions)
 	session.delete(todo)
+	search.unindex_todos(session, [todo_id])
+	sync.record_deletes(session, [(todo_id, owner_id, versions[stats.owner_key(owner_id)])])
+	events.publish(session, "deleted", todo_id, owner_id, versions[stats.owner_key(owner_id)])
 	session.commit()
 
 
+# Columns a PUT or PATCH may write.
+MUTABLE_FIELDS = ("title", "description", "status", "priority", "due_date")
+
+WriteError = Tuple[int, str]
+
+
+def write_check(owner_id: Optional[UUID], change_version: int, owner: Optional[User], if_match: Optional[List[int]]) -> Optional[WriteError]:
+	"""Ownership rules of `_access_error`, then the If-Match versions."""
+	error = _access_error(owner_id, owner)
+	if error:
+		return error
+	if if_match is not None and change_version not in if_match:
+		return 412, "Precondition Failed"
+	return None
+
+
+def _row_dict(todo: Todo) -> dict:
+	row = {c.name: getattr(todo, c.name) for c in READ_COLUMNS}
+	row["change_version"] = todo.change_version
+	return row
+
+
+def get_todo_row(session: Session, todo_id: UUID) -> Optional[dict]:
+	"""The todo's `TodoRead` columns plus `change_version` (its ETag)."""
+	table = Todo.__table__
+	row = session.execute(select(*READ_COLUMNS, table.c.change_version).where(table.c.id == todo_id)).mappings().first()
+	return dict(row) if row else None
+
+
+def _write_guard(todo_id: UUID, owner_id: Optional[UUID], if_match: Optional[List[int]]):
+	table = Todo.__table__
+	clause = and_(table.c.id == todo_id, table.c.owner_id == owner_id if owner_id else table.c.owner_id.is_(None))
+	if if_match is not None:
+		clause = and_(clause, table.c.change_version.in_(if_match))
+	return clause
+
+
+def _lock_and_read(session: Session, owner_id: Optional[UUID], guard):
+	"""Bump the owner's counter version (taking the counter row lock, first
+	as on every write path), then read the status and priority of the row
+	`guard` matches: a statement of its own, so on Postgres its snapshot is
+	taken after the lock and sees every earlier writer's commit."""
+	table = Todo.__table__
+	versions = stats.record(session, [(owner_id, 0, 0)])
+	old = session.execute(select(table.c.status, table.c.priority).where(guard)).first()
+	return versions, old
+
+
+def _miss(session: Session, commit: bool) -> None:
+	# Undo the counter version bump. Inside a caller's transaction it stays:
+	# a version that moves without a change only retires cache entries.
+	if commit:
+		session.rollback()
+
+
+def _update_in_scope(session: Session, todo_id: UUID, fields: dict, owner_id: Optional[UUID], if_match: Optional[List[int]], commit: bool = True) -> Optional[dict]:
+	table = Todo.__table__
+	guard = _write_guard(todo_id, owner_id, if_match)
+	counted = "status" in fields or "priority" in fields
+	if counted:
+		versions, old = _lock_and_read(session, owner_id, guard)
+		if old is None:
+			_miss(session, commit)
+			return None
+	else:
+		versions = stats.record(session, [(owner_id, 0, 0)])
+	version = versions[stats.owner_key(owner_id)]
+	stmt = table.update().where(guard).values(dict(fields, updated_at=datetime.utcnow(), change_version=version))
+	row = execute_returning(session, stmt, *READ_COLUMNS, table.c.change_version).mappings().first()
+	if row is None:
+		_miss(session, commit)
+		return None
+	row = dict(row)
+	if counted:
+		stats.adjust(
+			session,
+			[(owner_id, 0, stats.is_completed(row["status"]) - stats.is_completed(old.status))],
+			[(owner_id, old.priority, -1), (owner_id, row["priority"], 1)],
+		)
+	response_cache.invalidate_on_commit(session, versions)
+	if "title" in fields or "description" in fields:
+		search.index_todos(session, [row])
+	events.publish(session, "updated", todo_id, owner_id, version, row)
+	if commit:
+		session.commit()
+	return row
+
+
+def _delete_in_scope(session: Session, todo_id: UUID, owner_id: Optional[UUID], if_match: Optional[List[int]]) -> bool:
+	table = Todo.__table__
+	guard = _write_guard(todo_id, owner_id, if_match)
+	versions, old = _lock_and_read(session, owner_id, guard)
+	if old is None or execute_returning(session, table.delete().where(guard), table.c.id).first() is None:
+		session.rollback()
+		return False
+	stats.adjust(session, [(owner_id, -1, -stats.is_completed(old.status))], [(owner_id, old.priority, -1)])
+	version = versions[stats.owner_key(owner_id)]
+	response_cache.invalidate_on_commit(session, versions)
+	search.unindex_todos(session, [todo_id])
+	sync.record_deletes(session, [(todo_id, owner_id, version)])
+	events.publish(session, "deleted", todo_id, owner_id, version)
+	session.commit()
+	return True
+
+
+def _write_by_id(session: Session, attempt, todo_id: UUID, owner: Optional[User], if_match: Optional[List[int]]):
+	"""Run `attempt(owner_id)` guarded on the caller's scope; on a miss, find
+	out why with one SELECT. Signed-in callers may also write unowned todos,
+	which the first attempt does not match, so those get a second attempt."""
+	scope = owner.id if owner else None
+	result = attempt(scope)
+	if result:
+		return result, None
+	row = session.execute(
+		select(Todo.__table__.c.owner_id, Todo.__table__.c.change_version).where(Todo.__table__.c.id == todo_id)
+	).first()
+	if row is None:
+		return None, (404, "Todo not found")
+	error = write_check(row.owner_id, row.change_version, owner, if_match)
+	if error is None and row.owner_id != scope:
+		result = attempt(row.owner_id)
+		if result:
+			return result, None
+	return None, error or (409, "Conflict")
+
+
+def update_todo_by_id(
+	session: Session,
+	todo_id: UUID,
+	fields: dict,
+	owner: Optional[User] = None,
+	if_match: Optional[List[int]] = None,
+	commit: bool = True,
+) -> Tuple[Optional[dict], Optional[WriteError]]:
+	"""Set `fields` (a subset of MUTABLE_FIELDS) on a todo the caller may
+	write, and commit. The ownership check, the If-Match check (`if_match`:
+	acceptable `change_version`s) and the write are one
+	`UPDATE ... WHERE ... RETURNING`, with no refresh after; only a change
+	of status or priority reads the old values first, under the counter
+	lock, for the counters. Returns the written row as `get_todo_row` does, or an
+	(HTTP status, detail) error. With `commit=False` the write is left in
+	the caller's transaction, as in `apply_batch`."""
+	if not supports_returning(session):
+		todo = get_todo(session, todo_id)
+		error = (404, "Todo not found") if todo is None else write_check(todo.owner_id, todo.change_version, owner, if_match)
+		if error:
+			return None, error
+		merged = {f: getattr(todo, f) for f in MUTABLE_FIELDS}
+		merged.update(fields)
+		return _row_dict(update_todo(session, todo, TodoCreate(**merged), commit=commit)), None
+	return _write_by_id(session, lambda owner_id: _update_in_scope(session, todo_id, fields, owner_id, if_match, commit), todo_id, owner, if_match)
+
+
+def delete_todo_by_id(session: Session, todo_id: UUID, owner: Optional[User] = None, if_match: Optional[List[int]] = None) -> Optional[WriteError]:
+	"""Delete a todo the caller may write with one guarded
+	`DELETE ... RETURNING` (its status and priority read first for the
+	counters) and commit; returns None or an error as `update_todo_by_id`
+	does."""
+	if not supports_returning(session):
+		todo = get_todo(session, todo_id)
+		error = (404, "Todo not found") if todo is None else write_check(todo.owner_id, todo.change_version, owner, if_match)
+		if error is None:
+			delete_todo(session, todo)
+		return error
+	return _write_by_id(session, lambda owner_id: _delete_in_scope(session, todo_id, owner_id, if_match), todo_id, owner, if_match)[1]
+
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit.
+_IN_CHUNK = 500
+
+
+def _access_error(owner_id: Optional[UUID], owner: Optional[User]) -> Optional[Tuple[int, str]]:
+	"""Mirror the endpoint ownership rules: owned todos need their owner."""
+	if owner_id and not owner:
+		return 401, "Unauthorized"
+	if owner_id and owner_id != owner.id:
+		return 403, "Forbidden"
+	return None
+
+
+def apply_batch(session: Session, operations: list, owner: Optional[User] = None, allow_create: bool = True, commit: bool = True) -> List[dict]:
+	"""Apply a list of create/update/delete operations in a single transaction.
+
+	Operations are checked in order against the rows loaded up front (one
+	SELECT ... IN per chunk), then written with one executemany per statement
+	kind and a single commit. Every operation gets a result dict with an HTTP
+	style status; failed items are reported, not raised, and do not abort the
+	rest of the batch. Values returned for written rows are computed here, so
+	no refresh round trip is needed after the commit.
+
+	With `commit=False` the writes are left in the caller's transaction; the
+	events and cache invalidations still wait for its commit.
+	"""
+	table = Todo.__table__
+	now = datetime.utcnow()
+	wanted = list({op.id for op in operations if op.op != "create" and op.id})
+	existing = {}
+	for start in range(0, len(wanted), _IN_CHUNK):
+		q = select(table).where(table.c.id.in_(wanted[start:start + _IN_CHUNK]))
+		for row in session.execute(q).mappings():
+			existing[row["id"]] = dict(row)
+
+	results: List[dict] = []
+	inserts: List[dict] = []
+	updates = {}
+	deleted = set()
+	changes: List[stats.Change] = []
+	priorities: List[stats.PriorityChange] = []
+	for index, op in enumerate(operations):
+		result = {"index": index, "op": op.op, "status": 200, "id": op.id, "todo": None, "error": None}
+		results.append(result)
+		if op.op in ("create", "update") and (op.data is None or not op.data.title or not op.data.title.strip()):
+			result.update(status=400, error="title is required")
+			continue
+		if op.op == "create":
+			if not allow_create:
+				result.update(status=401, error="Unauthorized")
+				continue
+			todo = Todo(**op.data.dict(), owner_id=owner.id if owner else None, created_at=now, updated_at=now)
+			row = {c.name: getattr(todo, c.name) for c in table.columns}
+			inserts.append(row)
+			changes.append((todo.owner_id, 1, stats.is_completed(todo.status)))
+			priorities.append((todo.owner_id, todo.priority, 1))
+			result.update(status=201, id=todo.id, todo=row)
+			continue
+		row = existing.get(op.id) if op.id not in deleted else None
+		if row is None:
+			result.update(status=404, error="Todo not found")
+			continue
+		error = _access_error(row["owner_id"], owner)
+		if error:
+			result.update(status=error[0], error=error[1])
+			continue
+		if op.op == "update":
+			was_completed, old_priority = stats.is_completed(row["status"]), row["priority"]
+			row.update(op.data.dict(), updated_at=now)
+			changes.append((row["owner_id"], 0, stats.is_completed(row["status"]) - was_completed))
+			priorities += [(row["owner_id"], old_priority, -1), (row["owner_id"], row["priority"], 1)]
+			updates[op.id] = row
+			result["todo"] = dict(row)
+		else:
+			deleted.add(op.id)
+			updates.pop(op.id, None)
+			changes.append((row["owner_id"], -1, -stats.is_completed(row["status"])))
+			priorities.append((row["owner_id"], row["priority"], -1))
+			result["status"] = 204
+
+	# One version bump per owner for the whole batch, stamped on every row
+	# it writes (and on the rows echoed back in the results).
+	versions = stats.record(session, changes, priorities)
+	response_cache.invalidate_on_commit(session, versions)
+	for row in list(updates.values()) + [r["todo"] for r in results if r["todo"] is not None]:
+		row["change_version"] = versions[stats.owner_key(row["owner_id"])]
+	if inserts:
+		session.execute(table.insert(), inserts)
+		search.index_todos(session, inserts)
+	if updates:
+		fields = ("title", "description", "status", "priority", "due_date", "updated_at", "change_version")
+		stmt = table.update().where(table.c.id == bindparam("b_id")).values({f: bindparam(f"b_{f}") for f in fields})
+		session.execute(stmt, [dict({f"b_{f}": row[f] for f in fields}, b_id=row["id"]) for row in updates.values()])
+		search.index_todos(session, updates.values())
+	if deleted:
+		ids = list(deleted)
+		for start in range(0, len(ids), _IN_CHUNK):
+			session.execute(table.delete().where(table.c.id.in_(ids[start:start + _IN_CHUNK])))
+		search.unindex_todos(session, ids)
+		sync.record_deletes(session, [
+			(todo_id, existing[todo_id]["owner_id"], versions[stats.owner_key(existing[todo_id]["owner_id"])])
+			for todo_id in ids
+		])
+	for r in results:
+		if r["error"] is None:
+			row = r["todo"] or existing[r["id"]]
+			kind = {"create": "created", "update": "updated", "delete": "deleted"}[r["op"]]
+			events.publish(session, kind, r["id"], row["owner_id"], versions[stats.owner_key(row["owner_id"])], r["todo"])
+	if commit:
+		session.commit()
+	return results
+
+
+# Users are never deleted, so "some user exists" only ever flips from False to
+# True for a database. True is kept for good. False is kept for
+# `USERS_RECHECK_SECONDS` (1) so anonymous creates, only allowed while there
+# are no users, skip the probe too; a user inserted through the ORM in this
+# process flips it at once (`_on_user_insert`), one created by another worker
+# process is seen within the window. Keyed per engine so shards, replicas and
+# test databases each keep their own answer: (exists, trusted until).
+USERS_RECHECK_SECONDS = float(os.environ.get("USERS_RECHECK_SECONDS", "1"))
+_users_exist: "weakref.WeakKeyDictionary[Engine, Tuple[bool, float]]" = weakref.WeakKeyDictionary()
+
+
+def _engine_of(session: Session) -> Engine:
+	bind = session.get_bind()
+	return getattr(bind, "engine", bind)
+
+
+def users_exist(session: Session) -> bool:
+	engine = _engine_of(session)
+	known = _users_exist.get(engine)
+	if known is None or time.monotonic() >= known[1]:
+		if session.exec(select(User.id).limit(1)).first() is not None:
+			known = (True, math.inf)
+		else:
+			known = (False, time.monotonic() + USERS_RECHECK_SECONDS)
+		_users_exist[engine] = known
+	return known[0]
+
+
+@event.listens_for(User, "after_insert")
+def _on_user_insert(mapper, connection, target):
+	# Before the commit, so only until the next probe: if the transaction
+	# rolls back, anonymous creates are refused meanwhile (the safe side).
+	_users_exist[connection.engine] = (True, time.monotonic() + USERS_RECHECK_SECONDS)
+
+
 def create_user(session: Session, username: str, token: str) -> User:
 	user = User(username=username, token=token)
 	session.add(user)
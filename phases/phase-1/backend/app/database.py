@@ -1,25 +1,446 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
 from pathlib import Path
 import os
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, TypeVar, Union
+
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from . import metrics, replicas, shards
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DB_FILE = BASE_DIR / "database.db"
 # Allow overriding the database URL via env var for tests and deployments.
 DATABASE_URL = os.environ.get("DATABASE_URL") or f"sqlite:///{DB_FILE}"
 
-# SQLite engine for the application. `check_same_thread` disabled for typical
-# FastAPI single-process usage. `echo=False` to avoid noisy production logs.
-engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
+# Async drivers and the sync driver used for the same database. An async URL
+# switches request handling to the async engine; the sync engine is still
+# built from the matching sync URL for `init_db`, scripts and streaming export.
+ASYNC_DRIVERS = {
+    "postgresql+asyncpg": "postgresql+psycopg2",
+    "sqlite+aiosqlite": "sqlite",
+}
+
+_T = TypeVar("_T")
+
+
+def is_async_url(url: str) -> bool:
+    return make_url(url).drivername in ASYNC_DRIVERS
+
+
+def sync_url(url: str) -> str:
+    """Return `url` with an async driver replaced by its sync counterpart."""
+    parsed = make_url(url)
+    if parsed.drivername in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[parsed.drivername])
+    return str(parsed)
+
+
+def _connect_args(url: str) -> dict:
+    # `check_same_thread` disabled for SQLite since FastAPI hands the request
+    # session between threadpool workers; other drivers reject the option.
+    if make_url(url).get_backend_name() == "sqlite" and not is_async_url(url):
+        return {"check_same_thread": False}
+    return {}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def engine_options(url: str) -> dict:
+    """Keyword arguments for `create_engine` / `create_async_engine`.
+
+    Pool sizing comes from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE and DB_POOL_PRE_PING. File-backed SQLite gets a queue pool
+    as well (SQLAlchemy 1.4 defaults it to NullPool, which reconnects and
+    re-applies the pragmas on every checkout); in-memory SQLite keeps its
+    default single-connection pool.
+    """
+    options = {"echo": False, "connect_args": _connect_args(url)}
+    if _is_memory_sqlite(url):
+        return options
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        options["poolclass"] = AsyncAdaptedQueuePool if is_async_url(url) else QueuePool
+    options.update(
+        pool_size=_env_int("DB_POOL_SIZE", 5),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+        pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+        pool_recycle=_env_int("DB_POOL_RECYCLE", -1),
+        # Server databases drop idle connections; SQLite files never do.
+        pool_pre_ping=_env_bool("DB_POOL_PRE_PING", backend != "sqlite"),
+    )
+    return options
+
+
+# PRAGMAs applied to every new SQLite connection. Each is overridable through
+# the named env var; an empty value leaves SQLite's own default in place.
+SQLITE_PRAGMAS = (
+    ("journal_mode", "SQLITE_JOURNAL_MODE", "WAL", {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}),
+    ("synchronous", "SQLITE_SYNCHRONOUS", "NORMAL", {"OFF", "NORMAL", "FULL", "EXTRA"}),
+    ("busy_timeout", "SQLITE_BUSY_TIMEOUT", "5000", None),
+    ("mmap_size", "SQLITE_MMAP_SIZE", "268435456", None),
+    ("cache_size", "SQLITE_CACHE_SIZE", "-65536", None),
+)
+
+
+def sqlite_pragmas() -> list:
+    """Resolve `SQLITE_PRAGMAS` against the environment as (name, value) pairs."""
+    pragmas = []
+    for name, env_name, default, allowed in SQLITE_PRAGMAS:
+        value = os.environ.get(env_name, default).strip()
+        if not value:
+            continue
+        if allowed is None:
+            value = str(int(value))
+        elif value.upper() not in allowed:
+            raise ValueError(f"{env_name} must be one of {sorted(allowed)}")
+        pragmas.append((name, value.upper() if allowed else value))
+    return pragmas
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def create_app_engine(url: str):
+    """Create the sync engine for `url` with pool options and SQLite pragmas."""
+    new_engine = create_engine(url, **engine_options(url))
+    if make_url(url).get_backend_name() == "sqlite" and not _is_memory_sqlite(url):
+        event.listen(new_engine, "connect", _apply_sqlite_pragmas)
+    return new_engine
+
+
+def create_app_async_engine(url: str):
+    new_engine = create_async_engine(url, **engine_options(url))
+    if make_url(url).get_backend_name() == "sqlite" and not _is_memory_sqlite(url):
+        event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return new_engine
+
+
+# SQLite has had UPDATE/DELETE/INSERT ... RETURNING since 3.35, but
+# SQLAlchemy 1.4 only compiles it for other dialects.
+SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+# Compiles statements for `execute_returning` with `:name` placeholders,
+# which `text()` understands.
+_SQLITE_NAMED = sqlite.dialect(paramstyle="named")
+
+
+def supports_returning(session) -> bool:
+    """Whether statements on `session`'s database can use RETURNING."""
+    name = session.get_bind().dialect.name
+    return name == "postgresql" or (name == "sqlite" and SQLITE_RETURNING)
+
+
+def execute_returning(session, stmt, *columns):
+    """Execute the INSERT/UPDATE/DELETE `stmt` with `RETURNING columns`
+    (only where `supports_returning`). On SQLite the statement is compiled
+    as usual and the clause appended as text, typed by `columns` so the
+    rows come back as they would from a select."""
+    if session.get_bind().dialect.name != "sqlite":
+        return session.execute(stmt.returning(*columns))
+    compiled = stmt.compile(dialect=_SQLITE_NAMED, compile_kwargs={"render_postcompile": True})
+    names = ", ".join(compiled.preparer.format_column(column) for column in columns)
+    params = [bindparam(name, value, type_=compiled.binds[name].type) for name, value in compiled.params.items()]
+    return session.execute(text(f"{compiled} RETURNING {names}").bindparams(*params).columns(*columns))
+
+
+ASYNC_MODE = is_async_url(DATABASE_URL)
+SYNC_DATABASE_URL = sync_url(DATABASE_URL)
+
+# Sync engine for the application.
+engine = create_app_engine(SYNC_DATABASE_URL)
+# Async engine serving requests when DATABASE_URL names an async driver.
+async_engine = create_app_async_engine(DATABASE_URL) if ASYNC_MODE else None
+
+# Shard engines by name when DB_SHARDS is set (see app/shards.py); the main
+# engine then only serves users. Shards are always used through sync sessions.
+SHARD_URLS = shards.shard_urls(os.environ.get("DB_SHARDS"), SYNC_DATABASE_URL)
+shard_engines: Dict[str, Engine] = {name: create_app_engine(url) for name, url in SHARD_URLS.items()}
+shard_ring = shards.HashRing(list(shard_engines)) if shard_engines else None
+SHARDED = shard_ring is not None
+
+
+def shard_of(owner_id) -> Optional[str]:
+    """Name of the shard holding `owner_id`'s todos (None: unowned), or
+    None when sharding is off."""
+    if shard_ring is None:
+        return None
+    # The owner key of app.stats: the id's hex, "" for unowned todos.
+    return shard_ring.node_for(owner_id.hex if owner_id else "")
+
+
+def data_engine(owner_id) -> Engine:
+    """Engine holding `owner_id`'s todos."""
+    name = shard_of(owner_id)
+    return engine if name is None else shard_engines[name]
+
+
+def data_engines() -> Dict[str, Engine]:
+    """Every engine holding todos: the shards, or just the main engine."""
+    return dict(shard_engines) if shard_engines else {"engine": engine}
+
+
+# Read replicas of the main database (DATABASE_REPLICA_URLS; see
+# app/replicas.py), used through sync sessions like the shards.
+replica_set = replicas.ReplicaSet({
+    name: create_app_engine(sync_url(url))
+    for name, url in replicas.replica_urls(os.environ.get("DATABASE_REPLICA_URLS")).items()
+})
+replica_engines = replica_set.engines
+
+
+def pool_stats(target) -> dict:
+    """Describe the connection pool of a sync or async engine."""
+    pool = getattr(target, "sync_engine", target).pool
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
+
+
+@dataclass
+class RequestStats:
+    """Sessions opened and pool checkouts made while serving one request."""
+    sessions: int = 0
+    checkouts: int = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def begin_request_stats() -> RequestStats:
+    """Start counting for the current request context (see the middleware in main)."""
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def _count_session() -> None:
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.sessions += 1
+
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+event.listen(engine, "checkout", _count_checkout)
+metrics.instrument_engine(engine, "engine")
+for _name, _extra_engine in {**shard_engines, **replica_engines}.items():
+    event.listen(_extra_engine, "checkout", _count_checkout)
+    metrics.instrument_engine(_extra_engine, _name)
+if async_engine is not None:
+    event.listen(async_engine.sync_engine, "checkout", _count_checkout)
+    metrics.instrument_engine(async_engine.sync_engine, "async_engine")
+
+
+def _init_engine(target: Engine) -> None:
+    from .search import ensure_search_index
+    from .stats import ensure_todo_stats
+    from .sync import ensure_sync_columns
+
+    SQLModel.metadata.create_all(target)
+    ensure_sync_columns(target)
+    ensure_search_index(target)
+    ensure_todo_stats(target)
 
 
 def init_db(url: str | None = None) -> None:
-    """Create database tables. If `url` is provided, create a temporary engine for that URL."""
+    """Create database tables (on every shard too). If `url` is provided,
+    create a temporary engine for that URL only."""
     if url:
-        tmp_engine = create_engine(url, echo=False, connect_args={"check_same_thread": False})
-        SQLModel.metadata.create_all(tmp_engine)
+        tmp_engine = create_app_engine(sync_url(url))
+        _init_engine(tmp_engine)
+        tmp_engine.dispose()
     else:
-        SQLModel.metadata.create_all(engine)
+        _init_engine(engine)
+        for shard_engine in shard_engines.values():
+            _init_engine(shard_engine)
+
+
+_WRITTEN = "replicas_written"
+
+
+def read_your_writes(session: Session, owner_keys: Iterable[str]) -> None:
+    """Keep reads of `owner_keys` (owner id hex, "" for unowned) on the
+    primary for `REPLICA_STICKY_SECONDS` once `session` commits."""
+    if replica_engines:
+        session.info.setdefault(_WRITTEN, set()).update(owner_keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    written = session.info.pop(_WRITTEN, None)
+    if written:
+        replica_set.wrote(written)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _on_rollback(session, previous_transaction):
+    session.info.pop(_WRITTEN, None)
+
+
+def get_session(bind: Optional[Engine] = None) -> Session:
+    _count_session()
+    return Session(bind or engine)
+
+
+class RequestDB:
+    """Request-scoped handle over a sync `Session` or an `AsyncSession`.
+
+    `run(fn, *args)` calls a sync `crud`-style function as `fn(session, *args)`:
+    on the async engine through `AsyncSession.run_sync` (no thread involved),
+    on the sync engine in the threadpool. Endpoints therefore stay `async def`
+    and share one set of query code across both engines.
+
+    With DB_SHARDS set the session only reaches the main database (users);
+    `for_owner(owner)` gives the handle for the shard holding `owner`'s todos
+    and `all_shards()` one per shard, for queries across every owner. Shard
+    sessions are opened on first use and closed with the request. Without
+    sharding both return this handle.
+
+    With DATABASE_REPLICA_URLS set, `replica()` gives a handle on one healthy
+    read replica of the main database (the same one for the whole request)
+    and `for_read(owner)` the handle for reads of `owner`'s todos that may
+    lag: a replica unless `owner` wrote recently (see app/replicas.py).
+    Both fall back to the primary. Never write through them.
+    """
+
+    def __init__(self, session: Union[Session, AsyncSession]):
+        self.session = session
+        # Shard and replica handles opened by this request, by engine name.
+        self._extra: Dict[str, "RequestDB"] = {}
+        self._replica: Optional["RequestDB"] = None
+
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self.session, AsyncSession)
+
+    async def run(self, fn: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+        if self.is_async:
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+    def _open(self, name: str, bind: Engine) -> "RequestDB":
+        db = self._extra.get(name)
+        if db is None:
+            _count_session()
+            db = self._extra[name] = RequestDB(Session(bind))
+        return db
+
+    def shard(self, name: str) -> "RequestDB":
+        return self._open(name, shard_engines[name])
+
+    def for_owner(self, owner) -> "RequestDB":
+        name = shard_of(owner.id if owner else None)
+        return self if name is None else self.shard(name)
+
+    def all_shards(self) -> List["RequestDB"]:
+        return [self.shard(name) for name in shard_engines] if shard_engines else [self]
+
+    def replica(self) -> "RequestDB":
+        if self._replica is None:
+            name = replica_set.choose()
+            self._replica = self if name is None else self._open(name, replica_engines[name])
+        return self._replica
+
+    def for_read(self, owner) -> "RequestDB":
+        # Shards have no replicas.
+        if SHARDED or replica_set.sticky(owner.id.hex if owner else ""):
+            return self.for_owner(owner)
+        return self.replica()
+
+    def finish_extra(self) -> None:
+        """Roll back and close the shard and replica sessions."""
+        for db in self._extra.values():
+            _finish(db.session)
+        self._extra.clear()
+        self._replica = None
+
+
+def _finish(session: Session) -> None:
+    try:
+        session.rollback()
+    finally:
+        session.close()
+
+
+async def _finish_extra(db: RequestDB) -> None:
+    if db._extra:
+        await run_in_threadpool(db.finish_extra)
+
 
+async def get_db() -> AsyncIterator[RequestDB]:
+    """FastAPI dependency yielding one `RequestDB` per request.
 
-def get_session() -> Session:
-    return Session(engine)
+    The session is bound to a single checked-out connection for the whole
+    request, so the auth dependencies and the handler share it and commits
+    made by `crud` do not return the connection to the pool mid-request.
+    The time spent obtaining it is recorded as `metrics.POOL_WAIT`.
+    Write paths commit before the handler returns (the `crud` write functions
+    all do), because the code after `yield` only runs once the response has
+    been sent; at that point anything still pending is rolled back.
+    """
+    _count_session()
+    started = time.perf_counter()
+    if async_engine is not None:
+        async with async_engine.connect() as connection:
+            metrics.POOL_WAIT.observe(time.perf_counter() - started, "async_engine")
+            session = AsyncSession(bind=connection, expire_on_commit=False)
+            db = RequestDB(session)
+            try:
+                yield db
+            finally:
+                await session.rollback()
+                await _finish_extra(db)
+                await session.close()
+        return
+    connection = await run_in_threadpool(engine.connect)
+    metrics.POOL_WAIT.observe(time.perf_counter() - started, "engine")
+    try:
+        session = Session(bind=connection)
+        db = RequestDB(session)
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(_finish, session)
+            await _finish_extra(db)
+    finally:
+        await run_in_threadpool(connection.close)
@@ -0,0 +1,250 @@
+"""Todo change events for `GET /todos/events` (Server-Sent Events).
+
+`crud` queues an `Event` on the session for every todo it creates, updates
+or deletes (`publish`); the events go to the broker only when that session
+commits and are dropped on rollback. The `Broker` fans them out to the
+subscriptions of the todo's owner on the event loop.
+
+Delivery between processes goes through a `Backend`. The default
+`MemoryBackend` only reaches subscribers in this process; set
+`EVENTS_BACKEND=package.module:factory` to a callable returning a backend
+that also relays events through a shared channel (Redis pub/sub, Postgres
+LISTEN/NOTIFY, ...) so every worker sees every event.
+
+Backpressure: each subscription has a bounded queue (`EVENTS_QUEUE_SIZE`).
+Publishing never blocks; a subscriber that falls that far behind is sent a
+`resync` event and disconnected, and is expected to reconnect and catch up
+with `GET /todos/changes?since=<last event id>`.
+"""
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from .models import TodoRead
+from .utils import load_factory
+
+_PENDING = "todo_events"
+
+
+class Event:
+    """One change to a todo. The SSE frame is encoded once, when the event
+    is first needed, and shared by every subscriber."""
+
+    __slots__ = ("owner_key", "type", "todo_id", "version", "todo", "_frame")
+
+    def __init__(self, owner_key: str, type: str, todo_id, version: int, todo=None):
+        self.owner_key = owner_key
+        self.type = type
+        self.todo_id = todo_id
+        self.version = version
+        self.todo = todo
+        self._frame: Optional[bytes] = None
+
+    @property
+    def frame(self) -> bytes:
+        if self._frame is None:
+            data = {"type": self.type, "id": str(self.todo_id), "version": self.version}
+            if self.todo is not None:
+                data["todo"] = json.loads(TodoRead.parse_obj(self.todo).json())
+            body = json.dumps(data, separators=(",", ":"))
+            self._frame = f"id: {self.version}\nevent: {self.type}\ndata: {body}\n\n".encode()
+        return self._frame
+
+
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+class Subscription:
+    __slots__ = ("owner_key", "queue", "overflowed")
+
+    def __init__(self, owner_key: str, queue_size: int):
+        self.owner_key = owner_key
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def offer(self, event: Event) -> bool:
+        """Queue `event` without blocking. On overflow the backlog is
+        discarded and replaced by a single end-of-stream marker (None)."""
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+
+class Backend(ABC):
+    """Transport between `Broker.publish` (any thread, any worker) and
+    `deliver` (the event loop of every worker). `shared` backends reach other
+    processes, so the broker cannot skip events nobody here listens to."""
+
+    shared = False
+
+    @abstractmethod
+    def start(self, loop: asyncio.AbstractEventLoop, deliver: Callable[[List[Event]], None]) -> None:
+        ...
+
+    @abstractmethod
+    def publish(self, events: List[Event]) -> None:
+        ...
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryBackend(Backend):
+    """In-process delivery: hands events to the loop thread."""
+
+    def start(self, loop, deliver):
+        self._loop = loop
+        self._deliver = deliver
+
+    def publish(self, events):
+        self._loop.call_soon_threadsafe(self._deliver, events)
+
+
+class Broker:
+    def __init__(self, backend: Optional[Backend] = None, queue_size: int = 256):
+        self.backend = backend or MemoryBackend()
+        self.queue_size = queue_size
+        # owner key -> subscriptions; only touched on the event loop thread.
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self._loop = loop or asyncio.get_running_loop()
+        self.backend.start(self._loop, self._deliver)
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.offer(None)
+        self._subscribers.clear()
+        self._loop = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def wants(self, owner_key: str) -> bool:
+        return self._loop is not None and (self.backend.shared or bool(self._subscribers.get(owner_key)))
+
+    def publish(self, events: Iterable[Event]) -> None:
+        """Hand committed events to the backend; safe from any thread."""
+        events = [e for e in events if self.wants(e.owner_key)]
+        if not events:
+            return
+        for e in events:
+            e.frame  # encode here, off the event loop
+        self.published += len(events)
+        self.backend.publish(events)
+
+    def subscribe(self, owner_key: str) -> Subscription:
+        sub = Subscription(owner_key, self.queue_size)
+        self._subscribers[owner_key].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.owner_key)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.owner_key]
+
+    def _deliver(self, events: List[Event]) -> None:
+        overflowed = []
+        for e in events:
+            for sub in self._subscribers.get(e.owner_key, ()):
+                if sub.offer(e):
+                    self.delivered += 1
+                elif sub.overflowed:
+                    overflowed.append(sub)
+        # Stop routing to subscribers that fell behind; their stream ends
+        # after the resync frame already queued for them.
+        for sub in overflowed:
+            self.overflows += 1
+            self.unsubscribe(sub)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscriber_count,
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
+
+
+def load_backend(spec: Optional[str]) -> Backend:
+    """`package.module:factory` -> factory(); empty -> MemoryBackend."""
+    if not spec:
+        return MemoryBackend()
+    return load_factory(spec)
+
+
+broker = Broker(
+    backend=load_backend(os.environ.get("EVENTS_BACKEND")),
+    queue_size=int(os.environ.get("EVENTS_QUEUE_SIZE", "256")),
+)
+
+
+def publish(session: Session, type: str, todo_id, owner_id, version: int, todo=None) -> None:
+    """Queue a change event on `session`; it reaches the broker when the
+    session commits. `todo` (a Todo or a row mapping) is snapshotted now, and
+    only when somebody may be listening for its owner."""
+    key = owner_id.hex if owner_id else ""
+    if not broker.wants(key):
+        return
+    if todo is not None:
+        todo = dict(todo) if isinstance(todo, dict) else todo.dict()
+    session.info.setdefault(_PENDING, []).append(Event(key, type, todo_id, version, todo))
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        broker.publish(pending)
+
+
+@sa_event.listens_for(Session, "after_soft_rollback")
+def _on_rollback(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+
+
+async def sse_stream(owner_key: str, heartbeat: float = 15.0, target: Optional[Broker] = None):
+    """Body of `GET /todos/events`: one SSE frame per event for `owner_key`,
+    a comment line every `heartbeat` idle seconds, and `resync` followed by
+    end of stream when the subscription overflows. Subscribes on first
+    iteration and always unsubscribes, including on client disconnect."""
+    target = target or broker
+    sub = target.subscribe(owner_key)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                e = await asyncio.wait_for(sub.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT_FRAME
+                continue
+            if e is None:
+                yield RESYNC_FRAME
+                return
+            yield e.frame
+    finally:
+        target.unsubscribe(sub)
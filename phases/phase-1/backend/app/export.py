@@ -0,0 +1,78 @@
+"""Streaming NDJSON / CSV encoders for `GET /todos/export`."""
+import csv
+import heapq
+import io
+import itertools
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Iterator, List, Optional, Union
+from uuid import UUID
+
+from sqlmodel import Session
+
+from . import crud
+from .models import User
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"cannot serialize {type(value).__name__}")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def _row_chunks(sessions: List[Session], owner: Optional[User], chunk_size: int) -> Iterator[list]:
+    if len(sessions) == 1:
+        yield from crud.iter_todo_rows(sessions[0], owner=owner, chunk_size=chunk_size)
+        return
+    # One stream per shard, each already ordered by (created_at, id), merged
+    # lazily so memory stays flat.
+    streams = [itertools.chain.from_iterable(crud.iter_todo_rows(s, owner=owner, chunk_size=chunk_size)) for s in sessions]
+    merged = heapq.merge(*streams, key=lambda row: (row["created_at"], row["id"]))
+    while True:
+        rows = list(itertools.islice(merged, chunk_size))
+        if not rows:
+            return
+        yield rows
+
+
+def iter_export(
+    session: Union[Session, List[Session]], owner: Optional[User] = None, fmt: str = "ndjson", chunk_size: int = 1000
+) -> Iterator[bytes]:
+    """Yield the encoded export one chunk of rows at a time. `session` may be
+    a list of shard sessions, whose rows are merged in export order."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unsupported export format: {fmt}")
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(crud.EXPORT_COLUMNS)
+        yield buf.getvalue().encode()
+    sessions = session if isinstance(session, list) else [session]
+    for rows in _row_chunks(sessions, owner, chunk_size):
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerows([_csv_value(row[c]) for c in crud.EXPORT_COLUMNS] for row in rows)
+            yield buf.getvalue().encode()
+        else:
+            yield "".join(json.dumps(dict(row), default=_json_default) + "\n" for row in rows).encode()
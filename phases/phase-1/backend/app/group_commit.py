@@ -0,0 +1,187 @@
+"""Group commit for `POST /todos` (`GROUP_COMMIT=1`).
+
+Without it every create is its own transaction, and on SQLite each commit
+waits for its own WAL write (and fsync, with `SQLITE_SYNCHRONOUS=FULL`)
+while holding the database's single write lock. With it the endpoint hands
+the create to the `GroupCommitter` and awaits the result: creates queued by
+concurrent requests are written by one `crud.create_todos` call, in one
+transaction, as soon as `GROUP_COMMIT_MAX_ITEMS` (256) are waiting or
+`GROUP_COMMIT_WINDOW_MS` (2) after the oldest one was queued. A caller is
+answered only after its group's commit returned, so a 201 promises the same
+durability as before.
+
+With `DB_SHARDS` each shard gets its own committer. A committer flushes one
+group at a time, in the threadpool, on a connection it keeps for itself:
+requests hold their own pooled connection while they wait, so the flush
+must not need one from the pool. Creates arriving during a flush form the
+next group. When a group's transaction fails its
+creates are retried one per transaction, so a bad row fails only its own
+request.
+
+Group sizes, flush times and how long callers waited are exported as the
+`group_commit_*` metrics.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import crud, metrics
+from .database import data_engines, shard_of
+
+
+class GroupCommitter:
+    """Queue of pending writes flushed in groups by `write(session, items)`,
+    which must commit and return one result per item, in order."""
+
+    def __init__(self, write: Callable[[Session, list], list], window: float = 0.002, max_items: int = 256):
+        self.write = write
+        self.window = window
+        self.max_items = max_items
+        # (item, future answering its caller, time queued)
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._ready: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._connection = None
+        self.flushes = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self, bind) -> None:
+        """Open the committer's connection on the engine `bind` and start
+        flushing on the running event loop."""
+        self._connection = bind.connect()
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush whatever is still queued, then release the connection."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._ready.set()
+        self._full.set()
+        await self._task
+        self._task = None
+        await run_in_threadpool(self._connection.close)
+        self._connection = None
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` and wait until the group holding it is committed."""
+        if self._task is None or self._stopping:
+            raise RuntimeError("group commit is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        self._ready.set()
+        if len(self._pending) >= self.max_items:
+            self._full.set()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            await self._ready.wait()
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._ready.clear()
+                continue
+            remaining = self._pending[0][2] + self.window - time.perf_counter()
+            if remaining > 0 and len(self._pending) < self.max_items and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            group, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+            if len(self._pending) < self.max_items and not self._stopping:
+                self._full.clear()
+            await self._flush(group)
+
+    async def _flush(self, group: list) -> None:
+        started = time.perf_counter()
+        try:
+            results = await run_in_threadpool(self._write_group, [item for item, _, _ in group])
+        except Exception as exc:
+            results = [exc] * len(group)
+        done = time.perf_counter()
+        self.flushes += 1
+        self.items += len(group)
+        metrics.GROUP_COMMIT_SIZE.observe(len(group))
+        metrics.GROUP_COMMIT_FLUSH.observe(done - started)
+        for (_, future, queued), result in zip(group, results):
+            metrics.GROUP_COMMIT_WAIT.observe(done - queued)
+            if future.done():  # the caller went away; its write stands
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _write_group(self, items: list) -> list:
+        with Session(bind=self._connection) as session:
+            try:
+                return self.write(session, items)
+            except Exception as exc:
+                session.rollback()
+                if len(items) == 1:
+                    return [exc]
+            self.fallbacks += 1
+            results = []
+            for item in items:
+                try:
+                    results.extend(self.write(session, [item]))
+                except Exception as exc:
+                    session.rollback()
+                    results.append(exc)
+            return results
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._pending),
+            "flushes": self.flushes,
+            "items": self.items,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def _enabled() -> bool:
+    return os.environ.get("GROUP_COMMIT", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+# One committer per database holding todos (each shard has its own write
+# lock), keyed like `database.data_engines()`. Items are (TodoCreate, owner
+# id) pairs; results are the created todos.
+committers: Dict[str, GroupCommitter] = {
+    name: GroupCommitter(
+        crud.create_todos,
+        window=float(os.environ.get("GROUP_COMMIT_WINDOW_MS", "2")) / 1000,
+        max_items=int(os.environ.get("GROUP_COMMIT_MAX_ITEMS", "256")),
+    )
+    for name in data_engines()
+} if _enabled() else {}
+
+
+def committer_for(owner_id) -> Optional[GroupCommitter]:
+    """The committer for `owner_id`'s creates; None when group commit is off."""
+    return committers.get(shard_of(owner_id) or "engine")
+
+
+def start() -> None:
+    engines = data_engines()
+    for name, committer in committers.items():
+        committer.start(engines[name])
+
+
+async def stop() -> None:
+    for committer in committers.values():
+        await committer.stop()
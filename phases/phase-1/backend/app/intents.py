@@ -0,0 +1,115 @@
+"""Single-pass parser for rule-based chat commands.
+
+Commands are separated by ";" (or newlines). Each command is tokenized once
+with a bounded `str.split` into verb, noun and the remaining text, and is
+dispatched on (verb, noun) through `COMMANDS`; the handler only slices the
+remainder. Free text (titles, descriptions) keeps its original case.
+
+Grammar, per command (keywords are case-insensitive):
+
+    (create|add) todo: <title> [| <description>]
+    (create|add) todo <title>
+    (list|show) todos
+    delete todo <id>
+    update todo <id>: <title> [| <description> [| <status>]]
+    update todo <id> (title|description|status) <value>
+"""
+import re
+from typing import Callable, Dict, List, Tuple
+
+Intent = Tuple[str, dict]
+
+_SEPARATOR = re.compile(r"[;\n]")
+UPDATABLE_FIELDS = ("title", "description", "status")
+UNKNOWN: Intent = ("unknown", {})
+
+
+def _create(rest: str) -> Intent:
+    if rest.startswith(":"):
+        fields = rest[1:].split("|", 1)
+        title = fields[0].strip()
+        desc = fields[1].strip() if len(fields) > 1 else ""
+    else:
+        title, desc = rest.strip(), ""
+    if not title:
+        return UNKNOWN
+    return "create", {"title": title, "description": desc}
+
+
+def _list(rest: str) -> Intent:
+    return "list", {}
+
+
+def _delete(rest: str) -> Intent:
+    tid = rest.split(None, 1)[0].rstrip(":") if rest else ""
+    if not tid:
+        return UNKNOWN
+    return "delete", {"id": tid}
+
+
+def _update(rest: str) -> Intent:
+    parts = rest.split(None, 1)
+    if not parts:
+        return UNKNOWN
+    tid, tail = parts[0], parts[1] if len(parts) > 1 else ""
+    if ":" in tid:
+        # "<id>:<title>..." with no space after the colon
+        tid, _, head = tid.partition(":")
+        tail = f":{head} {tail}" if tail else f":{head}"
+    if not tid:
+        return UNKNOWN
+    if tail.startswith(":"):
+        fields = [f.strip() for f in tail[1:].split("|")]
+        data = {k: v for k, v in zip(UPDATABLE_FIELDS, fields) if v}
+        return "update", {"id": tid, "data": data}
+    parts = tail.split(None, 1)
+    if len(parts) == 2 and parts[0].lower() in UPDATABLE_FIELDS:
+        return "update", {"id": tid, "data": {parts[0].lower(): parts[1].strip()}}
+    return UNKNOWN
+
+
+# (verb, noun) -> handler(rest of the command after the noun)
+COMMANDS: Dict[Tuple[str, str], Callable[[str], Intent]] = {
+    ("create", "todo"): _create,
+    ("add", "todo"): _create,
+    ("list", "todos"): _list,
+    ("show", "todos"): _list,
+    ("delete", "todo"): _delete,
+    ("update", "todo"): _update,
+}
+
+
+def _parse_command(command: str) -> Intent:
+    tokens = command.split(None, 2)
+    if len(tokens) < 2:
+        return UNKNOWN
+    noun = tokens[1]
+    rest = tokens[2] if len(tokens) > 2 else ""
+    if ":" in noun:
+        # "todo:" or "todo:<title>": hand the colon on to the handler
+        noun, _, head = noun.partition(":")
+        rest = f":{head} {rest}" if rest else f":{head}"
+    handler = COMMANDS.get((tokens[0].lower(), noun.lower()))
+    if handler is None:
+        return UNKNOWN
+    return handler(rest)
+
+
+def split_commands(message: str) -> List[str]:
+    """The non-empty commands in `message` (e.g. a trailing ";" is dropped)."""
+    if ";" not in message and "\n" not in message:
+        return [message] if message and not message.isspace() else []
+    return [c for c in _SEPARATOR.split(message) if c and not c.isspace()]
+
+
+def parse_commands(message: str) -> List[Intent]:
+    """Parse every command in `message`; unrecognized ones yield UNKNOWN."""
+    return [_parse_command(c) for c in split_commands(message)]
+
+
+def parse_first(message: str) -> Intent:
+    """Parse only the first command (the single-intent chat behaviour)."""
+    if ";" not in message and "\n" not in message:
+        return _parse_command(message)
+    intents = parse_commands(message)
+    return intents[0] if intents else UNKNOWN
@@ -1,24 +1,64 @@
+import asyncio
+import hashlib
+import os
+from contextlib import ExitStack
 from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import MutableHeaders
 from pathlib import Path
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 
-from .database import init_db, get_session
-from .models import TodoCreate, TodoRead, User
-from sqlmodel import select
-from . import crud
-from .schemas import UserCreate, TokenResponse
-from .utils import generate_token
-from .auth import get_current_user, optional_current_user
+from .database import (
+    init_db, get_session, get_db, begin_request_stats, RequestDB, engine, async_engine, pool_stats,
+    SHARDED, data_engine, data_engines, shard_engines, replica_engines, replica_set,
+)
+from .models import TodoCreate, TodoRead
+from sqlmodel import Session
+from . import crud, events, group_commit, metrics, search, stats, sync
+from .response_cache import ALL_TODOS_SCOPE, CachedResponse, response_cache
+from .serialization import TODO_FIELDS, dumps, encode_todo_rows, todo_row_dicts
+from .schemas import UserCreate, TokenResponse, StreamTokenResponse, BatchOperation, BatchRequest, BatchResponse, TodoChanges, TodoPatch, TodoStatsRead
+from .utils import generate_token, encode_cursor, decode_cursor
+from .auth import STREAM_TOKEN_TTL, get_current_user, token_cache, get_stream_user, issue_stream_token, optional_current_user
 from fastapi import Depends
-from .chat import handle_chat
+from .chat import parse_chat_commands_async
+from . import ai_client
+from .export import EXPORT_FORMATS, iter_export
+from .storage import SQLStore, TodoStore, load_store
 
 app = FastAPI(title="Evolution of Todo - Phase I")
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 10000
+MAX_SEARCH_PAGE_SIZE = 100
+MAX_CHAT_COMMANDS = 100
+EVENTS_HEARTBEAT = float(os.environ.get("EVENTS_HEARTBEAT", "15"))
+
+# With STORAGE_BACKEND other than `sql` (see app/storage.py) the todo
+# endpoints (create, list, get, update, delete, stats) go to that store
+# instead of the database; users and auth stay on the database. The
+# endpoints built on the database itself (search, changes, events, export,
+# batch and chat) then answer 501. None: the database, through `RequestDB`.
+_selected_store = load_store()
+todo_store: Optional[TodoStore] = None if isinstance(_selected_store, SQLStore) else _selected_store
+
+
+def requires_database() -> None:
+    if todo_store is not None:
+        raise HTTPException(status_code=501, detail=f"not supported by the {type(todo_store).__name__} storage backend")
+
+
+async def _in_store(method, *args, **kwargs):
+    # Store calls are synchronous and a plug-in store may block on I/O.
+    return await run_in_threadpool(method, *args, **kwargs)
+
 # Serve a tiny frontend for demo purposes
 FRONTEND_DIR = Path(__file__).resolve().parents[1] / "frontend"
 if FRONTEND_DIR.exists():
@@ -34,116 +74,621 @@ def root_index():
 
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
+    events.broker.start()
+    group_commit.start()
+    replica_set.start(engine)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await replica_set.stop()
+    await group_commit.stop()
+    await events.broker.stop()
+    await ai_client.close_client()
+
+
+class DBRequestStatsMiddleware:
+    """Report how many sessions and pool checkouts served a request; with
+    the request-scoped `get_db` dependency both should be at most 1.
+
+    Plain ASGI rather than `@app.middleware("http")`: the latter runs every
+    request in an extra task and pipes streaming bodies through a memory
+    channel, which is most of the per-connection cost of long-lived
+    `/todos/events` streams."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = begin_request_stats()
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Sessions"] = str(stats.sessions)
+                headers["X-DB-Checkouts"] = str(stats.checkouts)
+            await send(message)
+
+        await self.app(scope, receive, send_with_stats)
+
+
+app.add_middleware(DBRequestStatsMiddleware)
+# Outermost, so the latency covers the other middleware too.
+app.add_middleware(metrics.MetricsMiddleware, routes=app.router.routes)
 
 
 @app.post("/todos", response_model=TodoRead, status_code=status.HTTP_201_CREATED)
-def create_todo(todo_in: TodoCreate, current_user: Optional[object] = Depends(optional_current_user)):
+async def create_todo(todo_in: TodoCreate, response: Response, current_user: Optional[object] = Depends(optional_current_user), db: RequestDB = Depends(get_db)):
     if not todo_in.title or not todo_in.title.strip():
         raise HTTPException(status_code=400, detail="title is required")
-    with get_session() as session:
-        # If there are existing users, require authentication to create todos.
-        if not current_user:
-            existing_user = session.exec(select(User)).first()
-            if existing_user:
-                raise HTTPException(status_code=401, detail="Unauthorized")
-        todo = crud.create_todo(session, todo_in, owner=current_user)
-        return todo
+    # If there are existing users, require authentication to create todos.
+    if not current_user and await db.run(crud.users_exist):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    committer = group_commit.committer_for(current_user.id if current_user else None)
+    if todo_store is not None:
+        todo = await _in_store(todo_store.create_todo, todo_in, owner=current_user)
+    elif committer is not None:
+        todo = await committer.submit((todo_in, current_user.id if current_user else None))
+    else:
+        todo = await db.for_owner(current_user).run(crud.create_todo, todo_in, owner=current_user)
+    response.headers["ETag"] = _row_etag(todo.change_version)
+    return todo
+
+
+def _row_etag(change_version: int) -> str:
+    # Strong: a todo's change version changes with every write to it.
+    return f'"{change_version}"'
+
+
+def _if_match_versions(header: Optional[str]) -> Optional[List[int]]:
+    """Change versions named by an If-Match header; None when absent or
+    `*`. Weak or foreign tags never match (strong comparison)."""
+    if header is None or header.strip() == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+
+def _todo_response(row: dict) -> Response:
+    body = dumps({field: row[field] for field in TODO_FIELDS})
+    return Response(body, media_type="application/json", headers={"ETag": _row_etag(row["change_version"])})
+
+
+def _scope_dbs(db: RequestDB, owner, read: bool = False) -> List[RequestDB]:
+    # The owner's shard, or every shard for the anonymous all-todos scope;
+    # `read` lets a read replica serve it (see RequestDB.for_read).
+    if owner or not SHARDED:
+        return [db.for_read(owner) if read else db.for_owner(owner)]
+    return db.all_shards()
+
+
+async def _fan_out(dbs: List[RequestDB], fn, *args, **kwargs) -> list:
+    return await asyncio.gather(*(d.run(fn, *args, **kwargs) for d in dbs))
+
+
+def _todo_dbs(db: RequestDB, owner) -> List[RequestDB]:
+    # Where a todo the caller may access can live: the caller's shard and,
+    # for a signed-in caller, the shard of the unowned todos.
+    home, unowned = db.for_owner(owner), db.for_owner(None)
+    return [home, unowned] if owner and unowned is not home else [home]
+
+
+async def _foreign_todo_error(db: RequestDB, todo_id: UUID, owner):
+    """With sharding, a todo missing from `_todo_dbs` may still be another
+    owner's; answer 401/403 for it as the unsharded database would."""
+    if not SHARDED:
+        return None
+    if any(await _fan_out(db.all_shards(), crud.get_todo_row, todo_id)):
+        return (403, "Forbidden") if owner else (401, "Unauthorized")
+    return None
+
+
+async def _write_todo(db: RequestDB, todo_id: UUID, owner, write):
+    """Run `write(shard_db)` (a by-id crud write returning its error) on
+    the shards in `_todo_dbs` until one finds the todo."""
+    error = None
+    for shard_db in _todo_dbs(db, owner):
+        error = await write(shard_db)
+        if not error or error[0] != 404:
+            return error
+    return await _foreign_todo_error(db, todo_id, owner) or error
+
+
+async def _update_response(db: RequestDB, todo_id: UUID, fields: dict, owner, if_match: Optional[str]) -> Response:
+    if todo_store is not None:
+        row, error = await _in_store(todo_store.update_todo_by_id, todo_id, fields, owner=owner, if_match=_if_match_versions(if_match))
+        _raise_write_error(error)
+        return _todo_response(row)
+    row = None
+
+    async def write(shard_db):
+        nonlocal row
+        row, error = await shard_db.run(
+            crud.update_todo_by_id, todo_id, fields, owner=owner, if_match=_if_match_versions(if_match)
+        )
+        return error
+
+    _raise_write_error(await _write_todo(db, todo_id, owner, write))
+    return _todo_response(row)
+
+
+def _raise_write_error(error) -> None:
+    if error:
+        raise HTTPException(status_code=error[0], detail=error[1])
+
+
+def _etag(version: int, request: Request, owner) -> str:
+    # The owner's change version plus a digest of the scope and query, so the
+    # tag changes with any write the listing could reflect.
+    scope = owner.id.hex if owner else ""
+    digest = hashlib.blake2s(f"{scope}?{request.url.query}".encode(), digest_size=6).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # Weak comparison: W/ prefixes are ignored on both sides.
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
 
 
 @app.get("/todos", response_model=List[TodoRead])
-def list_todos(completed: Optional[bool] = None, sort: Optional[str] = None, current_user: Optional[object] = Depends(optional_current_user)):
+async def list_todos(
+    request: Request,
+    completed: Optional[bool] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    current_user: Optional[object] = Depends(optional_current_user),
+    db: RequestDB = Depends(get_db),
+):
     # `current_user` dependency is optional; when provided, only return user's todos.
-    with get_session() as session:
-        owner = None
-        if current_user:
-            owner = current_user
-        return crud.list_todos(session, owner=owner, completed=completed, sort_by=sort)
+    owner = None
+    if current_user:
+        owner = current_user
+    if todo_store is not None:
+        return await _store_list_response(owner, completed, sort, limit, after)
+    # Version and listing come from the same databases, so the ETag and the
+    # cache key match the rows even when a replica serves them.
+    dbs = _scope_dbs(db, owner, read=True)
+    version = sum(await _fan_out(dbs, sync.current_version, owner))
+    etag = _etag(version, request, owner)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # Serialized responses are cached per scope, version and query; a hit
+    # skips the query and serialization (see app/response_cache.py).
+    scope = owner.id.hex if owner else ALL_TODOS_SCOPE
+    key = response_cache.key(scope, version, request.query_params.multi_items())
+    cached = response_cache.get(key)
+    if cached is None:
+        cached = await _list_response(dbs, owner, completed, sort, limit, after)
+        response_cache.set(key, scope, cached)
+        headers["X-Cache"] = "miss"
+    else:
+        headers["X-Cache"] = "hit"
+    if cached.next_cursor:
+        headers["X-Next-Cursor"] = cached.next_cursor
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+async def _list_response(dbs: List[RequestDB], owner, completed, sort, limit, after) -> CachedResponse:
+    # Unpaged and paged listings share sorts and order, so the unpaged list
+    # is the concatenation of the pages.
+    try:
+        if limit is None and after is None:
+            parts = await _fan_out(dbs, crud.list_todos, owner=owner, completed=completed, sort_by=sort, as_rows=True)
+            return CachedResponse(encode_todo_rows(parts[0] if len(parts) == 1 else crud.merge_todo_lists(parts, sort)))
+        # Keyset pagination: the cursor for the next page is returned in a
+        # header so the body keeps the same list shape as the unpaged call.
+        pages = await _fan_out(
+            dbs, crud.list_todos_page, owner=owner, completed=completed, sort_by=sort,
+            limit=limit or DEFAULT_PAGE_SIZE, after=after, as_rows=True,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    rows, next_cursor = pages[0] if len(pages) == 1 else crud.merge_todo_pages(pages, sort, limit or DEFAULT_PAGE_SIZE)
+    return CachedResponse(encode_todo_rows(rows), next_cursor)
+
+
+async def _store_list_response(owner, completed, sort, limit, after) -> Response:
+    headers = {}
+    try:
+        if limit is None and after is None:
+            todos = await _in_store(todo_store.list_todos, owner=owner, completed=completed, sort_by=sort)
+        else:
+            todos, next_cursor = await _in_store(
+                todo_store.list_todos_page, owner=owner, completed=completed, sort_by=sort,
+                limit=limit or DEFAULT_PAGE_SIZE, after=after,
+            )
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    body = dumps([{field: getattr(todo, field) for field in TODO_FIELDS} for todo in todos])
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/todos/search", response_model=List[TodoRead], dependencies=[Depends(requires_database)])
+async def search_todos(
+    response: Response,
+    q: str,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    after: Optional[str] = None,
+    current_user: Optional[object] = Depends(optional_current_user),
+    db: RequestDB = Depends(get_db),
+):
+    # Results are ranked, so the cursor carries an offset rather than a key.
+    offset = 0
+    if after:
+        try:
+            kind, offset = decode_cursor(after)
+            if kind != "search" or not isinstance(offset, int) or offset < 0:
+                raise ValueError
+        except ValueError:
+            raise HTTPException(status_code=400, detail="invalid cursor")
+    dbs = _scope_dbs(db, current_user)
+    try:
+        if len(dbs) == 1:
+            todos = await dbs[0].run(search.search_todos, q, owner=current_user, limit=limit + 1, offset=offset)
+        else:
+            # Every shard's best `offset + limit + 1`, merged by rank.
+            parts = await _fan_out(dbs, search.search_todos, q, owner=current_user, limit=offset + limit + 1, with_rank=True)
+            ranked = sorted((hit for part in parts for hit in part), key=lambda hit: (hit[1], hit[0].id))
+            todos = [todo for todo, _ in ranked[offset:offset + limit + 1]]
+    except RuntimeError as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+    if len(todos) > limit:
+        todos = todos[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(["search", offset + limit])
+    return todos
+
+
+@app.get("/todos/changes", response_model=TodoChanges, dependencies=[Depends(requires_database)])
+async def todo_changes(since: int = Query(0, ge=0), current_user: Optional[object] = Depends(optional_current_user), db: RequestDB = Depends(get_db)):
+    # Upserts and tombstones after version `since`; pass the returned
+    # `version` as `since` on the next call. since=0 is a full sync.
+    return await db.for_owner(current_user).run(sync.changes_since, current_user, since)
+
+
+@app.post("/todos/events/token", response_model=StreamTokenResponse, dependencies=[Depends(requires_database)])
+async def todo_events_token(current_user=Depends(get_current_user)):
+    # A short-lived token for `GET /todos/events?token=`, so the API token
+    # itself never goes into a URL.
+    return {"token": issue_stream_token(current_user), "expires_in": STREAM_TOKEN_TTL}
+
+
+@app.get("/todos/events", dependencies=[Depends(requires_database)])
+async def todo_events(current_user=Depends(get_stream_user)):
+    # Server-Sent Events for the caller's todos; see app/events.py.
+    stream = events.sse_stream(stats.owner_key(current_user.id), heartbeat=EVENTS_HEARTBEAT)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream, media_type="text/event-stream", headers=headers)
+
+
+@app.get("/todos/stats", response_model=TodoStatsRead)
+async def todo_stats(current_user: Optional[object] = Depends(optional_current_user), db: RequestDB = Depends(get_db)):
+    # Same scope as GET /todos: the caller's todos, or all todos when anonymous.
+    if todo_store is not None:
+        return await _in_store(todo_store.todo_stats, owner=current_user)
+    parts = await _fan_out(_scope_dbs(db, current_user, read=True), stats.todo_stats, owner=current_user)
+    return parts[0] if len(parts) == 1 else stats.merge_todo_stats(parts)
+
+
+@app.get("/todos/export", dependencies=[Depends(requires_database)])
+def export_todos(format: str = "ndjson", current_user: Optional[object] = Depends(optional_current_user)):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+    # The body is produced after this handler returns, so the generator owns
+    # its sessions (on the sync engines) rather than sharing the request's.
+    if current_user:
+        engines = [data_engine(current_user.id)]
+    else:
+        engines = list(data_engines().values())
+
+    def chunks():
+        with ExitStack() as stack:
+            sessions = [stack.enter_context(get_session(bind)) for bind in engines]
+            yield from iter_export(sessions, owner=current_user, fmt=format)
+
+    headers = {"Content-Disposition": f'attachment; filename="todos.{format}"'}
+    return StreamingResponse(chunks(), media_type=EXPORT_FORMATS[format], headers=headers)
+
+
+@app.post("/todos:batch", response_model=BatchResponse, dependencies=[Depends(requires_database)])
+async def batch_todos(batch: BatchRequest, current_user: Optional[object] = Depends(optional_current_user), db: RequestDB = Depends(get_db)):
+    if len(batch.operations) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_BATCH_SIZE} operations per batch")
+    # Same rule as POST /todos: anonymous creates only while no users exist.
+    allow_create = True
+    if not current_user and any(op.op == "create" for op in batch.operations):
+        allow_create = not await db.run(crud.users_exist)
+    results = await db.for_owner(current_user).run(crud.apply_batch, batch.operations, owner=current_user, allow_create=allow_create)
+    return {"results": results}
+
+
+@app.get("/todos/{todo_id}", response_model=TodoRead)
+async def get_todo(todo_id: UUID, current_user: Optional[object] = Depends(optional_current_user), db: RequestDB = Depends(get_db)):
+    row = None
+    if todo_store is not None:
+        row = await _in_store(todo_store.get_todo_row, todo_id)
+    else:
+        for shard_db in _todo_dbs(db, current_user):
+            row = await shard_db.run(crud.get_todo_row, todo_id)
+            if row:
+                break
+        if not row:
+            _raise_write_error(await _foreign_todo_error(db, todo_id, current_user))
+    if not row:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    if row["owner_id"] and not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if row["owner_id"] and row["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return _todo_response(row)
 
 
 @app.put("/todos/{todo_id}", response_model=TodoRead)
-def update_todo(todo_id: UUID, todo_in: TodoCreate, current_user: Optional[object] = Depends(optional_current_user)):
+async def update_todo(
+    todo_id: UUID,
+    todo_in: TodoCreate,
+    if_match: Optional[str] = Header(None),
+    current_user: Optional[object] = Depends(optional_current_user),
+    db: RequestDB = Depends(get_db),
+):
     if not todo_in.title or not todo_in.title.strip():
         raise HTTPException(status_code=400, detail="title is required")
-    with get_session() as session:
-        todo = crud.get_todo(session, todo_id)
-        if not todo:
-            raise HTTPException(status_code=404, detail="Todo not found")
-        if todo.owner_id and not current_user:
-            raise HTTPException(status_code=401, detail="Unauthorized")
-        if todo.owner_id and todo.owner_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Forbidden")
-        return crud.update_todo(session, todo, todo_in)
+    return await _update_response(db, todo_id, todo_in.dict(), current_user, if_match)
+
+
+@app.patch("/todos/{todo_id}", response_model=TodoRead)
+async def patch_todo(
+    todo_id: UUID,
+    patch: TodoPatch,
+    if_match: Optional[str] = Header(None),
+    current_user: Optional[object] = Depends(optional_current_user),
+    db: RequestDB = Depends(get_db),
+):
+    fields = patch.dict(exclude_unset=True)
+    error = _patch_error(fields)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    return await _update_response(db, todo_id, fields, current_user, if_match)
+
+
+def _patch_error(fields: dict) -> Optional[str]:
+    """Why the fields of a `TodoPatch` cannot be written, or None."""
+    if not fields:
+        return "no fields to update"
+    for name in ("title", "status", "priority"):
+        if name in fields and fields[name] is None:
+            return f"{name} cannot be null"
+    if "title" in fields and not fields["title"].strip():
+        return "title is required"
+    return None
 
 
 @app.delete("/todos/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_todo(todo_id: UUID, current_user: Optional[object] = Depends(optional_current_user)):
-    with get_session() as session:
-        todo = crud.get_todo(session, todo_id)
-        if not todo:
-            raise HTTPException(status_code=404, detail="Todo not found")
-        if todo.owner_id and not current_user:
-            raise HTTPException(status_code=401, detail="Unauthorized")
-        if todo.owner_id and todo.owner_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Forbidden")
-        crud.delete_todo(session, todo)
+async def delete_todo(
+    todo_id: UUID,
+    if_match: Optional[str] = Header(None),
+    current_user: Optional[object] = Depends(optional_current_user),
+    db: RequestDB = Depends(get_db),
+):
+    if todo_store is not None:
+        _raise_write_error(await _in_store(todo_store.delete_todo_by_id, todo_id, owner=current_user, if_match=_if_match_versions(if_match)))
         return
+    _raise_write_error(await _write_todo(db, todo_id, current_user, lambda shard_db: shard_db.run(
+        crud.delete_todo_by_id, todo_id, owner=current_user, if_match=_if_match_versions(if_match)
+    )))
+    return
 
 
 @app.post("/users", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
-def create_user(user_in: UserCreate):
+async def create_user(user_in: UserCreate, db: RequestDB = Depends(get_db)):
     if not user_in.username or not user_in.username.strip():
         raise HTTPException(status_code=400, detail="username is required")
     token = generate_token(16)
-    with get_session() as session:
-        # create user and return token
-        user = crud.create_user(session, username=user_in.username, token=token)
-        return {"token": user.token}
+    # create user and return token
+    user = await db.run(crud.create_user, username=user_in.username, token=token)
+    return {"token": user.token}
 
 
-@app.post("/chat")
-def chat_endpoint(payload: dict, current_user: Optional[object] = Depends(optional_current_user)):
-    message = payload.get("message") if isinstance(payload, dict) else None
-    if not message:
-        raise HTTPException(status_code=400, detail="message is required")
-    # parse intent
-    from .chat import parse_chat
-    intent, payload = parse_chat(message)
-    with get_session() as session:
-        if intent == "create":
-            todo_in = TodoCreate(**payload)
-            todo = crud.create_todo(session, todo_in, owner=current_user)
-            return {"result": "created", "todo": todo.dict()}
-        if intent == "list":
-            todos = crud.list_todos(session, owner=current_user)
-            return {"result": "list", "todos": [t.dict() for t in todos]}
-        if intent == "delete":
-            tid = payload.get("id")
-            todo = crud.get_todo(session, tid)
-            if not todo:
-                raise HTTPException(status_code=404, detail="Todo not found")
-            if todo.owner_id and not current_user:
-                raise HTTPException(status_code=401, detail="Unauthorized")
-            if todo.owner_id and todo.owner_id != current_user.id:
-                raise HTTPException(status_code=403, detail="Forbidden")
-            crud.delete_todo(session, todo)
-            return {"result": "deleted", "id": tid}
+def _validation_error(exc: ValidationError):
+    err = exc.errors()[0]
+    return 400, f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}"
+
+
+def _chat_operation(intent: str, payload: dict):
+    """BatchOperation for a chat create or delete, or an (status, error)
+    pair when the parsed payload cannot become one."""
+    try:
+        tid = UUID(str(payload.get("id"))) if intent != "create" else None
+    except ValueError:
+        return 404, "Todo not found"
+    try:
+        data = TodoCreate(**payload) if intent == "create" else None
+    except ValidationError as exc:
+        return _validation_error(exc)
+    return BatchOperation(op=intent, id=tid, data=data)
+
+
+def _chat_update(session: Session, payload: dict, current_user):
+    """Write only the fields a chat update names, like PATCH; returns the
+    row or an (status, error) pair."""
+    try:
+        tid = UUID(str(payload.get("id")))
+    except ValueError:
+        return 404, "Todo not found"
+    try:
+        fields = TodoPatch(**payload.get("data", {})).dict(exclude_unset=True)
+    except ValidationError as exc:
+        return _validation_error(exc)
+    error = _patch_error(fields)
+    if error:
+        return 400, error
+    row, error = crud.update_todo_by_id(session, tid, fields, owner=current_user, commit=False)
+    return error or row
+
+
+_CHAT_RESULTS = {"create": "created", "delete": "deleted"}
+
+
+def _run_chat_intents(session: Session, intents: list, current_user) -> List[dict]:
+    """Execute parsed chat commands in message order in one transaction:
+    each run of consecutive creates/deletes goes through one
+    `crud.apply_batch`, an update writes only the fields it names
+    (`crud.update_todo_by_id`), and a list command sees exactly the writes
+    before it. Commits once at the end. Returns one result dict per command,
+    failures included."""
+    results: List[Optional[dict]] = [None] * len(intents)
+    ops, op_positions = [], []
+    wrote = False
+
+    def flush():
+        nonlocal wrote
+        if not ops:
+            return
+        applied = crud.apply_batch(session, ops, owner=current_user, commit=False)
+        for i, item in zip(op_positions, applied):
+            intent, payload = intents[i]
+            if item["error"]:
+                results[i] = {"result": "error", "status": item["status"], "error": item["error"]}
+            elif intent == "delete":
+                results[i] = {"result": "deleted", "id": payload.get("id")}
+            else:
+                results[i] = {"result": _CHAT_RESULTS[intent], "todo": item["todo"]}
+        ops.clear()
+        op_positions.clear()
+        wrote = True
+
+    for i, (intent, payload) in enumerate(intents):
         if intent == "update":
-            tid = payload.get("id")
-            todo = crud.get_todo(session, tid)
-            if not todo:
-                raise HTTPException(status_code=404, detail="Todo not found")
-            if todo.owner_id and not current_user:
-                raise HTTPException(status_code=401, detail="Unauthorized")
-            if todo.owner_id and todo.owner_id != current_user.id:
-                raise HTTPException(status_code=403, detail="Forbidden")
-            todo_in = TodoCreate(**payload.get("data", {}))
-            updated = crud.update_todo(session, todo, todo_in)
-            return {"result": "updated", "todo": updated.dict()}
-    return {"result": "unknown"}
+            flush()
+            row = _chat_update(session, payload, current_user)
+            if isinstance(row, tuple):
+                results[i] = {"result": "error", "status": row[0], "error": row[1]}
+            else:
+                results[i] = {"result": "updated", "todo": row}
+                wrote = True
+        elif intent in _CHAT_RESULTS:
+            op = _chat_operation(intent, payload)
+            if isinstance(op, tuple):
+                results[i] = {"result": "error", "status": op[0], "error": op[1]}
+            else:
+                ops.append(op)
+                op_positions.append(i)
+        elif intent == "list":
+            flush()
+            results[i] = {"result": "list", "todos": todo_row_dicts(crud.list_todos(session, owner=current_user, as_rows=True))}
+        else:
+            results[i] = {"result": "unknown"}
+    flush()
+    if wrote:
+        session.commit()
+    return results
+
+
+@app.post("/chat", dependencies=[Depends(requires_database)])
+async def chat_endpoint(payload: dict, current_user: Optional[object] = Depends(optional_current_user), db: RequestDB = Depends(get_db)):
+    # Either {"message": "..."}, one command answered in the original shape,
+    # or {"messages": [...]}, each of which may hold several commands
+    # separated by ";" or newlines, answered as {"results": [...]}.
+    batch = isinstance(payload, dict) and "messages" in payload
+    messages = payload.get("messages") if batch else [payload.get("message")] if isinstance(payload, dict) else None
+    if not messages or not isinstance(messages, list) or not all(isinstance(m, str) and m for m in messages):
+        raise HTTPException(status_code=400, detail="message is required")
+    # Parse everything first (LLM when configured, awaited without holding a
+    # thread), then execute all commands together.
+    parsed = await asyncio.gather(*(parse_chat_commands_async(m) for m in messages))
+    intents = [intent for commands in parsed for intent in commands]
+    if len(intents) > MAX_CHAT_COMMANDS:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_CHAT_COMMANDS} commands per request")
+    if not batch and len(intents) > 1:
+        raise HTTPException(status_code=400, detail='several commands: send them as {"messages": [...]}')
+    results = await db.for_owner(current_user).run(_run_chat_intents, intents or [("unknown", {})], current_user)
+    if batch:
+        return Response(dumps({"results": results}), media_type="application/json")
+    # A single command keeps the original response shape and status codes.
+    result = results[0]
+    if result["result"] == "error":
+        raise HTTPException(status_code=result["status"], detail=result["error"])
+    return Response(dumps(result), media_type="application/json")
 
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/health/cache")
+def health_cache():
+    return {"responses": response_cache.stats(), "tokens": token_cache.stats()}
+
+
+@app.get("/health/db")
+def health_db():
+    pools = {"engine": pool_stats(engine)}
+    if async_engine is not None:
+        pools["async_engine"] = pool_stats(async_engine)
+    for name, extra_engine in {**shard_engines, **replica_engines}.items():
+        pools[name] = pool_stats(extra_engine)
+    return pools
+
+
+@app.get("/health/replicas")
+def health_replicas():
+    # Lag, health and reads served per read replica; empty without replicas.
+    return replica_set.stats()
+
+
+def _state_samples():
+    """Scrape-time samples for state kept by other modules."""
+    yield from metrics.pool_samples("engine", pool_stats(engine))
+    if async_engine is not None:
+        yield from metrics.pool_samples("async_engine", pool_stats(async_engine))
+    for name, extra_engine in {**shard_engines, **replica_engines}.items():
+        yield from metrics.pool_samples(name, pool_stats(extra_engine))
+    for name, replica in replica_set.stats().items():
+        labels = {"replica": name}
+        yield "replica_healthy", "gauge", "1 while the read replica is in rotation.", labels, int(replica["healthy"])
+        if replica["lag_seconds"] is not None:
+            yield "replica_lag_seconds", "gauge", "Replica lag measured by the last heartbeat check.", labels, replica["lag_seconds"]
+        yield "replica_reads_total", "counter", "Requests whose reads a read replica served.", labels, replica["reads"]
+        yield "replica_ejections_total", "counter", "Times the read replica was taken out of rotation.", labels, replica["ejections"]
+    yield from metrics.optional_samples("response_cache", {
+        "hits": "counter", "misses": "counter", "invalidations": "counter",
+        "entries": "gauge", "bytes": "gauge", "evictions": "counter",
+    }, response_cache.stats())
+    yield from metrics.optional_samples("auth_token_cache", {
+        "hits": "counter", "misses": "counter", "size": "gauge",
+    }, token_cache.stats())
+    yield from metrics.optional_samples("events", {
+        "subscribers": "gauge", "published": "counter", "delivered": "counter", "overflows": "counter",
+    }, events.broker.stats())
+    for name, committer in group_commit.committers.items():
+        yield from metrics.optional_samples(
+            "group_commit", {"queued": "gauge", "fallbacks": "counter"}, committer.stats(), {"engine": name})
+    client = ai_client.get_client()
+    if client is not None:
+        yield "llm_circuit_open", "gauge", "1 while the LLM circuit breaker is open.", {}, int(client.breaker.state == "open")
+
+
+metrics.add_collector(_state_samples)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
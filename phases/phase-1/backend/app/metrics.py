@@ -0,0 +1,314 @@
+"""In-process metrics in the Prometheus text format (`GET /metrics`).
+
+A deliberately small registry: counters, gauges and histograms with labels,
+safe to update from the event loop and from threadpool workers, rendered on
+scrape. Nothing is pushed anywhere and no agent is needed; point a
+Prometheus scrape (or the pod annotations in the Helm chart) at `/metrics`.
+
+Sources:
+
+- `MetricsMiddleware`: latency histogram, request count and in-flight gauge
+  per route template (`/todos/{todo_id}`, never the raw path);
+- `instrument_engine`: query count and duration per statement kind from
+  SQLAlchemy cursor events; `database.get_db` observes the pool checkout
+  wait into `POOL_WAIT`;
+- `group_commit`: group sizes, flush time and caller wait;
+- `chat` / `ai_client`: LLM call latency and outcome, and how often chat
+  parsing fell back to the rule-based parser;
+- collectors registered with `add_collector`, read at scrape time (pool,
+  response cache, event broker state).
+
+Paths that match no route are grouped under the route "<unmatched>" so
+the label set stays bounded.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event as sa_event
+from starlette.routing import Match
+
+# Latency buckets in seconds, from sub-millisecond queries to slow LLM calls.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+# (name, kind, help, labels, value) as yielded by collectors.
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += seconds
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return int(sum(state[:-1])) if state else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(state[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """`collector()` is called on every scrape and yields `Sample`s for
+        values that already live elsewhere (pool sizes, cache counters)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        families: Dict[str, List[str]] = {}
+        for collector in self._collectors:
+            for name, kind, help, labels, value in collector():
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                family.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+add_collector = registry.add_collector
+render = registry.render
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template, method and status.", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the end of the response body.", ("method", "route")))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served (open event streams included).", ("method", "route")))
+DB_QUERIES = registry.register(Counter(
+    "db_queries_total", "SQL statements executed, by engine and statement kind.", ("engine", "statement")))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time.", ("engine", "statement")))
+DB_ERRORS = registry.register(Counter(
+    "db_query_errors_total", "SQL statements that raised.", ("engine",)))
+POOL_WAIT = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time a request waited for a pooled connection.", ("engine",)))
+LLM_CALLS = registry.register(Counter(
+    "llm_calls_total", "LLM completion calls by client and outcome (ok, error, rejected).", ("client", "outcome")))
+LLM_LATENCY = registry.register(Histogram(
+    "llm_call_duration_seconds", "LLM completion call time.", ("client",)))
+CHAT_FALLBACKS = registry.register(Counter(
+    "chat_rule_based_fallbacks_total",
+    "Chat commands parsed by the rule-based parser, by reason (disabled: no AI_API_KEY; llm_failed: no usable reply).",
+    ("client", "reason")))
+GROUP_COMMIT_SIZE = registry.register(Histogram(
+    "group_commit_size", "Creates committed per group commit transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)))
+GROUP_COMMIT_FLUSH = registry.register(Histogram(
+    "group_commit_flush_duration_seconds", "Time to write and commit one group."))
+GROUP_COMMIT_WAIT = registry.register(Histogram(
+    "group_commit_wait_seconds", "Time from queueing a create to its group being committed."))
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (see `main.DBRequestStatsMiddleware` for why)
+    recording latency, count and in-flight requests per route template."""
+
+    def __init__(self, app, routes: Sequence):
+        self.app = app
+        self.routes = routes
+
+    def route_of(self, scope) -> str:
+        partial = None
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "<unmatched>"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, route = scope["method"], self.route_of(scope)
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(method, route)
+            HTTP_LATENCY.observe(time.perf_counter() - start, method, route)
+            HTTP_REQUESTS.inc(method, route, status)
+
+
+_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def _statement_kind(statement: str) -> str:
+    word = statement.lstrip()[:7].split(None, 1)
+    kind = word[0].upper() if word else ""
+    return kind if kind in _STATEMENTS else "OTHER"
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Count and time every statement run on the sync `engine` (pass
+    `async_engine.sync_engine` for the async one)."""
+
+    @sa_event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @sa_event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        kind = _statement_kind(statement)
+        DB_QUERIES.inc(name, kind)
+        DB_QUERY_LATENCY.observe(elapsed, name, kind)
+
+    @sa_event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("metrics_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        DB_ERRORS.inc(name)
+
+
+def observe_llm_call(client: str, start: float, outcome: str) -> None:
+    LLM_LATENCY.observe(time.perf_counter() - start, client)
+    LLM_CALLS.inc(client, outcome)
+
+
+def pool_samples(name: str, stats: dict) -> Iterable[Sample]:
+    """Samples for a `database.pool_stats` result."""
+    for key, help in (
+        ("size", "Configured pool size."),
+        ("checked_out", "Connections currently checked out."),
+        ("checked_in", "Idle connections in the pool."),
+        ("overflow", "Connections beyond the pool size (negative: unused capacity)."),
+    ):
+        if key in stats:
+            yield f"db_pool_{key}", "gauge", help, {"engine": name}, stats[key]
+
+
+def optional_samples(prefix: str, kind_of: Dict[str, str], stats: Optional[dict], labels: Optional[dict] = None) -> Iterable[Sample]:
+    """Numeric entries of a `stats()` dict as samples named `prefix_<key>`
+    (`_total` appended for counters); `kind_of` gives each exported key's
+    type."""
+    if not stats:
+        return
+    for key, kind in kind_of.items():
+        value = stats.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+            yield name, kind, f"{prefix.replace('_', ' ')} {key.replace('_', ' ')}.".capitalize(), labels or {}, value
@@ -2,6 +2,7 @@ from typing import Optional
 from datetime import datetime
 from uuid import uuid4, UUID
 from enum import Enum
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -13,7 +14,7 @@ class Status(str, Enum):
 class User(SQLModel, table=True):
     id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
     username: str = Field(index=True, unique=True)
-    token: str = Field(default_factory=lambda: uuid4().hex, index=True)
+    token: str = Field(default_factory=lambda: uuid4().hex, index=True, unique=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
@@ -26,10 +27,24 @@ class TodoBase(SQLModel):
 
 
 class Todo(TodoBase, table=True):
+    # Composite indexes backing the keyset orderings in `crud.list_todos_page`;
+    # `id` is the tie-breaker so every ordering is total. Keep in step with
+    # the Alembic migrations (alembic/versions).
+    __table_args__ = (
+        Index("ix_todo_owner_status_due_date", "owner_id", "status", "due_date"),
+        Index("ix_todo_owner_created_id", "owner_id", "created_at", "id"),
+        Index("ix_todo_owner_due_date_id", "owner_id", "due_date", "id"),
+        Index("ix_todo_owner_priority_id", "owner_id", "priority", "id"),
+        Index("ix_todo_created_id", "created_at", "id"),
+        Index("ix_todo_owner_change_version", "owner_id", "change_version"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
     owner_id: Optional[UUID] = Field(default=None, foreign_key="user.id", index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Owner's change version (`TodoStats.version`) of the last write to this row.
+    change_version: int = Field(default=0)
 
 
 class TodoCreate(TodoBase):
@@ -41,3 +56,39 @@ class TodoRead(TodoBase):
     owner_id: Optional[UUID]
     created_at: datetime
     updated_at: datetime
+
+
+class TodoStats(SQLModel, table=True):
+    # Per-owner counters maintained by `crud` on every write (see app/stats.py).
+    # Unowned todos are counted under the empty key.
+    owner_key: str = Field(primary_key=True)
+    total: int = Field(default=0)
+    completed: int = Field(default=0)
+    # Bumped once per write transaction touching the owner's todos; drives
+    # ETags and `GET /todos/changes`.
+    version: int = Field(default=0)
+
+
+class TodoPriorityStats(SQLModel, table=True):
+    # Per-owner todo counts by priority, kept next to `TodoStats` by the same
+    # writes. Rows that drop to zero stay.
+    owner_key: str = Field(primary_key=True)
+    priority: int = Field(primary_key=True)
+    total: int = Field(default=0)
+
+
+class TodoTombstone(SQLModel, table=True):
+    # Left behind by deletes so `GET /todos/changes` can report them.
+    __table_args__ = (Index("ix_todotombstone_owner_version", "owner_key", "version"),)
+
+    todo_id: UUID = Field(primary_key=True)
+    owner_key: str
+    version: int
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ReplicaHeartbeat(SQLModel, table=True):
+    # One row, rewritten on the primary every replica check (see
+    # app/replicas.py); its age as read on a replica is that replica's lag.
+    id: int = Field(default=1, primary_key=True)
+    beat_at: float
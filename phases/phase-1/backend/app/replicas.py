@@ -0,0 +1,180 @@
+"""Read replicas of the main database (`DATABASE_REPLICA_URLS`).
+
+`DATABASE_REPLICA_URLS` is a comma-separated list of URLs for streaming
+replicas of `DATABASE_URL` (named `replica0`, `replica1`, ... in order).
+Writes always go to the primary; `RequestDB.for_read` sends the reads that
+tolerate a little lag (listings, stats, token lookups) to a healthy replica
+instead, picked round-robin once per request.
+
+Lag is measured with a heartbeat: every `REPLICA_CHECK_INTERVAL` (1) seconds
+the checker writes the current time to the `replicaheartbeat` row on the
+primary and reads the row back from each replica. How old the replica's copy
+is bounds its lag from above (by one interval at most). A replica more than
+`REPLICA_MAX_LAG` (5) seconds behind, or failing the check, is ejected until
+a later check finds it caught up; replicas start ejected until their first
+check. This needs nothing but replication itself, so it works the same for
+Postgres standbys and for two SQLite files kept in sync by a test.
+
+Read-your-writes: once a transaction that wrote an owner's todos commits, that
+owner's reads stay on the primary for `REPLICA_STICKY_SECONDS` (by default
+the longest lag a healthy replica can have: max lag plus one interval). The
+window is kept per process. A token missing from a replica is looked up
+again on the primary, so a user created moments ago can sign in at once.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .models import ReplicaHeartbeat
+
+logger = logging.getLogger(__name__)
+
+MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", "5"))
+CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_INTERVAL", "1"))
+STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS") or MAX_LAG + CHECK_INTERVAL)
+
+
+def replica_urls(spec: Optional[str]) -> Dict[str, str]:
+    """{name: URL} for a `DATABASE_REPLICA_URLS` value."""
+    urls = [url.strip() for url in (spec or "").split(",") if url.strip()]
+    return {f"replica{i}": url for i, url in enumerate(urls)}
+
+
+def write_heartbeat(primary: Engine, now: float) -> None:
+    table = ReplicaHeartbeat.__table__
+    with primary.begin() as conn:
+        if conn.execute(table.update().where(table.c.id == 1).values(beat_at=now)).rowcount == 0:
+            conn.execute(table.insert().values(id=1, beat_at=now))
+
+
+def read_heartbeat(replica: Engine) -> Optional[float]:
+    table = ReplicaHeartbeat.__table__
+    with replica.connect() as conn:
+        return conn.execute(select(table.c.beat_at).where(table.c.id == 1)).scalar()
+
+
+class ReplicaSet:
+    """Replica engines by name with their measured lag, the ones currently
+    healthy and the owners whose reads must stay on the primary."""
+
+    def __init__(
+        self,
+        engines: Dict[str, Engine],
+        max_lag: float = MAX_LAG,
+        check_interval: float = CHECK_INTERVAL,
+        sticky_seconds: float = STICKY_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._clock = clock
+        self.lag: Dict[str, Optional[float]] = {name: None for name in engines}
+        self._healthy: List[str] = []
+        self._turn = 0
+        self._lock = threading.Lock()
+        self._recent_writes = TTLCache(maxsize=int(os.environ.get("REPLICA_STICKY_SIZE", "100000")), ttl=sticky_seconds)
+        self._task: Optional[asyncio.Task] = None
+        self.reads = {name: 0 for name in engines}
+        self.ejections = {name: 0 for name in engines}
+
+    @property
+    def healthy(self) -> List[str]:
+        return list(self._healthy)
+
+    def wrote(self, owner_keys: Iterable[str]) -> None:
+        """Pin `owner_keys` (owner id hex, "" for unowned) to the primary for
+        the stickiness window."""
+        for key in owner_keys:
+            self._recent_writes.set(key, True)
+
+    def sticky(self, owner_key: str) -> bool:
+        return bool(self.engines) and self._recent_writes.get(owner_key) is not None
+
+    def choose(self) -> Optional[str]:
+        """Next healthy replica, round-robin; None when there is none."""
+        with self._lock:
+            if not self._healthy:
+                return None
+            self._turn += 1
+            name = self._healthy[self._turn % len(self._healthy)]
+            self.reads[name] += 1
+            return name
+
+    def check(self, primary: Engine) -> None:
+        """Write a heartbeat to `primary`, then measure every replica's lag
+        and eject or readmit it."""
+        now = self._clock()
+        try:
+            write_heartbeat(primary, now)
+        except SQLAlchemyError:
+            # Replicas then look further behind, which errs on the safe side.
+            logger.warning("replica heartbeat write failed", exc_info=True)
+        healthy = []
+        for name, replica in self.engines.items():
+            try:
+                beat_at = read_heartbeat(replica)
+            except SQLAlchemyError:
+                logger.warning("replica %s failed its check", name, exc_info=True)
+                beat_at = None
+            lag = None if beat_at is None else max(0.0, now - beat_at)
+            self.lag[name] = lag
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(name)
+            elif name in self._healthy:
+                self.ejections[name] += 1
+                logger.warning("replica %s ejected (lag %s)", name, "unknown" if lag is None else f"{lag:.1f}s")
+        with self._lock:
+            self._healthy = healthy
+
+    def start(self, primary: Engine) -> None:
+        """Check now, then every `check_interval` seconds on the running
+        event loop (a no-op without replicas)."""
+        if self.engines:
+            self._task = asyncio.get_running_loop().create_task(self._run(primary))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, primary: Engine) -> None:
+        try:
+            while True:
+                try:
+                    await run_in_threadpool(self.check, primary)
+                except Exception:
+                    # An unexpected error must not stop the checks; until one
+                    # succeeds, no replica is trusted.
+                    logger.exception("replica check failed")
+                    with self._lock:
+                        self._healthy = []
+                await asyncio.sleep(self.check_interval)
+        finally:
+            # Without checks nobody ejects a lagging replica.
+            with self._lock:
+                self._healthy = []
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "healthy": name in self._healthy,
+                "lag_seconds": self.lag[name],
+                "reads": self.reads[name],
+                "ejections": self.ejections[name],
+            }
+            for name in self.engines
+        }
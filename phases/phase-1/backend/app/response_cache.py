@@ -0,0 +1,195 @@
+"""Cache of serialized `GET /todos` responses.
+
+Entries are keyed by scope (the owner, or "*" for the anonymous listing of
+every todo), the scope's change version (`sync.current_version`, read for the
+ETag anyway) and the query string, and hold the encoded JSON body, so a hit
+skips both the query and pydantic. Because the version is part of the key a
+write can never be answered from a stale entry, on any worker; on top of
+that `crud` invalidates the written owners' entries (and the anonymous
+ones) when its transaction commits, so dead entries do not sit in memory
+until LRU eviction.
+
+The store is pluggable: `MemoryBackend` is a byte-bounded LRU
+(`RESPONSE_CACHE_BYTES`, 0 disables caching); `RESPONSE_CACHE_BACKEND=
+package.module:factory` selects another `Backend`, e.g. one over Redis.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from .utils import load_factory
+
+ALL_TODOS_SCOPE = "*"
+_PENDING = "response_cache_scopes"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    next_cursor: Optional[str] = None
+
+
+class Backend(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, scope: str, value: CachedResponse) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate(self, scopes: Iterable[str]) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryBackend(Backend):
+    """Thread-safe LRU bounded by the total size of the cached bodies, with a
+    scope -> keys index so invalidation touches only that scope's entries."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[str, CachedResponse]]" = OrderedDict()
+        self._scopes: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, scope, value):
+        size = len(value.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._data[key] = (scope, value)
+            self._scopes.setdefault(scope, set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._discard(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, scopes):
+        with self._lock:
+            for scope in scopes:
+                for key in list(self._scopes.get(scope, ())):
+                    self._discard(key)
+
+    def _discard(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        scope, value = entry
+        self._bytes -= len(value.body)
+        keys = self._scopes.get(scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[scope]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class ResponseCache:
+    def __init__(self, backend: Optional[Backend]):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Lookups run on threadpool workers too.
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def key(scope: str, version: int, query_items: Iterable[Tuple[str, str]]) -> str:
+        return f"{scope}|{version}|{urlencode(sorted(query_items))}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, scope: str, value: CachedResponse) -> None:
+        if self.backend is not None:
+            self.backend.set(key, scope, value)
+
+    def invalidate(self, scopes: Iterable[str]) -> None:
+        if self.backend is not None:
+            with self._lock:
+                self.invalidations += 1
+            self.backend.invalidate(scopes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, invalidations = self.hits, self.misses, self.invalidations
+        lookups = hits + misses
+        out = {
+            "enabled": self.enabled,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "invalidations": invalidations,
+        }
+        if self.backend is not None:
+            out.update(self.backend.stats())
+        return out
+
+
+def load_backend(spec: Optional[str], max_bytes: int) -> Optional[Backend]:
+    """`package.module:factory` -> factory(); otherwise a MemoryBackend, or
+    None (caching off) when `max_bytes` is 0."""
+    if spec:
+        return load_factory(spec)
+    return MemoryBackend(max_bytes) if max_bytes > 0 else None
+
+
+response_cache = ResponseCache(load_backend(
+    os.environ.get("RESPONSE_CACHE_BACKEND"),
+    int(os.environ.get("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024))),
+))
+
+
+def invalidate_on_commit(session: Session, owner_keys: Iterable[str]) -> None:
+    """Drop the cached listings of `owner_keys` (owner id hex, "" for
+    unowned) and the anonymous all-todos listing once `session` commits."""
+    scopes = session.info.setdefault(_PENDING, set())
+    scopes.update(owner_keys)
+    scopes.add(ALL_TODOS_SCOPE)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    scopes = session.info.pop(_PENDING, None)
+    if scopes:
+        response_cache.invalidate(scopes)
+
+
+@sa_event.listens_for(Session, "after_soft_rollback")
+def _on_rollback(session, previous_transaction):
+    session.info.pop(_PENDING, None)
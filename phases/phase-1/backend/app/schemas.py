@@ -1,8 +1,11 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 from datetime import datetime
+from enum import Enum
 from pydantic import BaseModel
 
+from .models import Status, TodoCreate, TodoRead
+
 
 class UserCreate(BaseModel):
     username: str
@@ -15,4 +18,63 @@ class UserRead(BaseModel):
 
 class TokenResponse(BaseModel):
     token: str
-# Placeholder for Phase II schemas (User, Todo changes)
+
+
+class StreamTokenResponse(BaseModel):
+    token: str
+    expires_in: int
+
+
+class BatchOp(str, Enum):
+    create = "create"
+    update = "update"
+    delete = "delete"
+
+
+class BatchOperation(BaseModel):
+    op: BatchOp
+    # Target todo for update/delete; ignored for create.
+    id: Optional[UUID] = None
+    # Full todo body for create/update (same semantics as POST/PUT).
+    data: Optional[TodoCreate] = None
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    op: BatchOp
+    status: int
+    id: Optional[UUID] = None
+    todo: Optional[TodoRead] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
+
+
+class TodoStatsRead(BaseModel):
+    total: int
+    by_status: Dict[str, int]
+    by_priority: Dict[int, int]
+    overdue: int
+    due_this_week: int
+    no_due_date: int
+
+
+class TodoPatch(BaseModel):
+    """Body of PATCH /todos/{id}: only the fields present are written."""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[Status] = None
+    priority: Optional[int] = None
+    due_date: Optional[datetime] = None
+
+
+class TodoChanges(BaseModel):
+    version: int
+    upserts: List[TodoRead]
+    deletes: List[UUID]
@@ -0,0 +1,160 @@
+"""Full-text search over todo title and description.
+
+SQLite uses an FTS5 table, `todo_fts`, that `crud` keeps in sync on every
+write. Its rowid is derived from the todo UUID so that deletes and updates
+are rowid lookups; the UUID is stored as well and is what results are joined
+on. Postgres needs no side table: a GIN index over the `to_tsvector`
+expression is maintained by the database itself.
+"""
+import re
+import weakref
+from typing import Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, literal_column, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from .models import Todo, User
+
+MAX_TERMS = 10
+
+# Kept out of SQLModel.metadata so `create_all` never tries to create it.
+_fts_metadata = MetaData()
+todo_fts = Table(
+    "todo_fts",
+    _fts_metadata,
+    Column("rowid", Integer, primary_key=True),
+    Column("todo_id", String),
+    Column("owner_id", String),
+    Column("title", String),
+    Column("description", String),
+)
+
+_PG_DOCUMENT = "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))"
+
+# Engine -> whether `todo_fts` exists, so writes on databases created without
+# it (plain `create_all`, in-memory test engines) skip indexing.
+_fts_available: "weakref.WeakKeyDictionary[Engine, bool]" = weakref.WeakKeyDictionary()
+
+
+def _engine_of(session: Session) -> Engine:
+    bind = session.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+def _fts_rowid(todo_id: UUID) -> int:
+    # Top 63 bits of the UUID: a positive SQLite integer key.
+    return todo_id.int >> 65
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """Create the search structures for `engine`'s dialect if missing."""
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'todo_fts'")).first()
+            if not exists:
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE todo_fts USING fts5("
+                    "todo_id UNINDEXED, owner_id UNINDEXED, title, description, "
+                    "tokenize='unicode61', prefix='2 3')"
+                ))
+                _backfill(conn)
+            _fts_available[engine] = True
+        elif engine.dialect.name == "postgresql":
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_todo_search ON todo USING gin ({_PG_DOCUMENT})"))
+
+
+def _backfill(conn) -> None:
+    result = conn.execute(select(Todo.id, Todo.owner_id, Todo.title, Todo.description))
+    for rows in result.partitions(1000):
+        conn.execute(todo_fts.insert(), [_fts_row(r.id, r.owner_id, r.title, r.description) for r in rows])
+
+
+def _enabled(session: Session) -> bool:
+    engine = _engine_of(session)
+    if engine.dialect.name != "sqlite":
+        return False
+    available = _fts_available.get(engine)
+    if available is None:
+        available = session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'todo_fts'")).first() is not None
+        _fts_available[engine] = available
+    return available
+
+
+def _fts_row(todo_id: UUID, owner_id: Optional[UUID], title: str, description: Optional[str]) -> dict:
+    return {
+        "rowid": _fts_rowid(todo_id),
+        "todo_id": todo_id.hex,
+        "owner_id": owner_id.hex if owner_id else None,
+        "title": title,
+        "description": description or "",
+    }
+
+
+def index_todos(session: Session, todos: Iterable) -> None:
+    """Add or replace the search entries for `todos` (objects or mappings
+    with id, owner_id, title and description). Joins the caller's transaction."""
+    if not _enabled(session):
+        return
+    rows = []
+    for todo in todos:
+        if isinstance(todo, dict):
+            rows.append(_fts_row(todo["id"], todo["owner_id"], todo["title"], todo["description"]))
+        else:
+            rows.append(_fts_row(todo.id, todo.owner_id, todo.title, todo.description))
+    if not rows:
+        return
+    session.execute(todo_fts.delete().where(todo_fts.c.rowid.in_([r["rowid"] for r in rows])))
+    session.execute(todo_fts.insert(), rows)
+
+
+def unindex_todos(session: Session, todo_ids: Iterable[UUID]) -> None:
+    if not _enabled(session):
+        return
+    rowids = [_fts_rowid(todo_id) for todo_id in todo_ids]
+    if rowids:
+        session.execute(todo_fts.delete().where(todo_fts.c.rowid.in_(rowids)))
+
+
+def query_terms(q: str) -> List[str]:
+    """Split free text into at most MAX_TERMS lowercase word terms."""
+    return [t.lower() for t in re.findall(r"\w+", q)][:MAX_TERMS]
+
+
+def search_todos(
+    session: Session, q: str, owner: Optional[User] = None, limit: int = 20, offset: int = 0, with_rank: bool = False
+) -> list:
+    """Return todos matching every term of `q` (each as a prefix), best first.
+
+    With `with_rank`, returns (todo, rank) pairs, lower ranks first, for
+    merging results from several shards; ranks are computed per database, so
+    such a merge is approximate.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return []
+    dialect = _engine_of(session).dialect.name
+    if dialect == "postgresql":
+        document = literal_column(_PG_DOCUMENT)
+        query = func.to_tsquery("simple", " & ".join(f"{t}:*" for t in terms))
+        rank = -func.ts_rank(document, query)
+        stmt = select(Todo, rank).where(document.op("@@")(query)).order_by(rank, Todo.id)
+        if owner:
+            stmt = stmt.where(Todo.owner_id == owner.id)
+        rows = session.exec(stmt.offset(offset).limit(limit)).all()
+        return [tuple(row) for row in rows] if with_rank else [todo for todo, _ in rows]
+    if not _enabled(session):
+        raise RuntimeError("full-text search is not available on this database")
+    # Rank and page inside FTS5 (owner filter included) and only then join
+    # the page back to `todo`; joining first makes SQLite rank every match
+    # through the join.
+    match = " ".join(f'"{t}"*' for t in terms)
+    rank = literal_column("rank")
+    hits = select(todo_fts.c.todo_id, rank.label("rank")).where(literal_column("todo_fts").op("MATCH")(match))
+    if owner:
+        hits = hits.where(todo_fts.c.owner_id == owner.id.hex)
+    hits = hits.order_by(rank).offset(offset).limit(limit).subquery()
+    stmt = select(Todo, hits.c.rank).join(hits, hits.c.todo_id == Todo.id).order_by(hits.c.rank, Todo.id)
+    rows = session.exec(stmt).all()
+    return [tuple(row) for row in rows] if with_rank else [todo for todo, _ in rows]
@@ -0,0 +1,50 @@
+"""Fast JSON encoding for todo responses.
+
+List endpoints select the `TodoRead` columns as plain row tuples
+(`crud.list_todos(..., as_rows=True)`) and encode them here straight to
+bytes, bypassing ORM hydration, `response_model` validation and
+`jsonable_encoder`. orjson is used when installed (it handles UUID,
+datetime and enums natively); otherwise the stdlib encoder with a small
+`default` hook produces the same JSON.
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterable, Sequence
+
+from .models import TodoRead
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+TODO_FIELDS = tuple(TodoRead.__fields__)
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)  # UUID
+
+
+def dumps_stdlib(obj: Any) -> bytes:
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return dumps_stdlib(obj)
+
+
+def todo_row_dicts(rows: Iterable[Sequence]) -> list:
+    """Dicts in the `TodoRead` shape for rows in `crud.READ_COLUMNS` order."""
+    fields = TODO_FIELDS
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def encode_todo_rows(rows: Iterable[Sequence]) -> bytes:
+    return dumps(todo_row_dicts(rows))
@@ -0,0 +1,76 @@
+"""Owner-sharded storage (`DB_SHARDS`).
+
+Users and tokens stay in the main database (`DATABASE_URL`). With
+`DB_SHARDS` set, each owner's todos, counters, tombstones and search entries
+live in one of several shard databases instead, so owners on different
+shards never wait for each other's write lock:
+
+- `DB_SHARDS=4`: four SQLite files next to the main one
+  (`database.shard0.db` ... `database.shard3.db`);
+- `DB_SHARDS=sqlite:////data/a.db,sqlite:////data/b.db`: explicit URLs.
+
+Shards must be SQLite: the shard tables are created from the same models, so
+`todo.owner_id` keeps its foreign key to `user.id`, and users exist only in
+the main database. SQLite does not enforce it; Postgres would refuse every
+owned todo, so other URLs are rejected up front.
+
+Shards are named `shard0`, `shard1`, ... in order, and an owner is placed on
+a `HashRing` of those names by its owner key (unowned todos use the key "").
+Consistent hashing means adding a shard moves only about 1/N of the owners;
+`scripts/rebalance_shards.py` moves them (and migrates an unsharded database
+into shards). Appending to an explicit URL list keeps the existing names,
+so only reorder or remove entries together with a rebalance.
+
+Unset, empty or `0` keeps everything in the main database.
+"""
+import bisect
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy.engine import make_url
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring with `replicas` virtual points per node."""
+
+    def __init__(self, nodes: List[str], replicas: int = 128):
+        if not nodes:
+            raise ValueError("a hash ring needs at least one node")
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+def shard_name(index: int) -> str:
+    return f"shard{index}"
+
+
+def shard_urls(spec: Optional[str], main_url: str) -> Dict[str, str]:
+    """Resolve a `DB_SHARDS` value against the main (sync) database URL as
+    {shard name: URL}; empty when sharding is off."""
+    spec = (spec or "").strip()
+    if spec in ("", "0"):
+        return {}
+    if spec.isdigit():
+        parsed = make_url(main_url)
+        if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+            raise ValueError("DB_SHARDS=<count> needs a file-backed SQLite DATABASE_URL; list the shard URLs instead")
+        path = Path(parsed.database)
+        return {
+            shard_name(i): str(parsed.set(database=str(path.with_name(f"{path.stem}.{shard_name(i)}{path.suffix}"))))
+            for i in range(int(spec))
+        }
+    urls = {shard_name(i): url.strip() for i, url in enumerate(spec.split(",")) if url.strip()}
+    for url in urls.values():
+        if make_url(url).get_backend_name() != "sqlite":
+            raise ValueError(f"DB_SHARDS supports SQLite shards only (todo.owner_id references user.id, which shards lack): {url}")
+    return urls
@@ -0,0 +1,219 @@
+"""Aggregates for `GET /todos/stats`.
+
+Counts by status and by priority come from `TodoStats` and
+`TodoPriorityStats`, counters per owner that `crud` adjusts in the same
+transaction as every todo write, so they are key lookups. Figures that
+depend on the current time (overdue, due this week) and the undated count are
+COUNTs over index ranges: (owner_id, status, due_date) and
+(owner_id, due_date, id).
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from .database import execute_returning, read_your_writes, supports_returning
+from .models import Status, Todo, TodoPriorityStats, TodoStats, User
+
+# (owner_id, total delta, completed delta)
+Change = Tuple[Optional[UUID], int, int]
+# (owner_id, priority, delta)
+PriorityChange = Tuple[Optional[UUID], int, int]
+
+
+def owner_key(owner_id: Optional[UUID]) -> str:
+    return owner_id.hex if owner_id else ""
+
+
+def is_completed(status) -> int:
+    return 1 if status == Status.completed else 0
+
+
+def record(session: Session, changes: Iterable[Change], priorities: Iterable[PriorityChange] = ()) -> Dict[str, int]:
+    """Apply counter deltas, summed per owner, as one upsert and bump the
+    change version of every owner in `changes` once (and keep their reads
+    off the replicas for a while after the commit); then apply the
+    per-priority deltas. Returns the new version per owner key, read back
+    with RETURNING where the database has it. Joins the caller's
+    transaction; the upserted rows stay locked until it commits, so versions
+    are handed out in commit order."""
+    totals = _sum_changes(changes)
+    if not totals:
+        return {}
+    read_your_writes(session, totals)
+    rows = [{"owner_key": k, "total": t, "completed": c, "version": 1} for k, (t, c) in totals.items()]
+    table = TodoStats.__table__
+    dialect = session.get_bind().dialect.name
+    versions = None
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite if dialect == "sqlite" else postgresql).insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.owner_key],
+            set_={
+                "total": table.c.total + stmt.excluded.total,
+                "completed": table.c.completed + stmt.excluded.completed,
+                "version": table.c.version + 1,
+            },
+        )
+        if supports_returning(session):
+            versions = dict(execute_returning(session, stmt, table.c.owner_key, table.c.version).all())
+        else:
+            session.execute(stmt)
+    else:
+        for row in rows:
+            updated = session.execute(
+                table.update()
+                .where(table.c.owner_key == row["owner_key"])
+                .values(total=table.c.total + row["total"], completed=table.c.completed + row["completed"], version=table.c.version + 1)
+            )
+            if updated.rowcount == 0:
+                session.execute(table.insert().values(row))
+    if versions is None:
+        versions = dict(session.execute(select(table.c.owner_key, table.c.version).where(table.c.owner_key.in_(list(totals)))).all())
+    _record_priorities(session, priorities)
+    return versions
+
+
+def adjust(session: Session, changes: Iterable[Change], priorities: Iterable[PriorityChange] = ()) -> None:
+    """Apply more counter deltas for owners this transaction already passed
+    to `record`, without bumping their versions again. For writers that
+    need the todo's old values: read after `record`, the row cannot change
+    underneath, since every write to an owner's todos holds the owner's
+    counter row until it commits."""
+    table = TodoStats.__table__
+    for key, (total, completed) in _sum_changes(changes).items():
+        if total or completed:
+            session.execute(
+                table.update()
+                .where(table.c.owner_key == key)
+                .values(total=table.c.total + total, completed=table.c.completed + completed)
+            )
+    _record_priorities(session, priorities)
+
+
+def _sum_changes(changes: Iterable[Change]) -> Dict[str, list]:
+    totals: Dict[str, list] = defaultdict(lambda: [0, 0])
+    for owner_id, total, completed in changes:
+        delta = totals[owner_key(owner_id)]
+        delta[0] += total
+        delta[1] += completed
+    return totals
+
+
+def _record_priorities(session: Session, changes: Iterable[PriorityChange]) -> None:
+    table = TodoPriorityStats.__table__
+    totals: Dict[Tuple[str, int], int] = defaultdict(int)
+    for owner_id, priority, delta in changes:
+        totals[(owner_key(owner_id), priority)] += delta
+    # Sorted, so concurrent transactions lock the rows in the same order.
+    rows = [{"owner_key": k, "priority": p, "total": d} for (k, p), d in sorted(totals.items()) if d]
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite if dialect == "sqlite" else postgresql).insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.owner_key, table.c.priority],
+            set_={"total": table.c.total + stmt.excluded.total},
+        )
+        session.execute(stmt)
+        return
+    for row in rows:
+        updated = session.execute(
+            table.update()
+            .where(table.c.owner_key == row["owner_key"], table.c.priority == row["priority"])
+            .values(total=table.c.total + row["total"])
+        )
+        if updated.rowcount == 0:
+            session.execute(table.insert().values(row))
+
+
+def ensure_todo_stats(engine: Engine) -> None:
+    """Rebuild the counters from `todo` when they are missing, e.g. for a
+    database that predates them."""
+    table = TodoStats.__table__
+    with engine.begin() as conn:
+        if conn.execute(select(table.c.owner_key).limit(1)).first() is None:
+            rows = conn.execute(
+                select(
+                    Todo.owner_id,
+                    func.count(),
+                    func.sum(case((Todo.status == Status.completed, 1), else_=0)),
+                    func.max(Todo.change_version),
+                )
+                .group_by(Todo.owner_id)
+            ).all()
+            if rows:
+                # Start each owner past the change versions already on its rows.
+                conn.execute(table.insert(), [
+                    {"owner_key": owner_key(owner_id), "total": total, "completed": completed or 0, "version": version or 0}
+                    for owner_id, total, completed, version in rows
+                ])
+    priorities = TodoPriorityStats.__table__
+    with engine.begin() as conn:
+        if conn.execute(select(priorities.c.owner_key).limit(1)).first() is None:
+            rows = conn.execute(select(Todo.owner_id, Todo.priority, func.count()).group_by(Todo.owner_id, Todo.priority)).all()
+            if rows:
+                conn.execute(priorities.insert(), [
+                    {"owner_key": owner_key(owner_id), "priority": priority, "total": total}
+                    for owner_id, priority, total in rows
+                ])
+
+
+def week_end(now: datetime) -> datetime:
+    """Start of next Monday: the end of `now`'s ISO week."""
+    return datetime(now.year, now.month, now.day) + timedelta(days=7 - now.weekday())
+
+
+def todo_stats(session: Session, owner: Optional[User] = None, now: Optional[datetime] = None) -> dict:
+    """Counts for `owner`'s todos (all todos when `owner` is None)."""
+    now = now or datetime.utcnow()
+    table = TodoStats.__table__
+    counters = select(func.coalesce(func.sum(table.c.total), 0), func.coalesce(func.sum(table.c.completed), 0))
+    if owner:
+        counters = counters.where(table.c.owner_key == owner_key(owner.id))
+    total, completed = session.execute(counters).one()
+
+    priorities = TodoPriorityStats.__table__
+    per_priority = func.sum(priorities.c.total)
+    q = select(priorities.c.priority, per_priority).group_by(priorities.c.priority).having(per_priority > 0)
+    if owner:
+        q = q.where(priorities.c.owner_key == owner_key(owner.id))
+    by_priority = dict(session.execute(q).all())
+
+    def count(*conditions) -> int:
+        q = select(func.count()).select_from(Todo).where(*conditions)
+        if owner:
+            q = q.where(Todo.owner_id == owner.id)
+        return session.execute(q).scalar()
+
+    pending = Todo.status == Status.pending
+    return {
+        "total": total,
+        "by_status": {Status.pending.value: total - completed, Status.completed.value: completed},
+        "by_priority": dict(sorted(by_priority.items())),
+        "overdue": count(pending, Todo.due_date < now),
+        "due_this_week": count(pending, Todo.due_date >= now, Todo.due_date < week_end(now)),
+        "no_due_date": count(Todo.due_date.is_(None)),
+    }
+
+
+def merge_todo_stats(parts: List[dict]) -> dict:
+    """Add up `todo_stats` results from several shards."""
+    merged = {"total": 0, "by_status": {s.value: 0 for s in Status}, "by_priority": {}, "overdue": 0, "due_this_week": 0, "no_due_date": 0}
+    for part in parts:
+        for key in ("total", "overdue", "due_this_week", "no_due_date"):
+            merged[key] += part[key]
+        for key, count in part["by_status"].items():
+            merged["by_status"][key] += count
+        for priority, count in part["by_priority"].items():
+            merged["by_priority"][priority] = merged["by_priority"].get(priority, 0) + count
+    merged["by_priority"] = dict(sorted(merged["by_priority"].items()))
+    return merged
@@ -0,0 +1,363 @@
+"""Todo storage backends (`STORAGE_BACKEND`).
+
+`TodoStore` is the todo half of `crud` without the session argument:
+`create_todo`, `get_todo`, `get_todo_row`, `list_todos`, `list_todos_page`,
+`update_todo_by_id`, `delete_todo_by_id` and `todo_stats` take the same
+arguments and return the same results, in the same order, with the same
+cursors and the same (HTTP status, detail) write errors.
+
+- `SQLStore` runs every call through `crud` in a session of its own on an
+  engine (the app's by default);
+- `MemoryStore` keeps todos in process memory and nowhere else: no ORM
+  instances, SQL or files until a result is handed out. It suits the
+  console (`scripts/console_app.py`), throwaway and edge runs, and tests that
+  only need todo semantics.
+
+`load_store()` picks one from `STORAGE_BACKEND`: `sql` (the default),
+`memory` or `package.module:factory`. The API's todo endpoints use it when
+it is not `sql` (see `app.main.todo_store`); search, the change feed, events,
+export, batch and chat live in the database and are unavailable then.
+"""
+import bisect
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm.instrumentation import manager_of_class
+
+from . import crud, stats
+from .models import Status, Todo, TodoCreate, User
+from .utils import load_factory
+
+WriteError = crud.WriteError
+
+
+class TodoStore(ABC):
+    """Interface of the storage backends; see the `crud` function of the
+    same name for each method."""
+
+    @abstractmethod
+    def create_todo(self, todo_in: TodoCreate, owner: Optional[User] = None) -> Todo:
+        ...
+
+    @abstractmethod
+    def get_todo(self, todo_id: UUID) -> Optional[Todo]:
+        ...
+
+    @abstractmethod
+    def get_todo_row(self, todo_id: UUID) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def list_todos(self, owner: Optional[User] = None, completed: Optional[bool] = None, sort_by: Optional[str] = None) -> List[Todo]:
+        ...
+
+    @abstractmethod
+    def list_todos_page(
+        self,
+        owner: Optional[User] = None,
+        completed: Optional[bool] = None,
+        sort_by: Optional[str] = None,
+        limit: int = 100,
+        after: Optional[str] = None,
+    ) -> Tuple[List[Todo], Optional[str]]:
+        ...
+
+    @abstractmethod
+    def update_todo_by_id(
+        self, todo_id: UUID, fields: dict, owner: Optional[User] = None, if_match: Optional[List[int]] = None,
+    ) -> Tuple[Optional[dict], Optional[WriteError]]:
+        ...
+
+    @abstractmethod
+    def delete_todo_by_id(self, todo_id: UUID, owner: Optional[User] = None, if_match: Optional[List[int]] = None) -> Optional[WriteError]:
+        ...
+
+    @abstractmethod
+    def todo_stats(self, owner: Optional[User] = None, now: Optional[datetime] = None) -> dict:
+        ...
+
+
+class SQLStore(TodoStore):
+    """`crud` on a short-lived session per call. Returned todos are
+    detached but loaded."""
+
+    def __init__(self, bind: Optional[Engine] = None):
+        self.bind = bind
+
+    def _call(self, fn, *args, **kwargs):
+        from .database import get_session
+
+        with get_session(self.bind) as session:
+            return fn(session, *args, **kwargs)
+
+    def create_todo(self, todo_in, owner=None):
+        return self._call(crud.create_todo, todo_in, owner=owner)
+
+    def get_todo(self, todo_id):
+        return self._call(crud.get_todo, todo_id)
+
+    def get_todo_row(self, todo_id):
+        return self._call(crud.get_todo_row, todo_id)
+
+    def list_todos(self, owner=None, completed=None, sort_by=None):
+        return self._call(crud.list_todos, owner=owner, completed=completed, sort_by=sort_by)
+
+    def list_todos_page(self, owner=None, completed=None, sort_by=None, limit=100, after=None):
+        return self._call(crud.list_todos_page, owner=owner, completed=completed, sort_by=sort_by, limit=limit, after=after)
+
+    def update_todo_by_id(self, todo_id, fields, owner=None, if_match=None):
+        return self._call(crud.update_todo_by_id, todo_id, fields, owner=owner, if_match=if_match)
+
+    def delete_todo_by_id(self, todo_id, owner=None, if_match=None):
+        return self._call(crud.delete_todo_by_id, todo_id, owner=owner, if_match=if_match)
+
+    def todo_stats(self, owner=None, now=None):
+        return self._call(stats.todo_stats, owner=owner, now=now)
+
+
+# Every `todo` column, in table order (not `serialization.TODO_FIELDS`, the
+# `TodoRead` fields).
+_RECORD_FIELDS = tuple(c.name for c in Todo.__table__.columns)
+_TODO_MANAGER = manager_of_class(Todo)
+
+
+class _Record:
+    """One todo's values; slots instead of an ORM instance."""
+    __slots__ = _RECORD_FIELDS
+
+
+class _SortedIndex:
+    """`(value, id)` keys in order for the rows with a value, and the ids of
+    the rows whose value is None, also in order."""
+    __slots__ = ("keys", "nulls")
+
+    def __init__(self):
+        self.keys: list = []
+        self.nulls: List[UUID] = []
+
+    def add(self, value, todo_id: UUID) -> None:
+        if value is None:
+            bisect.insort(self.nulls, todo_id)
+        else:
+            bisect.insort(self.keys, (value, todo_id))
+
+    def remove(self, value, todo_id: UUID) -> None:
+        seq, key = (self.nulls, todo_id) if value is None else (self.keys, (value, todo_id))
+        del seq[bisect.bisect_left(seq, key)]
+
+    def walk(self, descending: bool, after: Optional[tuple] = None) -> Iterator[UUID]:
+        """Ids in `crud.list_todos_page` order (values, then None by id),
+        starting past the `(value, id)` key `after`."""
+        if after is None or after[0] is not None:
+            yield from _walk(self.keys, descending, after, lambda key: key[1])
+            after = None
+        yield from _walk(self.nulls, descending, after and after[1], lambda todo_id: todo_id)
+
+    def range(self, low, high) -> list:
+        """Keys with `low <= value < high`."""
+        return self.keys[bisect.bisect_left(self.keys, (low,)):bisect.bisect_left(self.keys, (high,))]
+
+
+def _walk(seq: list, descending: bool, after, id_of) -> Iterator[UUID]:
+    if descending:
+        end = len(seq) if after is None else bisect.bisect_left(seq, after)
+        for i in range(end - 1, -1, -1):
+            yield id_of(seq[i])
+    else:
+        start = 0 if after is None else bisect.bisect_right(seq, after)
+        for i in range(start, len(seq)):
+            yield id_of(seq[i])
+
+
+class _Scope:
+    """The rows of one owner (or of every owner) in insertion order, their
+    sorted indexes and the counters behind `todo_stats`."""
+    __slots__ = ("rows", "sorted", "completed", "by_priority", "version")
+
+    def __init__(self):
+        self.rows: Dict[UUID, _Record] = {}
+        self.sorted = {field: _SortedIndex() for field in crud.SORT_FIELDS}
+        self.completed = 0
+        self.by_priority: Counter = Counter()
+        self.version = 0
+
+    def index(self, record: _Record, sign: int) -> None:
+        """Add (`sign` 1) or remove (-1) `record` from the sorted indexes
+        and counters; `rows` is maintained by the caller."""
+        for field, index in self.sorted.items():
+            (index.add if sign > 0 else index.remove)(getattr(record, field), record.id)
+        self.completed += sign * stats.is_completed(record.status)
+        self.by_priority[record.priority] += sign
+        if not self.by_priority[record.priority]:
+            del self.by_priority[record.priority]
+
+
+def _plain(value):
+    # Enums are kept by value, as the database returns them.
+    return value.value if isinstance(value, Enum) else value
+
+
+def _completed_filter(completed: Optional[bool]):
+    if completed is None:
+        return None
+    return Status.completed if completed else Status.pending
+
+
+class MemoryStore(TodoStore):
+    """Todos in memory: a hash index on id (`_all.rows`) and one on owner
+    id (`_owners`, with None for unowned todos), each scope sorted by
+    `created_at`, `due_date` and `priority`. Lists and pages are index walks
+    (bisect to the cursor, then in order), stats are counters plus two
+    `due_date` ranges. Thread-safe; nothing survives the process."""
+
+    def __init__(self):
+        self._all = _Scope()
+        self._owners: Dict[Optional[UUID], _Scope] = {}
+        self._lock = threading.RLock()
+
+    def _scope(self, owner: Optional[User]) -> Optional[_Scope]:
+        return self._owners.get(owner.id) if owner else self._all
+
+    def _bump(self, owner_id: Optional[UUID]) -> int:
+        scope = self._owners.setdefault(owner_id, _Scope())
+        scope.version += 1
+        return scope.version
+
+    @staticmethod
+    def _todo(record: _Record) -> Todo:
+        # Built the way the ORM builds loaded rows: no __init__, so no
+        # validation or default factories.
+        todo = _TODO_MANAGER.new_instance()
+        for field in _RECORD_FIELDS:
+            setattr(todo, field, getattr(record, field))
+        return todo
+
+    @staticmethod
+    def _row(record: _Record) -> dict:
+        row = {c.name: getattr(record, c.name) for c in crud.READ_COLUMNS}
+        row["change_version"] = record.change_version
+        return row
+
+    def create_todo(self, todo_in, owner=None):
+        todo = Todo(**todo_in.dict(), owner_id=owner.id if owner else None)
+        record = _Record()
+        for field in _RECORD_FIELDS:
+            setattr(record, field, _plain(getattr(todo, field)))
+        todo.status = record.status
+        with self._lock:
+            record.change_version = todo.change_version = self._bump(record.owner_id)
+            for scope in (self._all, self._owners[record.owner_id]):
+                scope.rows[record.id] = record
+                scope.index(record, 1)
+        return todo
+
+    def get_todo(self, todo_id):
+        with self._lock:
+            record = self._all.rows.get(todo_id)
+            return self._todo(record) if record else None
+
+    def get_todo_row(self, todo_id):
+        with self._lock:
+            record = self._all.rows.get(todo_id)
+            return self._row(record) if record else None
+
+    def list_todos(self, owner=None, completed=None, sort_by=None):
+        field, descending = crud.parse_sort(sort_by)
+        status = _completed_filter(completed)
+        with self._lock:
+            scope = self._scope(owner)
+            if scope is None:
+                return []
+            records = (scope.rows[todo_id] for todo_id in scope.sorted[field].walk(descending))
+            return [self._todo(r) for r in records if status is None or r.status == status]
+
+    def list_todos_page(self, owner=None, completed=None, sort_by=None, limit=100, after=None):
+        field, descending = crud.parse_sort(sort_by)
+        key = crud.decode_page_cursor(after, field, descending) if after else None
+        status = _completed_filter(completed)
+        with self._lock:
+            scope = self._scope(owner)
+            records = []
+            if scope is not None:
+                for todo_id in scope.sorted[field].walk(descending, key):
+                    record = scope.rows[todo_id]
+                    if status is None or record.status == status:
+                        records.append(record)
+                        if len(records) > limit:
+                            break
+            rows = [self._todo(r) for r in records[:limit]]
+        if len(records) <= limit:
+            return rows, None
+        return rows, crud.cursor_for(rows[-1], field, descending)
+
+    def update_todo_by_id(self, todo_id, fields, owner=None, if_match=None):
+        with self._lock:
+            record = self._all.rows.get(todo_id)
+            if record is None:
+                return None, (404, "Todo not found")
+            error = crud.write_check(record.owner_id, record.change_version, owner, if_match)
+            if error:
+                return None, error
+            scopes = (self._all, self._owners[record.owner_id])
+            for scope in scopes:
+                scope.index(record, -1)
+            for field, value in fields.items():
+                setattr(record, field, _plain(value))
+            record.updated_at = datetime.utcnow()
+            record.change_version = self._bump(record.owner_id)
+            for scope in scopes:
+                scope.index(record, 1)
+            return self._row(record), None
+
+    def delete_todo_by_id(self, todo_id, owner=None, if_match=None):
+        with self._lock:
+            record = self._all.rows.get(todo_id)
+            if record is None:
+                return 404, "Todo not found"
+            error = crud.write_check(record.owner_id, record.change_version, owner, if_match)
+            if error:
+                return error
+            self._bump(record.owner_id)
+            for scope in (self._all, self._owners[record.owner_id]):
+                del scope.rows[todo_id]
+                scope.index(record, -1)
+            return None
+
+    def todo_stats(self, owner=None, now=None):
+        now = now or datetime.utcnow()
+        with self._lock:
+            scope = self._scope(owner) or _Scope()
+            due = scope.sorted["due_date"]
+
+            def pending(keys):
+                return sum(scope.rows[todo_id].status == Status.pending for _, todo_id in keys)
+
+            total = len(scope.rows)
+            return {
+                "total": total,
+                "by_status": {Status.pending.value: total - scope.completed, Status.completed.value: scope.completed},
+                "by_priority": dict(sorted(scope.by_priority.items())),
+                "overdue": pending(due.keys[:bisect.bisect_left(due.keys, (now,))]),
+                "due_this_week": pending(due.range(now, stats.week_end(now))),
+                "no_due_date": len(due.nulls),
+            }
+
+
+def load_store(spec: Optional[str] = None) -> TodoStore:
+    """The store named by `spec` (default: `STORAGE_BACKEND`): `sql`,
+    `memory` or `package.module:factory`."""
+    spec = (spec if spec is not None else os.environ.get("STORAGE_BACKEND", "")).strip() or "sql"
+    if spec == "sql":
+        return SQLStore()
+    if spec == "memory":
+        return MemoryStore()
+    if ":" not in spec:
+        raise ValueError("STORAGE_BACKEND must be sql, memory or package.module:factory")
+    return load_factory(spec)
@@ -1,6 +1,34 @@
+import base64
+import importlib
+import json
 import secrets
 
 
 def generate_token(length: int = 32) -> str:
     return secrets.token_hex(length)
+
+
+def load_factory(spec: str):
+    """Call the factory named by a `package.module:factory` spec (the
+    plug-in settings such as `STORAGE_BACKEND`) and return its result."""
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+def encode_cursor(values: list) -> str:
+    """Encode a list of JSON-serializable values as an opaque, URL-safe cursor."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Inverse of `encode_cursor`. Raises `ValueError` for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(values, list):
+        raise ValueError("invalid cursor")
+    return values
 # Placeholder utilities for Phase II
@@ -0,0 +1,58 @@
+"""Local OpenAI-compatible stub server for the chat/LLM tests.
+
+    with StubLLMServer(reply=lambda prompt: '{"intent": "list"}') as stub:
+        client = LLMClient(api_key="test", url=stub.url)
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        prompt = json.loads(body)["messages"][-1]["content"]
+        with stub.lock:
+            stub.requests += 1
+            stub.peers.add(self.client_address)
+        if stub.delay:
+            time.sleep(stub.delay)
+        if stub.status != 200:
+            out = b'{"error": "stub failure"}'
+        else:
+            content = stub.reply(prompt)
+            out = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()
+        self.send_response(stub.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubLLMServer:
+    def __init__(self, reply=lambda prompt: '{"intent": "list", "payload": {}}', status: int = 200, delay: float = 0.0):
+        self.reply = reply
+        self.status = status
+        self.delay = delay
+        self.requests = 0
+        self.peers = set()
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1/chat/completions"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
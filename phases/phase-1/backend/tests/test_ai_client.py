@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import httpx
+
+from llm_stub import StubLLMServer
+
+from app import ai_client, chat
+from app.ai_client import CircuitBreaker, LLMClient
+
+
+def create_reply(prompt):
+    title = prompt.rsplit(":", 1)[-1].strip()
+    return json.dumps({"intent": "create", "payload": {"title": title}})
+
+
+def test_parsed_intents_are_cached_and_connections_reused():
+    async def scenario(stub):
+        client = LLMClient(api_key="test", url=stub.url)
+        try:
+            first = await client.parse_intent("remember:  milk")
+            again = await client.parse_intent("  remember: milk ")
+            other = await client.parse_intent("remember: bread")
+            return first, again, other, client.stats()
+        finally:
+            await client.aclose()
+
+    with StubLLMServer(reply=create_reply) as stub:
+        first, again, other, stats = asyncio.run(scenario(stub))
+        assert first == again == ("create", {"title": "milk"})
+        assert other == ("create", {"title": "bread"})
+        assert stub.requests == 2
+        assert len(stub.peers) == 1  # both calls went over one keep-alive connection
+        assert stats["cache"]["hits"] == 1
+
+
+def test_breaker_opens_and_chat_falls_back(monkeypatch):
+    async def scenario(stub):
+        client = LLMClient(api_key="test", url=stub.url, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        monkeypatch.setattr(ai_client, "get_client", lambda: client)
+        try:
+            results = [await chat.parse_chat_async("add todo Buy milk") for _ in range(4)]
+            return results, client.stats()
+        finally:
+            await client.aclose()
+
+    with StubLLMServer(status=500) as stub:
+        results, stats = asyncio.run(scenario(stub))
+        assert all(r == ("create", {"title": "Buy milk", "description": ""}) for r in results)
+        assert stub.requests == 2
+        assert stats["breaker"] == "open"
+        assert stats["rejected"] == 2
+
+
+def test_breaker_half_open_trial_closes_circuit():
+    clock = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: clock[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock[0] = 10
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial while half-open
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_concurrency_limit_rejects_instead_of_queueing():
+    async def scenario(stub):
+        client = LLMClient(api_key="test", url=stub.url, max_concurrency=2, queue_timeout=0.05)
+        try:
+            return await asyncio.gather(*(client.complete(f"p{i}") for i in range(4)))
+        finally:
+            await client.aclose()
+
+    with StubLLMServer(delay=0.3) as stub:
+        results = asyncio.run(scenario(stub))
+        assert sum(r is not None for r in results) == 2
+        assert stub.requests == 2
+
+
+def test_cancelled_half_open_trial_frees_the_breaker():
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        clock = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: clock[0])
+        breaker.record_failure()
+        clock[0] = 10
+        client = LLMClient(api_key="test", breaker=breaker, transport=httpx.MockTransport(hang))
+        try:
+            trial = asyncio.ensure_future(client.complete("p"))
+            await asyncio.sleep(0.05)
+            trial.cancel()
+            await asyncio.gather(trial, return_exceptions=True)
+            return breaker.allow()
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(scenario())
+
+
+def test_malformed_reply_counts_as_failure():
+    bodies = iter([{"choices": ["not a dict"]}, {"choices": []}, {"choices": [{"message": "x"}]}])
+
+    async def scenario():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json=next(bodies)))
+        client = LLMClient(api_key="test", breaker=CircuitBreaker(failure_threshold=3), transport=transport)
+        try:
+            return [await client.complete("p") for _ in range(3)], client.stats()
+        finally:
+            await client.aclose()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [None, None, None]
+    assert stats["failures"] == 3 and stats["breaker"] == "open"
@@ -2,16 +2,18 @@ import os
 import tempfile
 import subprocess
 import time
+import pytest
 import requests
 import signal
 
 
-def start_server_with_db():
+def start_server_with_db(storage="sql"):
     fd, path = tempfile.mkstemp(suffix=".db")
     os.close(fd)
     db_url = f"sqlite:///{path}"
     env = os.environ.copy()
     env["DATABASE_URL"] = db_url
+    env["STORAGE_BACKEND"] = storage
 
     # Start uvicorn using the current Python executable (the test runner's interpreter)
     import sys
@@ -44,8 +46,9 @@ def stop_server(proc):
         proc.kill()
 
 
-def test_crud_cycle():
-    proc, base, db_path = start_server_with_db()
+@pytest.mark.parametrize("storage", ["sql", "memory"])
+def test_crud_cycle(storage):
+    proc, base, db_path = start_server_with_db(storage)
     try:
         # Create
         r = requests.post(f"{base}/todos", json={"title": "T1", "description": "d1"}, timeout=2)
@@ -71,6 +74,10 @@ def test_crud_cycle():
 
         r = requests.get(f"{base}/todos", timeout=2)
         assert not any(t["id"] == todo_id for t in r.json())
+
+        if storage == "memory":
+            # Search, changes, events, export, batch and chat need the database.
+            assert requests.get(f"{base}/todos/changes", timeout=2).status_code == 501
     finally:
         stop_server(proc)
         try:
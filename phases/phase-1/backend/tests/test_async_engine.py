@@ -0,0 +1,76 @@
+import os
+import tempfile
+import subprocess
+import time
+import requests
+
+from app.database import is_async_url, sync_url
+
+
+def start_server():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    import sys
+    port = "8006"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/todos", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def test_async_url_maps_to_sync_driver():
+    assert is_async_url("postgresql+asyncpg://u:p@db/evo")
+    assert not is_async_url("sqlite:///x.db")
+    assert sync_url("postgresql+asyncpg://u:p@db/evo") == "postgresql+psycopg2://u:p@db/evo"
+    assert sync_url("sqlite+aiosqlite:///x.db") == "sqlite:///x.db"
+
+
+def test_crud_and_chat_on_async_engine():
+    proc, base, db_path = start_server()
+    try:
+        r = requests.post(f"{base}/users", json={"username": "erin"}, timeout=2)
+        assert r.status_code == 201
+        headers = {"Authorization": f"Token {r.json()['token']}"}
+
+        r = requests.post(f"{base}/todos", json={"title": "async"}, headers=headers, timeout=2)
+        assert r.status_code == 201
+        assert r.headers["X-DB-Checkouts"] == "1"
+        tid = r.json()["id"]
+
+        r = requests.put(f"{base}/todos/{tid}", json={"title": "async 2", "status": "completed"}, headers=headers, timeout=2)
+        assert r.status_code == 200 and r.json()["status"] == "completed"
+
+        r = requests.post(f"{base}/chat", json={"message": "List todos"}, headers=headers, timeout=2)
+        assert [t["id"] for t in r.json()["todos"]] == [tid]
+
+        r = requests.get(f"{base}/todos/export", headers=headers, timeout=2)
+        assert r.status_code == 200 and tid in r.text
+
+        r = requests.delete(f"{base}/todos/{tid}", headers=headers, timeout=2)
+        assert r.status_code == 204
+        assert requests.get(f"{base}/todos", headers=headers, timeout=2).json() == []
+    finally:
+        stop_server(proc, db_path)
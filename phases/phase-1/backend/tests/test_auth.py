@@ -2,15 +2,17 @@ import os
 import tempfile
 import subprocess
 import time
+import pytest
 import requests
 
 
-def start_server():
+def start_server(storage="sql"):
 	fd, path = tempfile.mkstemp(suffix=".db")
 	os.close(fd)
 	db_url = f"sqlite:///{path}"
 	env = os.environ.copy()
 	env["DATABASE_URL"] = db_url
+	env["STORAGE_BACKEND"] = storage
 	import sys
 	python_exec = sys.executable
 	port = "8002"
@@ -41,8 +43,9 @@ def stop_server(proc, path):
 		pass
 
 
-def test_user_creation_and_auth():
-	proc, base, db_path = start_server()
+@pytest.mark.parametrize("storage", ["sql", "memory"])
+def test_user_creation_and_auth(storage):
+	proc, base, db_path = start_server(storage)
 	try:
 		# create user
 		r = requests.post(f"{base}/users", json={"username": "alice"}, timeout=2)
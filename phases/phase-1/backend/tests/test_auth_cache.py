@@ -0,0 +1,91 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import auth, crud
+from app.cache import TTLCache
+from app.database import RequestDB
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_repeat_lookups_skip_database(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    auth.token_cache.clear()
+
+    lookups = []
+    real_lookup = auth.get_user_by_token
+    monkeypatch.setattr(auth, "get_user_by_token", lambda s, t: lookups.append(t) or real_lookup(s, t))
+
+    with Session(engine) as session:
+        user = crud.create_user(session, username="carol", token="tok-c")
+        user_id = user.id
+
+    header = "Token tok-c"
+    with Session(engine) as session:
+        db = RequestDB(session)
+        assert asyncio.run(auth.get_current_user(header, db)).id == user_id
+        assert asyncio.run(auth.optional_current_user(header, db)).id == user_id
+    assert lookups == ["tok-c"]
+    assert auth.token_cache.stats()["hits"] == 1
+
+    # Rotating the token drops the cached entry for the old one.
+    with Session(engine) as session:
+        stored = crud.get_user_by_token(session, "tok-c")
+        stored.token = "tok-c2"
+        session.add(stored)
+        session.commit()
+    with Session(engine) as session:
+        db = RequestDB(session)
+        with pytest.raises(HTTPException):
+            asyncio.run(auth.get_current_user(header, db))
+        assert asyncio.run(auth.get_current_user("Token tok-c2", db)).id == user_id
+
+
+def test_new_users_leave_the_cache_alone(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    auth.token_cache.clear()
+    auth.token_cache.set("tok-x", auth.User(id=uuid4(), username="xavier", token="tok-x"))
+    scans = []
+    monkeypatch.setattr(auth.token_cache, "discard_where", scans.append)
+    with Session(engine) as session:
+        crud.create_user(session, username="yara", token="tok-y")
+    assert scans == [] and auth.token_cache.get("tok-x") is not None
+
+
+def test_stream_tokens_are_signed_and_expire():
+    user = auth.User(id=uuid4(), username="ivy", token="api-token")
+    token = auth.issue_stream_token(user, now=1000)
+    assert "api-token" not in token
+    assert auth.verify_stream_token(token, now=1000) == user.id
+    assert auth.verify_stream_token(token, now=1000 + auth.STREAM_TOKEN_TTL + 1) is None
+    user_hex, expires, signature = token.split(".")
+    assert auth.verify_stream_token(f"{uuid4().hex}.{expires}.{signature}", now=1000) is None
+    assert auth.verify_stream_token(f"{user_hex}.{int(expires) + 3600}.{signature}", now=1000) is None
+    assert auth.verify_stream_token("api-token") is None
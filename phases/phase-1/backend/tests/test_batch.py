@@ -0,0 +1,54 @@
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud
+from app.models import Todo, TodoCreate
+from app.schemas import BatchOperation
+
+
+def make_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_mixed_batch_commits_once_and_reports_each_item():
+    with make_session() as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        bob = crud.create_user(session, username="bob", token="tok-b")
+        mine = crud.create_todo(session, TodoCreate(title="mine"), owner=alice)
+        gone = crud.create_todo(session, TodoCreate(title="gone"), owner=alice)
+        theirs = crud.create_todo(session, TodoCreate(title="theirs"), owner=bob)
+
+        commits = []
+        event.listen(session, "after_commit", lambda s: commits.append(1))
+        ops = [BatchOperation(op="create", data=TodoCreate(title=f"new {i}")) for i in range(50)]
+        ops += [
+            BatchOperation(op="update", id=mine.id, data=TodoCreate(title="mine v2", status="completed")),
+            BatchOperation(op="delete", id=gone.id),
+            BatchOperation(op="update", id=gone.id, data=TodoCreate(title="too late")),
+            BatchOperation(op="delete", id=theirs.id),
+            BatchOperation(op="delete", id=uuid4()),
+            BatchOperation(op="create", data=TodoCreate(title=" ")),
+        ]
+        results = crud.apply_batch(session, ops, owner=alice)
+
+        assert len(commits) == 1
+        assert [r["status"] for r in results[:50]] == [201] * 50
+        assert [r["status"] for r in results[50:]] == [200, 204, 404, 403, 404, 400]
+        assert results[50]["todo"]["title"] == "mine v2"
+
+        titles = {t.title for t in crud.list_todos(session, owner=alice)}
+        assert "mine v2" in titles and "gone" not in titles
+        assert len(titles) == 51
+        assert session.get(Todo, theirs.id) is not None
+
+
+def test_creates_rejected_when_not_allowed():
+    with make_session() as session:
+        results = crud.apply_batch(session, [BatchOperation(op="create", data=TodoCreate(title="x"))], allow_create=False)
+        assert results[0]["status"] == 401
+        assert crud.list_todos(session) == []
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import subprocess
+import time
+from uuid import uuid4
+
+import requests
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud, stats
+from app.intents import parse_commands
+from app.main import _run_chat_intents
+from app.models import TodoCreate
+
+
+def make_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_chat_commands_run_in_one_commit():
+    with make_session() as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        old = crud.create_todo(session, TodoCreate(title="old"), owner=alice)
+
+        commits = []
+        event.listen(session, "after_commit", lambda s: commits.append(1))
+        message = (
+            f"add todo Buy milk; update todo {old.id}: Old, renamed | now | completed; "
+            f"delete todo {uuid4()}; update todo nope title x; list todos; what now"
+        )
+        results = _run_chat_intents(session, parse_commands(message), alice)
+
+        assert len(commits) == 1
+        assert [r["result"] for r in results] == ["created", "updated", "error", "error", "list", "unknown"]
+        assert results[0]["todo"]["title"] == "Buy milk"
+        assert results[1]["todo"]["status"] == "completed"
+        assert results[2]["status"] == 404 and results[3]["status"] == 404
+        assert sorted(t["title"] for t in results[4]["todos"]) == ["Buy milk", "Old, renamed"]
+
+
+def test_chat_commands_run_in_message_order():
+    with make_session() as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        commits = []
+        event.listen(session, "after_commit", lambda s: commits.append(1))
+        results = _run_chat_intents(session, parse_commands("list todos; add todo A; list todos; add todo B"), alice)
+
+        assert len(commits) == 1
+        assert [r["result"] for r in results] == ["list", "created", "list", "created"]
+        assert results[0]["todos"] == [] and [t["title"] for t in results[2]["todos"]] == ["A"]
+        assert sorted(t.title for t in crud.list_todos(session, owner=alice)) == ["A", "B"]
+
+
+def test_chat_update_writes_only_the_named_fields():
+    with make_session() as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        todo = crud.create_todo(session, TodoCreate(title="keep", description="me too", priority=2), owner=alice)
+        message = f"add todo A; update todo {todo.id} status completed; update todo {uuid4()} status completed; list todos"
+        results = _run_chat_intents(session, parse_commands(message), alice)
+
+        assert [r["result"] for r in results] == ["created", "updated", "error", "list"]
+        updated = results[1]["todo"]
+        assert (updated["title"], updated["description"], updated["priority"], updated["status"]) == ("keep", "me too", 2, "completed")
+        # The missed update leaves the earlier writes in the transaction.
+        assert results[2]["status"] == 404 and len(results[3]["todos"]) == 2
+        assert stats.todo_stats(session, owner=alice)["by_status"] == {"pending": 1, "completed": 1}
+
+
+def start_server():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    env.pop("AI_API_KEY", None)
+    import sys
+    port = "8007"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/todos", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def test_chat_endpoint_multi_command_and_batch():
+    proc, base, db_path = start_server()
+    try:
+        r = requests.post(f"{base}/users", json={"username": "erin"}, timeout=2)
+        headers = {"Authorization": f"Token {r.json()['token']}"}
+
+        r = requests.post(f"{base}/chat", json={"messages": ["list todos; add todo A\nadd todo B; list todos"]}, headers=headers, timeout=2)
+        assert r.status_code == 200
+        results = r.json()["results"]
+        assert [x["result"] for x in results] == ["list", "created", "created", "list"]
+        assert results[0]["todos"] == [] and len(results[3]["todos"]) == 2
+        tid = results[1]["todo"]["id"]
+
+        r = requests.post(f"{base}/chat", json={"messages": [f"delete todo {tid}", "show todos"]}, headers=headers, timeout=2)
+        assert r.status_code == 200
+        assert [x["result"] for x in r.json()["results"]] == ["deleted", "list"]
+        assert [t["title"] for t in r.json()["results"][1]["todos"]] == ["B"]
+
+        # A single command keeps the original shape and error statuses.
+        r = requests.post(f"{base}/chat", json={"message": "show todos"}, headers=headers, timeout=2)
+        assert r.json()["result"] == "list"
+        r = requests.post(f"{base}/chat", json={"messages": ["show todos"]}, headers=headers, timeout=2)
+        assert [x["result"] for x in r.json()["results"]] == ["list"]
+        r = requests.post(f"{base}/chat", json={"message": f"delete todo {tid}"}, headers=headers, timeout=2)
+        assert r.status_code == 404
+        r = requests.post(f"{base}/chat", json={"message": "add todo C; list todos"}, headers=headers, timeout=2)
+        assert r.status_code == 400
+        r = requests.post(f"{base}/chat", json={"messages": []}, headers=headers, timeout=2)
+        assert r.status_code == 400
+    finally:
+        stop_server(proc, db_path)
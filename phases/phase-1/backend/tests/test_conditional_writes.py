@@ -0,0 +1,151 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+import requests
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app import crud, stats
+from app.models import Todo, TodoCreate, TodoStats, TodoTombstone
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def counters(session, owner):
+    row = session.get(TodoStats, stats.owner_key(owner.id))
+    session.refresh(row)
+    return row.total, row.completed, row.version
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "fallback"])
+def returning(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(crud, "supports_returning", lambda session: False)
+    return request.param
+
+
+def test_guarded_update_and_delete(returning):
+    engine = make_engine()
+    with Session(engine) as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        bob = crud.create_user(session, username="bob", token="tok-b")
+        todo = crud.create_todo(session, TodoCreate(title="t", priority=1), owner=alice)
+        todo_id, created_version = todo.id, todo.change_version
+        session.refresh(alice)  # as after the per-request token lookup
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2].split(None, 1)[0]))
+
+        row, error = crud.update_todo_by_id(session, todo_id, {"status": "completed"}, owner=alice, if_match=[created_version])
+        assert error is None
+        assert (row["title"], row["status"], row["priority"]) == ("t", "completed", 1)
+        assert row["change_version"] > created_version
+        if returning:
+            # Counter upsert (the lock), the old status read after it, the
+            # guarded UPDATE and the completed delta; no refresh after.
+            assert statements == ["INSERT", "SELECT", "UPDATE", "UPDATE"]
+        assert counters(session, alice) == (1, 1, row["change_version"])
+        statements.clear()
+        row, error = crud.update_todo_by_id(session, todo_id, {"description": "d"}, owner=alice)
+        if returning:
+            assert statements == ["INSERT", "UPDATE"]  # no counted field: no read
+        assert counters(session, alice) == (1, 1, row["change_version"])
+
+        assert crud.update_todo_by_id(session, todo_id, {"title": "x"}, owner=alice, if_match=[created_version]) == (None, (412, "Precondition Failed"))
+        assert crud.update_todo_by_id(session, todo_id, {"title": "x"}, owner=bob) == (None, (403, "Forbidden"))
+        assert crud.update_todo_by_id(session, todo_id, {"title": "x"}) == (None, (401, "Unauthorized"))
+        assert counters(session, alice) == (1, 1, row["change_version"])  # failed writes roll back
+
+        assert crud.delete_todo_by_id(session, todo_id, owner=alice, if_match=[created_version]) == (412, "Precondition Failed")
+        assert crud.delete_todo_by_id(session, todo_id, owner=alice, if_match=[row["change_version"]]) is None
+        assert crud.delete_todo_by_id(session, todo_id, owner=alice) == (404, "Todo not found")
+        total, completed, version = counters(session, alice)
+        assert (total, completed) == (0, 0)
+        assert session.exec(select(TodoTombstone.version).where(TodoTombstone.todo_id == todo_id)).one() == version
+
+
+def test_signed_in_callers_may_write_unowned_todos(returning):
+    engine = make_engine()
+    with Session(engine) as session:
+        legacy_id = crud.create_todo(session, TodoCreate(title="from before users")).id
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        row, error = crud.update_todo_by_id(session, legacy_id, {"priority": 3}, owner=alice)
+        assert error is None and row["owner_id"] is None and row["priority"] == 3
+        assert crud.delete_todo_by_id(session, legacy_id, owner=alice) is None
+        session.expunge_all()
+        assert session.get(Todo, legacy_id) is None
+
+
+def start_server(storage="sql"):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    env["STORAGE_BACKEND"] = storage
+    port = "8012"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/health", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+@pytest.mark.parametrize("storage", ["sql", "memory"])
+def test_patch_and_if_match_over_http(storage):
+    proc, base, path = start_server(storage)
+    try:
+        token = requests.post(f"{base}/users", json={"username": "cas"}).json()["token"]
+        headers = {"Authorization": f"Token {token}"}
+        r = requests.post(f"{base}/todos", json={"title": "draft", "description": "keep me", "priority": 2}, headers=headers)
+        todo_id, etag = r.json()["id"], r.headers["ETag"]
+        assert requests.get(f"{base}/todos/{todo_id}", headers=headers).headers["ETag"] == etag
+
+        r = requests.patch(f"{base}/todos/{todo_id}", json={"title": "final"}, headers=dict(headers, **{"If-Match": etag}))
+        assert r.status_code == 200
+        assert (r.json()["title"], r.json()["description"], r.json()["priority"]) == ("final", "keep me", 2)
+        new_etag = r.headers["ETag"]
+        assert new_etag != etag
+
+        stale = dict(headers, **{"If-Match": etag})
+        assert requests.patch(f"{base}/todos/{todo_id}", json={"priority": 5}, headers=stale).status_code == 412
+        assert requests.put(f"{base}/todos/{todo_id}", json={"title": "lost update"}, headers=stale).status_code == 412
+        assert requests.delete(f"{base}/todos/{todo_id}", headers=stale).status_code == 412
+        assert requests.patch(f"{base}/todos/{todo_id}", json={}, headers=headers).status_code == 400
+        assert requests.patch(f"{base}/todos/{todo_id}", json={"status": None}, headers=headers).status_code == 400
+        assert requests.patch(f"{base}/todos/{todo_id}", json={"priority": 1}).status_code == 401
+
+        r = requests.put(f"{base}/todos/{todo_id}", json={"title": "replaced", "status": "completed"}, headers=headers)
+        assert r.status_code == 200 and r.json()["description"] is None  # PUT replaces every field
+        assert requests.get(f"{base}/todos/stats", headers=headers).json()["by_status"]["completed"] == 1
+        assert requests.delete(f"{base}/todos/{todo_id}", headers=dict(headers, **{"If-Match": r.headers["ETag"]})).status_code == 204
+        assert requests.get(f"{base}/todos/{todo_id}", headers=headers).status_code == 404
+    finally:
+        stop_server(proc, path)
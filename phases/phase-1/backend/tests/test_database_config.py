@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+from sqlalchemy import text
+
+from app.database import create_app_engine, engine_options, pool_stats
+
+
+def test_sqlite_file_gets_pool_and_pragmas(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT", "1234")
+    monkeypatch.setenv("SQLITE_MMAP_SIZE", "")
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_app_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+            stats = pool_stats(engine)
+            assert stats["pool"] == "QueuePool"
+            assert stats["size"] == 3
+            assert stats["checked_out"] == 1
+        assert pool_stats(engine)["checked_out"] == 0
+    finally:
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+
+
+def test_memory_sqlite_keeps_default_pool():
+    options = engine_options("sqlite://")
+    assert "pool_size" not in options and "poolclass" not in options
+    assert engine_options("postgresql://u:p@db/evo")["pool_pre_ping"] is True
@@ -0,0 +1,149 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import subprocess
+import time
+
+import requests
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app import crud, events
+from app.models import TodoCreate, User
+from app.schemas import BatchOperation
+
+
+def make_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+async def _next(stream, timeout=2.0):
+    return await asyncio.wait_for(stream.__anext__(), timeout)
+
+
+def test_ten_thousand_idle_subscribers_on_one_loop():
+    async def main():
+        events.broker.start()
+        try:
+            with make_session() as session:
+                alice = crud.create_user(session, username="alice", token="tok-a")
+                key = alice.id.hex
+                streams = [events.sse_stream(key, heartbeat=60) for _ in range(10_000)]
+                for s in streams:
+                    assert await _next(s) == b"retry: 3000\n\n"
+                assert events.broker.subscriber_count == 10_000
+
+                todo = crud.create_todo(session, TodoCreate(title="fan out"), owner=alice)
+                crud.apply_batch(session, [BatchOperation(op="delete", id=todo.id)], owner=alice)
+                start = time.perf_counter()
+                frames = [await _next(s) for s in streams]
+                deletes = [await _next(s) for s in streams]
+                elapsed = time.perf_counter() - start
+
+                assert all(f is frames[0] for f in frames)  # encoded once, shared
+                assert frames[0].startswith(b"id: 1\nevent: created\n") and b'"title":"fan out"' in frames[0]
+                assert all(f.startswith(b"id: 2\nevent: deleted\n") for f in deletes)
+                assert elapsed < 10
+
+                for s in streams:
+                    await s.aclose()
+                assert events.broker.subscriber_count == 0
+        finally:
+            await events.broker.stop()
+
+    asyncio.run(main())
+
+
+def test_slow_subscriber_gets_resync_and_rollback_publishes_nothing():
+    async def main():
+        broker = events.Broker(queue_size=2)
+        broker.start()
+        slow = events.sse_stream("k", heartbeat=60, target=broker)
+        fast = events.sse_stream("k", heartbeat=60, target=broker)
+        await _next(slow)
+        await _next(fast)
+        for version in range(1, 4):
+            broker.publish([events.Event("k", "updated", "id", version)])
+            await asyncio.sleep(0)
+            assert (await _next(fast)).startswith(f"id: {version}\n".encode())
+        assert await _next(slow) == events.RESYNC_FRAME
+        assert broker.overflows == 1 and broker.subscriber_count == 1
+        await fast.aclose()
+        await broker.stop()
+
+        events.broker.start()
+        try:
+            with make_session() as session:
+                sub = events.broker.subscribe("")
+                session.exec(select(User)).all()
+                events.publish(session, "created", "x", None, 1, {"title": "x"})
+                session.rollback()
+                session.commit()
+                await asyncio.sleep(0)
+                assert sub.queue.empty()
+                events.broker.unsubscribe(sub)
+        finally:
+            await events.broker.stop()
+
+    asyncio.run(main())
+
+
+def start_server():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    import sys
+    port = "8009"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/todos", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def test_sse_endpoint_streams_owner_events():
+    proc, base, db_path = start_server()
+    try:
+        assert requests.get(f"{base}/todos/events", timeout=2).status_code == 401
+        token = requests.post(f"{base}/users", json={"username": "gina"}, timeout=2).json()["token"]
+        other = requests.post(f"{base}/users", json={"username": "hal"}, timeout=2).json()["token"]
+
+        # The API token is not accepted in the URL; a stream token is.
+        assert requests.get(f"{base}/todos/events", params={"token": token}, timeout=2).status_code == 401
+        stream_token = requests.post(f"{base}/todos/events/token", headers={"Authorization": f"Token {token}"}, timeout=2).json()["token"]
+
+        with requests.get(f"{base}/todos/events", params={"token": stream_token}, stream=True, timeout=5) as r:
+            assert r.headers["content-type"].startswith("text/event-stream")
+            lines = r.iter_lines(chunk_size=1, decode_unicode=True)
+            assert next(lines) == "retry: 3000"
+            requests.post(f"{base}/todos", json={"title": "not mine"}, headers={"Authorization": f"Token {other}"}, timeout=2)
+            requests.post(f"{base}/todos", json={"title": "mine"}, headers={"Authorization": f"Token {token}"}, timeout=2)
+            frame = list(itertools.islice((line for line in lines if line), 3))
+            assert frame[1] == "event: created"
+            assert '"title":"mine"' in frame[2]
+    finally:
+        stop_server(proc, db_path)
@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud
+from app.export import iter_export
+from app.models import TodoCreate
+
+
+def make_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_ndjson_export_is_chunked_and_owner_scoped():
+    with make_session() as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        bob = crud.create_user(session, username="bob", token="tok-b")
+        for i in range(7):
+            crud.create_todo(session, TodoCreate(title=f"a{i}"), owner=alice)
+        crud.create_todo(session, TodoCreate(title="b0"), owner=bob)
+
+        chunks = list(iter_export(session, owner=alice, chunk_size=3))
+        assert len(chunks) == 3
+        lines = b"".join(chunks).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        assert [r["title"] for r in rows] == [f"a{i}" for i in range(7)]
+        assert all(r["owner_id"] == str(alice.id) for r in rows)
+        assert rows[0]["status"] == "pending"
+
+        everything = b"".join(iter_export(session, chunk_size=100)).decode().splitlines()
+        assert len(everything) == 8
+
+
+def test_csv_export_has_header():
+    with make_session() as session:
+        crud.create_todo(session, TodoCreate(title="x, with comma", description="d"))
+        body = b"".join(iter_export(session, fmt="csv")).decode()
+        rows = list(csv.reader(io.StringIO(body)))
+        assert rows[0] == list(crud.EXPORT_COLUMNS)
+        assert rows[1][2] == "x, with comma"
+        assert rows[1][1] == ""
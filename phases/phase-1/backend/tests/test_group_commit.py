@@ -0,0 +1,135 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app import crud, stats
+from app.group_commit import GroupCommitter
+from app.models import Todo, TodoCreate, TodoStats
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_concurrent_creates_share_transactions():
+    engine = make_engine()
+    with Session(engine) as session:
+        owner_id = crud.create_user(session, username="alice", token="tok-a").id
+
+    async def scenario():
+        committer = GroupCommitter(crud.create_todos, window=0.05, max_items=20)
+        committer.start(engine)
+        try:
+            return committer, await asyncio.gather(*(
+                committer.submit((TodoCreate(title=f"t{i}", status="completed" if i % 5 == 0 else "pending"), owner_id))
+                for i in range(50)
+            ))
+        finally:
+            await committer.stop()
+
+    committer, todos = asyncio.run(scenario())
+    assert [todo.title for todo in todos] == [f"t{i}" for i in range(50)]
+    assert committer.stats() == {"queued": 0, "flushes": 3, "items": 50, "fallbacks": 0}
+    with Session(engine) as session:
+        counters = session.get(TodoStats, stats.owner_key(owner_id))
+        assert (counters.total, counters.completed) == (50, 10)
+        versions = set(session.exec(select(Todo.change_version)).all())
+        assert versions == {todo.change_version for todo in todos} and len(versions) == 3
+
+
+def test_failed_group_is_retried_item_by_item():
+    def write(session, items):
+        if "bad" in items:
+            raise ValueError("bad item")
+        return [item.upper() for item in items]
+
+    async def scenario():
+        committer = GroupCommitter(write, window=0.05)
+        committer.start(make_engine())
+        try:
+            results = await asyncio.gather(*(committer.submit(item) for item in ("a", "bad", "c")), return_exceptions=True)
+        finally:
+            await committer.stop()
+        with pytest.raises(RuntimeError):
+            await committer.submit("late")
+        return committer, results
+
+    committer, results = asyncio.run(scenario())
+    assert results[0] == "A" and results[2] == "C"
+    assert isinstance(results[1], ValueError)
+    assert committer.fallbacks == 1
+
+
+def start_server():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    env["GROUP_COMMIT"] = "1"
+    env["GROUP_COMMIT_WINDOW_MS"] = "20"
+    port = "8013"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/health", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def test_post_todos_with_group_commit():
+    proc, base, path = start_server()
+    try:
+        token = requests.post(f"{base}/users", json={"username": "grouped"}).json()["token"]
+        headers = {"Authorization": f"Token {token}"}
+
+        def create(i):
+            return requests.post(f"{base}/todos", json={"title": f"g{i}"}, headers=headers)
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            responses = list(pool.map(create, range(40)))
+        assert all(r.status_code == 201 and r.headers["ETag"] for r in responses)
+        assert requests.post(f"{base}/todos", json={"title": "anon"}).status_code == 401
+
+        listed = requests.get(f"{base}/todos", headers=headers).json()
+        assert sorted(t["title"] for t in listed) == sorted(f"g{i}" for i in range(40))
+        assert requests.get(f"{base}/todos/stats", headers=headers).json()["total"] == 40
+
+        samples = {}
+        for line in requests.get(f"{base}/metrics").text.splitlines():
+            if line.startswith("group_commit_size_"):
+                name, value = line.rsplit(" ", 1)
+                samples[name] = float(value)
+        assert samples["group_commit_size_sum"] == 40
+        assert samples["group_commit_size_count"] < 40  # some creates shared a commit
+    finally:
+        stop_server(proc, path)
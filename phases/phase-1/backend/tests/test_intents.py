@@ -0,0 +1,36 @@
+from app.intents import parse_commands, parse_first
+
+TID = "5f0c6a9e-3b1d-4a62-9f43-1c2d3e4f5a6b"
+
+
+def test_create_forms():
+    assert parse_first("create todo: Buy milk | 2L") == ("create", {"title": "Buy milk", "description": "2L"})
+    assert parse_first("Add Todo:Buy milk") == ("create", {"title": "Buy milk", "description": ""})
+    assert parse_first("add todo Buy  AI milk") == ("create", {"title": "Buy  AI milk", "description": ""})
+    assert parse_first("create todo:") == ("unknown", {})
+
+
+def test_list_and_delete():
+    assert parse_first("Show todos") == ("list", {})
+    assert parse_first(f"delete todo {TID}") == ("delete", {"id": TID})
+    assert parse_first("delete todo") == ("unknown", {})
+
+
+def test_update_forms():
+    assert parse_first(f"update todo {TID}: Buy bread | wholemeal | completed") == (
+        "update", {"id": TID, "data": {"title": "Buy bread", "description": "wholemeal", "status": "completed"}},
+    )
+    assert parse_first(f"update todo {TID}:| only desc") == ("update", {"id": TID, "data": {"description": "only desc"}})
+    assert parse_first(f"update todo {TID} title Meet at 10:30") == ("update", {"id": TID, "data": {"title": "Meet at 10:30"}})
+    assert parse_first(f"update todo {TID} colour red") == ("unknown", {})
+
+
+def test_multi_command_message():
+    assert parse_commands("add todo X; list todos\ndelete todo abc;;") == [
+        ("create", {"title": "X", "description": ""}),
+        ("list", {}),
+        ("delete", {"id": "abc"}),
+    ]
+    assert parse_commands("hello there; list todos") == [("unknown", {}), ("list", {})]
+    assert parse_commands("  ") == []
+    assert parse_first("list todos; add todo X") == ("list", {})
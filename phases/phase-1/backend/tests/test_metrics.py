@@ -0,0 +1,126 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+from llm_stub import StubLLMServer
+
+from app import chat, metrics
+from app.ai_client import LLMClient
+
+
+def test_histogram_and_counter_render_in_text_format():
+    registry = metrics.Registry()
+    latency = registry.register(metrics.Histogram("t_seconds", "Test latency.", ("route",), buckets=(0.1, 1.0)))
+    hits = registry.register(metrics.Counter("t_total", "Test counter.", ("name",)))
+    for seconds in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(seconds, "/todos/{todo_id}")
+    hits.inc('say "hi"\n')
+    registry.add_collector(lambda: [("t_open", "gauge", "Test gauge.", {}, 2)])
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP t_seconds Test latency.", "# TYPE t_seconds histogram"]
+    assert 't_seconds_bucket{route="/todos/{todo_id}",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{route="/todos/{todo_id}",le="1"} 3' in lines
+    assert 't_seconds_bucket{route="/todos/{todo_id}",le="+Inf"} 4' in lines
+    assert 't_seconds_sum{route="/todos/{todo_id}"} 4.05' in lines
+    assert 't_seconds_count{route="/todos/{todo_id}"} 4' in lines
+    assert 't_total{name="say \\"hi\\"\\n"} 1' in lines
+    assert lines[-2:] == ["# TYPE t_open gauge", "t_open 2"]
+
+
+def test_llm_calls_and_fallbacks_are_counted(monkeypatch):
+    ok_before = metrics.LLM_CALLS.value("sync", "ok")
+    error_before = metrics.LLM_CALLS.value("async", "error")
+    failed_before = metrics.CHAT_FALLBACKS.value("async", "llm_failed")
+
+    with StubLLMServer(reply=lambda prompt: '{"intent": "list", "payload": {}}') as stub:
+        monkeypatch.setenv("AI_API_KEY", "test")
+        monkeypatch.setenv("AI_API_URL", stub.url)
+        assert chat.parse_chat("show todos")[0] == "list"
+    assert metrics.LLM_CALLS.value("sync", "ok") == ok_before + 1
+
+    async def failing(stub):
+        client = LLMClient(api_key="test", url=stub.url)
+        monkeypatch.setattr(chat.ai_client, "get_client", lambda: client)
+        try:
+            return await chat.parse_chat_async("add todo Buy milk")
+        finally:
+            await client.aclose()
+
+    with StubLLMServer(status=500) as stub:
+        assert asyncio.run(failing(stub))[0] == "create"  # rule-based
+    assert metrics.LLM_CALLS.value("async", "error") == error_before + 1
+    assert metrics.CHAT_FALLBACKS.value("async", "llm_failed") == failed_before + 1
+
+
+def start_server():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    env.pop("AI_API_KEY", None)
+    port = "8011"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/health", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def scrape(base):
+    r = requests.get(f"{base}/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in r.text.splitlines() if not line.startswith("#")}
+
+
+def test_metrics_endpoint_reports_routes_queries_and_pool():
+    proc, base, path = start_server()
+    try:
+        token = requests.post(f"{base}/users", json={"username": "metrics"}).json()["token"]
+        headers = {"Authorization": f"Token {token}"}
+        todo = requests.post(f"{base}/todos", json={"title": "watched"}, headers=headers).json()
+        for title in ("a", "b"):
+            requests.put(f"{base}/todos/{todo['id']}", json={"title": title}, headers=headers)
+        requests.get(f"{base}/todos", headers=headers)
+        requests.get(f"{base}/no/such/path")
+
+        samples = scrape(base)
+        assert samples['http_request_duration_seconds_count{method="PUT",route="/todos/{todo_id}"}'] == 2
+        assert samples['http_requests_total{method="PUT",route="/todos/{todo_id}",status="200"}'] == 2
+        assert samples['http_requests_total{method="GET",route="<unmatched>",status="404"}'] == 1
+        assert samples['http_requests_in_flight{method="GET",route="/metrics"}'] == 1  # this scrape
+        assert samples['http_requests_in_flight{method="PUT",route="/todos/{todo_id}"}'] == 0
+        assert samples['db_queries_total{engine="engine",statement="UPDATE"}'] >= 2
+        assert samples['db_query_duration_seconds_count{engine="engine",statement="SELECT"}'] > 0
+        assert samples['db_pool_checkout_wait_seconds_count{engine="engine"}'] >= 5
+        assert samples['db_pool_size{engine="engine"}'] == 5
+        assert samples["response_cache_misses_total"] == 1
+        # One token lookup per process; the later requests hit the cache.
+        assert samples["auth_token_cache_misses_total"] == 1
+        assert samples["auth_token_cache_hits_total"] >= 3
+    finally:
+        stop_server(proc, path)
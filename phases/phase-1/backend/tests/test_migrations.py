@@ -0,0 +1,58 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import SQLModel
+
+import app.models  # noqa: F401 (registers the tables)
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+
+def alembic_config(monkeypatch, tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    config = Config(str(BACKEND / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND / "alembic"))
+    return config, url
+
+
+def test_upgrade_head_matches_models(monkeypatch, tmp_path):
+    config, url = alembic_config(monkeypatch, tmp_path)
+    command.upgrade(config, "head")
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), SQLModel.metadata) == []
+    token_index = {i["name"]: i for i in inspect(engine).get_indexes("user")}["ix_user_token"]
+    assert token_index["unique"]
+
+    command.downgrade(config, "base")
+    assert inspect(engine).get_table_names() == ["alembic_version"]
+    engine.dispose()
+
+
+def test_upgrade_adopts_database_created_without_migrations(monkeypatch, tmp_path):
+    # A database from before migrations: the initial tables exist but Alembic
+    # has never stamped it.
+    config, url = alembic_config(monkeypatch, tmp_path)
+    command.upgrade(config, "0001_initial")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE alembic_version"))
+        conn.execute(text(
+            "INSERT INTO todo (id, title, status, priority, created_at, updated_at) "
+            "VALUES ('0123456789abcdef0123456789abcdef', 'kept', 'pending', 0, '2026-01-01', '2026-01-01')"
+        ))
+
+    command.upgrade(config, "head")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT title, change_version FROM todo")).all() == [("kept", 0)]
+        assert compare_metadata(MigrationContext.configure(conn), SQLModel.metadata) == []
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM todo WHERE owner_id = 'x' AND status = 'completed'"
+        )).all()
+    assert "ix_todo_owner_status" in plan[0][-1]
+    engine.dispose()
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud
+from app.models import TodoCreate
+
+
+def make_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def walk(session, **kwargs):
+    seen, cursor = [], None
+    while True:
+        page, cursor = crud.list_todos_page(session, after=cursor, **kwargs)
+        seen.extend(page)
+        if cursor is None:
+            return seen
+
+
+def test_keyset_pages_cover_every_row_once():
+    with make_session() as session:
+        user = crud.create_user(session, username="pager", token="tok-pager")
+        base = datetime(2026, 1, 1)
+        for i in range(23):
+            due = base + timedelta(days=i % 5) if i % 4 else None
+            crud.create_todo(session, TodoCreate(title=f"t{i}", priority=i % 3, due_date=due), owner=user)
+
+        for sort in ("created_at", "-created_at", "priority", "-priority", "due_date", "-due_date"):
+            rows = walk(session, owner=user, sort_by=sort, limit=4)
+            assert len(rows) == 23
+            assert len({t.id for t in rows}) == 23
+
+        rows = walk(session, owner=user, sort_by="due_date", limit=3)
+        dated = [t.due_date for t in rows if t.due_date]
+        assert dated == sorted(dated)
+        # NULL due dates come after every dated row
+        assert all(t.due_date is None for t in rows[len(dated):])
+
+        rows = walk(session, owner=user, sort_by="-priority", limit=5)
+        assert [t.priority for t in rows] == sorted((t.priority for t in rows), reverse=True)
+
+
+def test_cursor_must_match_sort():
+    with make_session() as session:
+        for i in range(3):
+            crud.create_todo(session, TodoCreate(title=f"t{i}"))
+        _, cursor = crud.list_todos_page(session, sort_by="created_at", limit=1)
+        assert cursor
+        with pytest.raises(ValueError):
+            crud.list_todos_page(session, sort_by="priority", limit=1, after=cursor)
+        with pytest.raises(ValueError):
+            crud.list_todos_page(session, limit=1, after="not-a-cursor")
+        with pytest.raises(ValueError):
+            crud.list_todos_page(session, sort_by="title", limit=1)
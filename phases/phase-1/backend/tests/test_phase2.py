@@ -2,16 +2,18 @@ import os
 import tempfile
 import subprocess
 import time
+import pytest
 import requests
 import signal
 
 
-def start_server_with_db():
+def start_server_with_db(storage="sql"):
     fd, path = tempfile.mkstemp(suffix=".db")
     os.close(fd)
     db_url = f"sqlite:///{path}"
     env = os.environ.copy()
     env["DATABASE_URL"] = db_url
+    env["STORAGE_BACKEND"] = storage
 
     import sys
     python_exec = sys.executable
@@ -40,8 +42,9 @@ def stop_server(proc):
         proc.kill()
 
 
-def test_phase2_auth_and_filters():
-    proc, base, db_path = start_server_with_db()
+@pytest.mark.parametrize("storage", ["sql", "memory"])
+def test_phase2_auth_and_filters(storage):
+    proc, base, db_path = start_server_with_db(storage)
     try:
         # create user
         r = requests.post(f"{base}/users", json={"username": "alice"}, timeout=2)
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud
+from app.database import create_app_engine, init_db
+from app.models import TodoCreate
+from app.replicas import ReplicaSet, read_heartbeat, replica_urls, write_heartbeat
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_replica_urls():
+    assert replica_urls(None) == {} and replica_urls(" ") == {}
+    assert replica_urls("sqlite:////a.db, postgresql://standby/app") == {
+        "replica0": "sqlite:////a.db", "replica1": "postgresql://standby/app",
+    }
+
+
+def test_lagging_replica_is_ejected_and_readmitted():
+    primary, fresh, behind = make_engine(), make_engine(), make_engine()
+    now = [1000.0]
+    replicas = ReplicaSet({"fresh": fresh, "behind": behind}, max_lag=5, clock=lambda: now[0])
+    assert replicas.choose() is None  # nothing is trusted before the first check
+
+    def replicate(*targets):
+        for target in targets:
+            write_heartbeat(target, read_heartbeat(primary))
+
+    replicas.check(primary)
+    assert replicas.healthy == [] and replicas.lag == {"fresh": None, "behind": None}
+    replicate(fresh, behind)
+    replicas.check(primary)
+    assert replicas.healthy == ["fresh", "behind"]
+    assert {replicas.choose(), replicas.choose()} == {"fresh", "behind"}
+
+    # `behind` stops replicating; it is ejected once its lag passes max_lag.
+    for _ in range(6):
+        now[0] += 1
+        replicas.check(primary)
+        replicate(fresh)
+    assert replicas.healthy == ["fresh"] and replicas.lag["behind"] == 6
+    assert replicas.stats()["behind"]["ejections"] == 1
+    assert {replicas.choose() for _ in range(4)} == {"fresh"}
+    replicate(behind)
+    replicas.check(primary)
+    assert replicas.healthy == ["fresh", "behind"]
+
+
+def test_writes_stick_to_the_primary_for_the_window():
+    replicas = ReplicaSet({"replica0": make_engine()}, sticky_seconds=0.2)
+    replicas.wrote(["a"])
+    assert replicas.sticky("a") and not replicas.sticky("b")
+    time.sleep(0.25)
+    assert not replicas.sticky("a")
+    assert not ReplicaSet({}).sticky("a")
+
+
+def seed(primary_path, replica_path):
+    """A primary with alice and one todo, and a replica copied from it that
+    also holds a todo the primary does not, to tell which one answered."""
+    init_db(f"sqlite:///{primary_path}")
+    primary = create_app_engine(f"sqlite:///{primary_path}")
+    with Session(primary) as session:
+        alice = crud.create_user(session, username="alice", token="alice-token")
+        crud.create_todo(session, TodoCreate(title="on both"), owner=alice)
+    primary.dispose()
+    with sqlite3.connect(primary_path) as src, sqlite3.connect(replica_path) as dst:
+        src.backup(dst)
+    replica = create_app_engine(f"sqlite:///{replica_path}")
+    with Session(replica) as session:
+        crud.create_todo(session, TodoCreate(title="replica only"), owner=crud.get_user_by_token(session, "alice-token"))
+    replica.dispose()
+
+
+class HeartbeatReplicator(threading.Thread):
+    """Copies the primary's heartbeat to the replica, like replication would."""
+
+    def __init__(self, primary_path, replica_path):
+        super().__init__(daemon=True)
+        self.paths = (primary_path, replica_path)
+        self.stopped = threading.Event()
+
+    def run(self):
+        src, dst = (sqlite3.connect(path, timeout=5) for path in self.paths)
+        try:
+            while not self.stopped.wait(0.05):
+                row = src.execute("SELECT id, beat_at FROM replicaheartbeat").fetchone()
+                if row:
+                    dst.execute("INSERT OR REPLACE INTO replicaheartbeat (id, beat_at) VALUES (?, ?)", row)
+                    dst.commit()
+        finally:
+            src.close()
+            dst.close()
+
+
+def start_server(primary_path, replica_path):
+    env = os.environ.copy()
+    env.update(
+        DATABASE_URL=f"sqlite:///{primary_path}",
+        DATABASE_REPLICA_URLS=f"sqlite:///{replica_path}",
+        REPLICA_CHECK_INTERVAL="0.1",
+        REPLICA_MAX_LAG="1",
+        REPLICA_STICKY_SECONDS="1",
+        # Same versions on both sides here; keep cached listings out of it.
+        RESPONSE_CACHE_BYTES="0",
+    )
+    port = "8015"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/health", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_reads_use_the_replica_until_own_writes_or_lag():
+    tmp = tempfile.mkdtemp()
+    primary_path, replica_path = os.path.join(tmp, "primary.db"), os.path.join(tmp, "replica.db")
+    seed(primary_path, replica_path)
+    replicator = HeartbeatReplicator(primary_path, replica_path)
+    replicator.start()
+    proc, base = start_server(primary_path, replica_path)
+    alice = {"Authorization": "Token alice-token"}
+
+    def healthy():
+        return requests.get(f"{base}/health/replicas").json()["replica0"]["healthy"]
+
+    def titles(headers):
+        r = requests.get(f"{base}/todos", headers=headers)
+        assert r.status_code == 200
+        return sorted(t["title"] for t in r.json())
+
+    try:
+        wait_for(healthy)
+        assert titles(alice) == ["on both", "replica only"]
+        assert requests.get(f"{base}/todos/stats", headers=alice).json()["total"] == 2
+
+        # Read-your-writes: right after a write alice reads the primary.
+        assert requests.post(f"{base}/todos", json={"title": "fresh"}, headers=alice).status_code == 201
+        assert titles(alice) == ["fresh", "on both"]
+        time.sleep(1.2)
+        assert titles(alice) == ["on both", "replica only"]
+
+        # A brand-new user is not on the replica yet; the lookup falls back.
+        token = requests.post(f"{base}/users", json={"username": "bob"}).json()["token"]
+        assert titles({"Authorization": f"Token {token}"}) == []
+
+        replicator.stopped.set()
+        wait_for(lambda: not healthy())
+        assert titles(alice) == ["fresh", "on both"]
+        assert 'replica_ejections_total{replica="replica0"} 1' in requests.get(f"{base}/metrics").text
+    finally:
+        replicator.stopped.set()
+        proc.terminate()
+        proc.wait(timeout=5)
+        for name in os.listdir(tmp):
+            os.remove(os.path.join(tmp, name))
+        os.rmdir(tmp)
+
+
+def test_check_errors_do_not_stop_the_checker(monkeypatch):
+    primary, replica = make_engine(), make_engine()
+    replicas = ReplicaSet({"replica0": replica}, check_interval=0.01)
+    calls = []
+
+    def check(bind):
+        calls.append(bind)
+        if len(calls) == 1:
+            write_heartbeat(primary, time.time())
+            write_heartbeat(replica, read_heartbeat(primary))
+            return ReplicaSet.check(replicas, bind)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(replicas, "check", check)
+
+    async def scenario():
+        replicas.start(primary)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if len(calls) >= 3:
+                break
+        healthy_after_errors = replicas.healthy
+        await replicas.stop()
+        return healthy_after_errors
+
+    assert asyncio.run(scenario()) == []
+    assert len(calls) >= 3 and replicas.healthy == []
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import subprocess
+import time
+import requests
+
+
+def start_server():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    import sys
+    port = "8005"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/todos", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def test_one_session_and_checkout_per_request():
+    proc, base, db_path = start_server()
+    try:
+        r = requests.post(f"{base}/users", json={"username": "dave"}, timeout=2)
+        headers = {"Authorization": f"Token {r.json()['token']}"}
+
+        r = requests.post(f"{base}/todos", json={"title": "one"}, headers=headers, timeout=2)
+        assert r.status_code == 201
+        tid = r.json()["id"]
+        calls = [
+            r,
+            requests.get(f"{base}/todos", headers=headers, timeout=2),
+            requests.put(f"{base}/todos/{tid}", json={"title": "two"}, headers=headers, timeout=2),
+            requests.delete(f"{base}/todos/{tid}", headers=headers, timeout=2),
+        ]
+        for resp in calls:
+            assert resp.headers["X-DB-Sessions"] == "1"
+            assert resp.headers["X-DB-Checkouts"] == "1"
+    finally:
+        stop_server(proc, db_path)
+
+
+def test_request_session_rolls_back_uncommitted_writes(monkeypatch):
+    # get_db's exit runs after the response is sent, so it must not be what
+    # makes a write durable: writes commit themselves, leftovers roll back.
+    import asyncio
+    from sqlalchemy.pool import StaticPool
+    from sqlmodel import SQLModel, Session, create_engine, select
+    from app import crud, database
+    from app.models import TodoCreate, Todo
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "async_engine", None)
+
+    async def request():
+        gen = database.get_db()
+        db = await gen.__anext__()
+        await db.run(crud.create_todo, TodoCreate(title="committed"))
+        db.session.add(Todo(title="left pending"))
+        await gen.aclose()
+
+    asyncio.run(request())
+    with Session(engine) as session:
+        assert [t.title for t in session.exec(select(Todo))] == ["committed"]
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import subprocess
+import time
+
+import requests
+
+from app.response_cache import CachedResponse, MemoryBackend, ResponseCache
+
+
+def test_memory_backend_is_byte_bounded_lru_with_scoped_invalidation():
+    backend = MemoryBackend(max_bytes=10)
+    cache = ResponseCache(backend)
+    cache.set("a|1|", "a", CachedResponse(b"aaaa"))
+    cache.set("b|1|", "b", CachedResponse(b"bbbb"))
+    assert cache.get("a|1|").body == b"aaaa"  # a is now most recent
+    cache.set("b|1|x", "b", CachedResponse(b"cccc"))  # evicts b|1|
+    assert cache.get("b|1|") is None
+    assert backend.stats()["bytes"] == 8 and backend.evictions == 1
+
+    cache.invalidate(["b"])
+    assert cache.get("b|1|x") is None and cache.get("a|1|") is not None
+    cache.set("big", "a", CachedResponse(b"x" * 11))  # larger than the cache
+    assert cache.get("big") is None
+    assert cache.stats()["hit_ratio"] == 0.4
+    assert ResponseCache.key("a", 3, [("sort", "x"), ("completed", "true")]) == "a|3|completed=true&sort=x"
+
+
+def start_server():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    import sys
+    port = "8010"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/health", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def test_list_responses_are_cached_and_invalidated_by_writes():
+    proc, base, db_path = start_server()
+    try:
+        token = requests.post(f"{base}/users", json={"username": "ivy"}, timeout=2).json()["token"]
+        headers = {"Authorization": f"Token {token}"}
+        requests.post(f"{base}/todos", json={"title": "one", "priority": 2}, headers=headers, timeout=2)
+
+        first = requests.get(f"{base}/todos?sort=due_date", headers=headers, timeout=2)
+        again = requests.get(f"{base}/todos?sort=due_date", headers=headers, timeout=2)
+        assert (first.headers["X-Cache"], again.headers["X-Cache"]) == ("miss", "hit")
+        assert again.json() == first.json()
+        assert first.json()[0]["title"] == "one" and first.json()[0]["priority"] == 2
+        paged = requests.get(f"{base}/todos?limit=1", headers=headers, timeout=2)
+        assert paged.headers["X-Cache"] == "miss"
+
+        requests.post(f"{base}/todos", json={"title": "two"}, headers=headers, timeout=2)
+        assert requests.get(f"{base}/health/cache", timeout=2).json()["responses"]["entries"] == 0
+        r = requests.get(f"{base}/todos?sort=due_date", headers=headers, timeout=2)
+        assert r.headers["X-Cache"] == "miss" and len(r.json()) == 2
+        stats = requests.get(f"{base}/health/cache", timeout=2).json()["responses"]
+        assert stats["hits"] == 1 and stats["misses"] == 3
+    finally:
+        stop_server(proc, db_path)
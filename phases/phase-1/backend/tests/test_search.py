@@ -0,0 +1,53 @@
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud, search
+from app.models import TodoCreate
+from app.schemas import BatchOperation
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def titles(todos):
+    return [t.title for t in todos]
+
+
+def test_search_tracks_writes_and_ranks_prefixes():
+    engine = make_engine()
+    with Session(engine) as session:
+        # rows written before the index exists are backfilled
+        crud.create_todo(session, TodoCreate(title="Buy milk", description="2 litres"))
+    search.ensure_search_index(engine)
+    with Session(engine) as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        bread = crud.create_todo(session, TodoCreate(title="Buy bread", description="and milk, milk, milk"), owner=alice)
+        crud.create_todo(session, TodoCreate(title="Walk dog"), owner=alice)
+
+        assert set(titles(search.search_todos(session, "milk"))) == {"Buy milk", "Buy bread"}
+        assert titles(search.search_todos(session, "milk", owner=alice)) == ["Buy bread"]
+        assert titles(search.search_todos(session, "mil")) != []  # prefix match
+        assert titles(search.search_todos(session, "buy milk"))[0] == "Buy bread"  # best match first
+        assert search.search_todos(session, "***") == []
+
+        crud.update_todo(session, bread, TodoCreate(title="Buy rolls"))
+        assert titles(search.search_todos(session, "milk", owner=alice)) == []
+        assert titles(search.search_todos(session, "rolls")) == ["Buy rolls"]
+
+        crud.delete_todo(session, crud.get_todo(session, bread.id))
+        assert search.search_todos(session, "rolls") == []
+
+        assert search.search_todos(session, "buy walk") == []  # every term must match
+
+        crud.apply_batch(session, [BatchOperation(op="create", data=TodoCreate(title="Batch item"))], owner=alice)
+        assert titles(search.search_todos(session, "batch")) == ["Batch item"]
+
+
+def test_writes_without_index_still_work():
+    engine = make_engine()
+    with Session(engine) as session:
+        todo = crud.create_todo(session, TodoCreate(title="no fts here"))
+        crud.delete_todo(session, todo)
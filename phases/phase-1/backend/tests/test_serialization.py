@@ -0,0 +1,28 @@
+import json
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud, serialization
+from app.models import TodoCreate, TodoRead
+
+
+def test_row_encoding_matches_response_model_output():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        crud.create_todo(session, TodoCreate(title="été ✓", status="completed", priority=3, due_date=datetime(2026, 5, 1, 9, 30)), owner=alice)
+        crud.create_todo(session, TodoCreate(title="plain", description="d"))
+
+        expected = jsonable_encoder([TodoRead.from_orm(t) for t in crud.list_todos(session, sort_by="due_date")])
+        rows = crud.list_todos(session, sort_by="due_date", as_rows=True)
+        assert json.loads(serialization.encode_todo_rows(rows)) == expected
+        assert json.loads(serialization.dumps_stdlib(serialization.todo_row_dicts(rows))) == expected
+
+        page, cursor = crud.list_todos_page(session, sort_by="-priority", limit=1, as_rows=True)
+        assert page[0].priority == 3 and cursor
+        rest, _ = crud.list_todos_page(session, sort_by="-priority", limit=1, after=cursor, as_rows=True)
+        assert rest[0].title == "plain"
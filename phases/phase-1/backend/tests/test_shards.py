@@ -0,0 +1,247 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+import requests
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app import crud, search, stats
+from app.database import init_db
+from app.models import Todo, TodoCreate, TodoPriorityStats, TodoStats, User
+from app.shards import HashRing, shard_urls
+
+REBALANCE = Path(__file__).resolve().parents[4] / "scripts" / "rebalance_shards.py"
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_hash_ring_moves_only_keys_for_the_new_shard():
+    keys = [uuid4().hex for _ in range(2000)] + [""]
+    four = HashRing(["shard0", "shard1", "shard2", "shard3"])
+    five = HashRing(["shard0", "shard1", "shard2", "shard3", "shard4"])
+    placed = {key: four.node_for(key) for key in keys}
+    assert all(HashRing(["shard3", "shard1", "shard0", "shard2"]).node_for(k) == n for k, n in placed.items())
+    assert min(list(placed.values()).count(n) for n in ("shard0", "shard1", "shard2", "shard3")) > 300
+    moved = [key for key in keys if five.node_for(key) != placed[key]]
+    assert all(five.node_for(key) == "shard4" for key in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.3
+
+
+def test_shard_urls():
+    assert shard_urls("", "sqlite:////data/database.db") == {}
+    assert shard_urls("0", "sqlite:////data/database.db") == {}
+    assert shard_urls("2", "sqlite:////data/database.db") == {
+        "shard0": "sqlite:////data/database.shard0.db",
+        "shard1": "sqlite:////data/database.shard1.db",
+    }
+    assert shard_urls("sqlite:////a.db, sqlite:////b.db", "postgresql://db/app") == {
+        "shard0": "sqlite:////a.db", "shard1": "sqlite:////b.db",
+    }
+    with pytest.raises(ValueError):
+        shard_urls("2", "sqlite://")
+    with pytest.raises(ValueError, match="SQLite shards only"):
+        shard_urls("sqlite:////a.db, postgresql://db/shard1", "postgresql://db/app")
+
+
+@pytest.mark.parametrize("sort", ["created_at", "-priority", "due_date", "-due_date"])
+def test_merged_pages_match_a_single_database(sort):
+    whole, parts = make_engine(), [make_engine(), make_engine(), make_engine()]
+    start = datetime(2024, 1, 1)
+    for i in range(40):
+        todo = Todo(
+            title=f"t{i}", priority=i % 4, created_at=start + timedelta(minutes=i // 2),
+            due_date=None if i % 5 == 0 else start + timedelta(days=i % 7),
+        )
+        for engine in (whole, parts[i % 3]):
+            with Session(engine) as session:
+                session.add(Todo(**todo.dict()))
+                session.commit()
+
+    def walk(page):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = page(cursor)
+            seen.extend(row.id for row in rows)
+            if cursor is None:
+                return seen
+
+    def single(cursor):
+        with Session(whole) as session:
+            return crud.list_todos_page(session, sort_by=sort, limit=7, after=cursor, as_rows=True)
+
+    def merged(cursor):
+        pages = []
+        for engine in parts:
+            with Session(engine) as session:
+                pages.append(crud.list_todos_page(session, sort_by=sort, limit=7, after=cursor, as_rows=True))
+        return crud.merge_todo_pages(pages, sort, 7)
+
+    expected = walk(single)
+    assert len(expected) == 40 and walk(merged) == expected
+
+
+def test_stats_merge():
+    engines = [make_engine(), make_engine()]
+    for i, engine in enumerate(engines):
+        with Session(engine) as session:
+            for j in range(3 + i):
+                crud.create_todo(session, TodoCreate(title=f"t{j}", priority=j, status="completed" if j == 0 else "pending"))
+    parts = []
+    for engine in engines:
+        with Session(engine) as session:
+            parts.append(stats.todo_stats(session))
+    merged = stats.merge_todo_stats(parts)
+    assert merged["total"] == 7
+    assert merged["by_status"] == {"pending": 5, "completed": 2}
+    assert merged["by_priority"] == {0: 2, 1: 2, 2: 2, 3: 1}
+
+
+def test_rebalance_script_shards_and_reshards(tmp_path):
+    main_url = f"sqlite:///{tmp_path / 'database.db'}"
+    init_db(main_url)
+    from app.database import create_app_engine
+
+    main = create_app_engine(main_url)
+    owners = []
+    with Session(main) as session:
+        # Enough random owner ids that some surely move to a fourth shard.
+        for n in range(48):
+            owner = crud.create_user(session, username=f"u{n}", token=f"tok-{n}")
+            owners.append(owner.id)
+            for j in range(2):
+                crud.create_todo(session, TodoCreate(title=f"owner {n} item {j}"), owner=owner)
+        crud.create_todo(session, TodoCreate(title="unowned item"))
+
+    def run(source, target):
+        out = subprocess.run(
+            [sys.executable, str(REBALANCE), "--database-url", main_url, "--from", source, "--to", target],
+            capture_output=True, text=True, check=True,
+        )
+        return out.stdout
+
+    def placement(spec):
+        from app.database import create_app_engine as make
+
+        found = {}
+        for name, url in shard_urls(spec, main_url).items():
+            shard = make(url)
+            with Session(shard) as session:
+                for owner_id in session.exec(select(Todo.owner_id)).all():
+                    found.setdefault(owner_id, set()).add(name)
+                counters = {row.owner_key: row.total for row in session.exec(select(TodoStats)).all()}
+                assert all(counters[stats.owner_key(o)] == (1 if o is None else 2) for o in found if name in found[o])
+                per_priority = {}
+                for row in session.exec(select(TodoPriorityStats)).all():
+                    per_priority[row.owner_key] = per_priority.get(row.owner_key, 0) + row.total
+                assert per_priority == counters
+                hits = search.search_todos(session, "item", limit=1000)
+                assert {t.owner_id for t in hits} == {o for o, names in found.items() if name in names}
+            shard.dispose()
+        return found
+
+    assert "main -> shard" in run("0", "3")
+    with Session(main) as session:
+        assert session.exec(select(Todo)).all() == []
+        assert len(session.exec(select(User)).all()) == 48
+    three = placement("3")
+    ring3 = HashRing(["shard0", "shard1", "shard2"])
+    assert set(three) == set(owners) | {None}
+    assert all(names == {ring3.node_for(stats.owner_key(o))} for o, names in three.items())
+
+    run("3", "4")
+    four = placement("4")
+    assert set(four) == set(three)
+    moved = {o for o in four if four[o] != three[o]}
+    assert moved and all(four[o] == {"shard3"} for o in moved)
+    assert run("4", "4").strip() == "nothing to move"
+    main.dispose()
+
+
+def start_server():
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "database.db")
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    env["DB_SHARDS"] = "3"
+    port = "8014"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/health", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, tmp
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, tmp):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    for name in os.listdir(tmp):
+        os.remove(os.path.join(tmp, name))
+    os.rmdir(tmp)
+
+
+def test_sharded_api():
+    proc, base, tmp = start_server()
+    try:
+        anon = requests.post(f"{base}/todos", json={"title": "legacy"}).json()
+        users = []
+        for n in range(6):
+            token = requests.post(f"{base}/users", json={"username": f"s{n}"}).json()["token"]
+            headers = {"Authorization": f"Token {token}"}
+            ids = [requests.post(f"{base}/todos", json={"title": f"user {n} todo {j}", "priority": j}, headers=headers).json()["id"]
+                   for j in range(3)]
+            users.append((headers, ids))
+        assert {"database.shard0.db", "database.shard1.db", "database.shard2.db"} <= set(os.listdir(tmp))
+
+        (alice, alice_ids), (bob, bob_ids) = users[0], users[1]
+        assert sorted(t["title"] for t in requests.get(f"{base}/todos", headers=alice).json()) == [f"user 0 todo {j}" for j in range(3)]
+        assert requests.get(f"{base}/todos/{bob_ids[0]}", headers=alice).status_code == 403
+        assert requests.patch(f"{base}/todos/{bob_ids[0]}", json={"priority": 4}, headers=alice).status_code == 403
+        assert requests.delete(f"{base}/todos/{bob_ids[0]}").status_code == 401
+        assert requests.delete(f"{base}/todos/{uuid4()}", headers=alice).status_code == 404
+        # Unowned todos stay reachable for signed-in callers.
+        assert requests.patch(f"{base}/todos/{anon['id']}", json={"priority": 2}, headers=alice).json()["priority"] == 2
+        assert requests.put(f"{base}/todos/{alice_ids[0]}", json={"title": "done", "status": "completed"}, headers=alice).status_code == 200
+        assert requests.get(f"{base}/todos/stats", headers=alice).json()["by_status"] == {"pending": 2, "completed": 1}
+        assert [t["title"] for t in requests.get(f"{base}/todos/search", params={"q": "done"}, headers=alice).json()] == ["done"]
+
+        # The anonymous scope spans every shard.
+        everything = requests.get(f"{base}/todos").json()
+        assert len(everything) == 19
+        walked, cursor = [], None
+        while True:
+            params = {"limit": 4, "sort": "-priority", **({"after": cursor} if cursor else {})}
+            r = requests.get(f"{base}/todos", params=params)
+            walked.extend(r.json())
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert sorted(t["id"] for t in walked) == sorted(t["id"] for t in everything)
+        assert [t["priority"] for t in walked] == sorted((t["priority"] for t in walked), reverse=True)
+        totals = requests.get(f"{base}/todos/stats").json()
+        assert totals["total"] == 19 and totals["by_status"]["completed"] == 1
+        assert len(requests.get(f"{base}/todos/search", params={"q": "todo"}).json()) == 17  # one renamed "done"
+        assert len(requests.get(f"{base}/todos/export").text.splitlines()) == 19
+    finally:
+        stop_server(proc, tmp)
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, delete
+
+from app import crud, stats
+from app.models import TodoCreate, TodoPriorityStats, TodoStats
+from app.schemas import BatchOperation
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_counters_follow_every_write_path():
+    engine = make_engine()
+    now = datetime(2026, 3, 4, 12, 0)  # a Wednesday
+    with Session(engine) as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        bob = crud.create_user(session, username="bob", token="tok-b")
+        late = crud.create_todo(session, TodoCreate(title="late", due_date=now - timedelta(days=1), priority=2), owner=alice)
+        crud.create_todo(session, TodoCreate(title="sunday", due_date=now + timedelta(days=4)), owner=alice)
+        crud.create_todo(session, TodoCreate(title="next week", due_date=now + timedelta(days=6)), owner=alice)
+        done = crud.create_todo(session, TodoCreate(title="done", status="completed"), owner=alice)
+        crud.create_todo(session, TodoCreate(title="bob's"), owner=bob)
+
+        crud.update_todo(session, done, TodoCreate(title="done", status="pending"))
+        crud.update_todo(session, late, TodoCreate(title="late", status="completed", priority=2, due_date=late.due_date))
+        crud.delete_todo(session, done)
+        extra = crud.apply_batch(session, [
+            BatchOperation(op="create", data=TodoCreate(title="b1", status="completed", priority=1)),
+            BatchOperation(op="create", data=TodoCreate(title="b2", priority=1)),
+        ], owner=alice)
+        crud.apply_batch(session, [
+            BatchOperation(op="update", id=extra[1]["id"], data=TodoCreate(title="b2", status="completed")),
+            BatchOperation(op="delete", id=extra[0]["id"]),
+        ], owner=alice)
+        # The guarded single-row paths read the old priority under the counter lock.
+        moved = crud.create_todo(session, TodoCreate(title="moved", priority=3), owner=alice)
+        assert crud.update_todo_by_id(session, moved.id, {"priority": 2}, owner=alice)[1] is None
+        assert stats.todo_stats(session, owner=alice, now=now)["by_priority"] == {0: 3, 2: 2}
+        assert crud.delete_todo_by_id(session, moved.id, owner=alice) is None
+
+        mine = stats.todo_stats(session, owner=alice, now=now)
+        assert mine == {
+            "total": 4,
+            "by_status": {"pending": 2, "completed": 2},
+            "by_priority": {0: 3, 2: 1},
+            "overdue": 0,
+            "due_this_week": 1,
+            "no_due_date": 1,
+        }
+        everyone = stats.todo_stats(session, now=now)
+        assert everyone["total"] == 5 and everyone["by_status"] == {"pending": 3, "completed": 2}
+
+
+def test_counters_are_rebuilt_when_missing():
+    engine = make_engine()
+    with Session(engine) as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        crud.create_todo(session, TodoCreate(title="a", status="completed"), owner=alice)
+        crud.create_todo(session, TodoCreate(title="anon"))
+        session.exec(delete(TodoStats))
+        session.exec(delete(TodoPriorityStats))
+        session.commit()
+        session.refresh(alice)
+
+    stats.ensure_todo_stats(engine)
+    with Session(engine) as session:
+        assert stats.todo_stats(session, owner=alice)["by_status"] == {"pending": 0, "completed": 1}
+        assert stats.todo_stats(session)["total"] == 2
+        assert session.get(TodoStats, "").total == 1
+        assert stats.todo_stats(session)["by_priority"] == {0: 2}
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+
+from app import crud
+from app.models import TodoCreate, User
+from app.storage import MemoryStore, SQLStore, TodoStore, load_store
+
+NOW = datetime(2026, 3, 4, 12, 0)
+ALICE = User(id=uuid4(), username="alice", token="alice-token")
+BOB = User(id=uuid4(), username="bob", token="bob-token")
+
+
+def make_sql_store():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return SQLStore(engine)
+
+
+@pytest.fixture(params=["sql", "memory"])
+def store(request):
+    return make_sql_store() if request.param == "sql" else MemoryStore()
+
+
+def seed(store):
+    todos = []
+    for i in range(45):
+        due = None if i % 4 == 0 else NOW + timedelta(days=i % 9 - 3)
+        todo_in = TodoCreate(title=f"t{i}", priority=i % 3, due_date=due, status="completed" if i % 5 == 0 else "pending")
+        todos.append(store.create_todo(todo_in, owner=(ALICE, BOB, None)[i % 3]))
+    return todos
+
+
+@pytest.mark.parametrize("sort", ["created_at", "-created_at", "priority", "-priority", "due_date", "-due_date"])
+@pytest.mark.parametrize("owner", [ALICE, None])
+@pytest.mark.parametrize("completed", [None, False])
+def test_pages_walk_in_list_order(store, sort, owner, completed):
+    seed(store)
+    listed = store.list_todos(owner=owner, completed=completed, sort_by=sort)
+    expected = [t.id for t in listed]
+    walked, cursor = [], None
+    while True:
+        page, cursor = store.list_todos_page(owner=owner, completed=completed, sort_by=sort, limit=4, after=cursor)
+        walked.extend(t.id for t in page)
+        if cursor is None:
+            break
+    assert walked == expected and len(expected) == len(listed) > 0
+
+
+@pytest.mark.parametrize("sort", [None, "priority", "due_date", "-due_date"])
+def test_list_order(store, sort):
+    created = seed(store)
+    listed = store.list_todos(sort_by=sort)
+    assert [t.id for t in listed] == [t.id for t in crud.merge_todo_lists([created], sort)]
+    if sort == "due_date":
+        assert listed[-1].due_date is None  # NULLs last, as in pages
+    with pytest.raises(ValueError):
+        store.list_todos(sort_by="title")
+    assert {t.title for t in store.list_todos(owner=BOB, completed=True)} == {"t10", "t25", "t40"}
+    assert {f"{t.status}" for t in listed} == {"pending", "completed"}
+
+
+def test_writes_follow_ownership_and_if_match(store):
+    mine = store.create_todo(TodoCreate(title="mine"), owner=ALICE)
+    shared = store.create_todo(TodoCreate(title="shared"))
+    assert store.update_todo_by_id(mine.id, {"title": "x"}, owner=BOB) == (None, (403, "Forbidden"))
+    assert store.update_todo_by_id(mine.id, {"title": "x"}) == (None, (401, "Unauthorized"))
+    assert store.update_todo_by_id(uuid4(), {"title": "x"}, owner=ALICE) == (None, (404, "Todo not found"))
+    assert store.update_todo_by_id(mine.id, {"title": "x"}, owner=ALICE, if_match=[mine.change_version + 5]) == (None, (412, "Precondition Failed"))
+
+    row, error = store.update_todo_by_id(mine.id, {"status": "completed", "priority": 4}, owner=ALICE, if_match=[mine.change_version])
+    assert error is None and row["change_version"] > mine.change_version
+    assert (row["status"], row["priority"], row["title"]) == ("completed", 4, "mine")
+    assert store.get_todo_row(mine.id) == row
+    assert store.list_todos(owner=ALICE, completed=True)[0].id == mine.id
+    assert store.list_todos_page(owner=ALICE, sort_by="-priority", limit=1)[0][0].id == mine.id
+
+    # Signed-in callers may write unowned todos.
+    assert store.update_todo_by_id(shared.id, {"title": "edited"}, owner=BOB)[1] is None
+    assert store.delete_todo_by_id(mine.id, owner=BOB) == (403, "Forbidden")
+    assert store.delete_todo_by_id(mine.id, owner=ALICE) is None
+    assert store.get_todo(mine.id) is None
+    assert store.delete_todo_by_id(mine.id, owner=ALICE) == (404, "Todo not found")
+    assert store.list_todos(owner=ALICE) == [] and store.todo_stats(owner=ALICE)["total"] == 0
+    assert [t.title for t in store.list_todos()] == ["edited"]
+
+
+def test_stats_match_sql():
+    sql, memory = make_sql_store(), MemoryStore()
+    for store in (sql, memory):
+        todos = seed(store)
+        store.update_todo_by_id(todos[3].id, {"status": "completed", "due_date": None}, owner=ALICE)
+        store.delete_todo_by_id(todos[7].id, owner=BOB)
+    for owner in (ALICE, BOB, None):
+        assert memory.todo_stats(owner=owner, now=NOW) == sql.todo_stats(owner=owner, now=NOW)
+    assert memory.todo_stats(owner=User(id=uuid4()))["total"] == 0
+
+
+def test_load_store(monkeypatch):
+    assert isinstance(load_store("memory"), MemoryStore)
+    assert isinstance(load_store(""), SQLStore)
+    monkeypatch.setenv("STORAGE_BACKEND", "app.storage:MemoryStore")
+    assert isinstance(load_store(), MemoryStore)
+    with pytest.raises(ValueError):
+        load_store("redis")
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        TodoStore()
+
+    class Partial(TodoStore):
+        def get_todo(self, todo_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import subprocess
+import time
+
+import requests
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud, sync
+from app.models import TodoCreate
+from app.schemas import BatchOperation
+
+
+def make_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_changes_since_returns_upserts_and_tombstones():
+    with make_session() as session:
+        alice = crud.create_user(session, username="alice", token="tok-a")
+        bob = crud.create_user(session, username="bob", token="tok-b")
+        a = crud.create_todo(session, TodoCreate(title="a"), owner=alice)
+        b = crud.create_todo(session, TodoCreate(title="b"), owner=alice)
+        crud.create_todo(session, TodoCreate(title="bob's"), owner=bob)
+        assert (a.change_version, b.change_version) == (1, 2)
+        seen = sync.changes_since(session, alice, 0)
+        assert seen["version"] == 2 and [t.title for t in seen["upserts"]] == ["a", "b"]
+
+        crud.update_todo(session, a, TodoCreate(title="a2"))
+        crud.delete_todo(session, b)
+        results = crud.apply_batch(session, [
+            BatchOperation(op="create", data=TodoCreate(title="c")),
+            BatchOperation(op="update", id=a.id, data=TodoCreate(title="a3")),
+        ], owner=alice)
+        assert results[0]["todo"]["change_version"] == results[1]["todo"]["change_version"] == 5
+
+        delta = sync.changes_since(session, alice, seen["version"])
+        assert delta["version"] == 5
+        assert sorted(t.title for t in delta["upserts"]) == ["a3", "c"]
+        assert delta["deletes"] == [b.id]
+        assert sync.changes_since(session, alice, 5) == {"version": 5, "upserts": [], "deletes": []}
+        assert sync.current_version(session, bob) == 1
+        assert sync.current_version(session) == 6
+
+
+def start_server():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = os.environ.copy()
+    env["DATABASE_URL"] = f"sqlite:///{path}"
+    import sys
+    port = "8008"
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{base}/todos", timeout=0.5)
+            if r.status_code == 200:
+                return proc, base, path
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server failed to start")
+
+
+def stop_server(proc, path):
+    try:
+        proc.terminate()
+        proc.wait(timeout=2)
+    except Exception:
+        proc.kill()
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def test_etag_and_changes_endpoints():
+    proc, base, db_path = start_server()
+    try:
+        r = requests.post(f"{base}/users", json={"username": "frank"}, timeout=2)
+        headers = {"Authorization": f"Token {r.json()['token']}"}
+        tid = requests.post(f"{base}/todos", json={"title": "one"}, headers=headers, timeout=2).json()["id"]
+
+        r = requests.get(f"{base}/todos", headers=headers, timeout=2)
+        etag = r.headers["ETag"]
+        assert etag.startswith('W/"')
+        r = requests.get(f"{base}/todos", headers=dict(headers, **{"If-None-Match": etag}), timeout=2)
+        assert r.status_code == 304
+        r = requests.get(f"{base}/todos?completed=false", headers=dict(headers, **{"If-None-Match": etag}), timeout=2)
+        assert r.status_code == 200
+
+        r = requests.get(f"{base}/todos/changes", headers=headers, timeout=2)
+        since = r.json()["version"]
+        requests.delete(f"{base}/todos/{tid}", headers=headers, timeout=2)
+        r = requests.get(f"{base}/todos", headers=dict(headers, **{"If-None-Match": etag}), timeout=2)
+        assert r.status_code == 200 and r.json() == []
+        r = requests.get(f"{base}/todos/changes", params={"since": since}, headers=headers, timeout=2)
+        assert r.json() == {"version": since + 1, "upserts": [], "deletes": [tid]}
+    finally:
+        stop_server(proc, db_path)
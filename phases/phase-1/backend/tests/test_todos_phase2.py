@@ -2,15 +2,17 @@ import os
 import tempfile
 import subprocess
 import time
+import pytest
 import requests
 
 
-def start_server():
+def start_server(storage="sql"):
     fd, path = tempfile.mkstemp(suffix=".db")
     os.close(fd)
     db_url = f"sqlite:///{path}"
     env = os.environ.copy()
     env["DATABASE_URL"] = db_url
+    env["STORAGE_BACKEND"] = storage
     import sys
     python_exec = sys.executable
     port = "8003"
@@ -41,8 +43,9 @@ def stop_server(proc, path):
         pass
 
 
-def test_filtering_and_sorting():
-    proc, base, db_path = start_server()
+@pytest.mark.parametrize("storage", ["sql", "memory"])
+def test_filtering_and_sorting(storage):
+    proc, base, db_path = start_server(storage)
     try:
         # create user
         r = requests.post(f"{base}/users", json={"username": "bob"}, timeout=2)
@@ -68,5 +71,20 @@ def test_filtering_and_sorting():
         todos = r.json()
         dates = [t.get("due_date") for t in todos if t.get("due_date")]
         assert dates == sorted(dates)
+
+        # The unpaged list is the pages concatenated, undated todos last.
+        requests.post(f"{base}/todos", json={"title": "D"}, headers=headers, timeout=2)
+        for sort in ("due_date", "-due_date", "priority", None):
+            params = {"sort": sort} if sort else {}
+            listed = [t["id"] for t in requests.get(f"{base}/todos", params=params, headers=headers, timeout=2).json()]
+            paged, cursor = [], None
+            while True:
+                r = requests.get(f"{base}/todos", params=dict(params, limit=1, **({"after": cursor} if cursor else {})), headers=headers, timeout=2)
+                paged.extend(t["id"] for t in r.json())
+                cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            assert listed == paged and len(listed) == 4
+        assert requests.get(f"{base}/todos?sort=title", headers=headers, timeout=2).status_code == 400
     finally:
         stop_server(proc, db_path)
@@ -0,0 +1,69 @@
+import time
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud
+from app.models import TodoCreate, User
+
+
+def test_users_exist_probe_stops_once_true():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    with Session(engine) as session:
+        assert crud.users_exist(session) is False
+        assert crud.users_exist(session) is False
+        assert len(statements) == 1  # "no users" is kept for the recheck window
+
+        crud.create_user(session, username="frank", token="tok-f")
+        statements.clear()
+        assert crud.users_exist(session) is True
+        assert statements == []
+
+
+def test_anonymous_create_skips_the_users_probe():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    with Session(engine) as session:
+        assert crud.users_exist(session) is False
+        crud.create_todo(session, TodoCreate(title="first"))
+        statements.clear()
+        # What POST /todos runs for an anonymous caller.
+        assert crud.users_exist(session) is False
+        crud.create_todo(session, TodoCreate(title="second"))
+        assert statements and not any("FROM user" in s or 'FROM "user"' in s for s in statements)
+
+
+def test_users_created_elsewhere_are_detected(monkeypatch):
+    monkeypatch.setattr(crud, "USERS_RECHECK_SECONDS", 0.05)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        assert crud.users_exist(session) is False
+        # another worker process inserts a user directly
+        session.execute(User.__table__.insert().values(id=uuid4(), username="gina", token="tok-g", created_at=datetime.utcnow()))
+        session.commit()
+        time.sleep(0.1)
+        assert crud.users_exist(session) is True
+
+
+def test_users_exist_is_tracked_per_engine():
+    engines = []
+    for _ in range(2):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        SQLModel.metadata.create_all(engine)
+        engines.append(engine)
+    with Session(engines[0]) as session:
+        crud.create_user(session, username="hana", token="tok-h")
+        assert crud.users_exist(session) is True
+    with Session(engines[1]) as session:
+        assert crud.users_exist(session) is False
@@ -0,0 +1,311 @@
+"""API load benchmark: mixed workload at the HTTP level and in-process.
+
+Seeds `--users` users with `--todos` todos each (through `POST /users` and
+`POST /todos:batch`), then runs `--requests` operations from `--concurrency`
+concurrent clients. Each operation is drawn from a weighted mix of list,
+create, update, delete and chat (rule-based parser; `AI_API_KEY` is ignored).
+The workload is deterministic for a given `--seed`.
+
+Modes:
+
+- http: the backend under uvicorn in a subprocess, driven over TCP;
+- inprocess: the ASGI app called directly through httpx, which leaves out
+  the network and the server and measures the app alone.
+
+The database is dropped and recreated before each mode. The default is a
+temporary SQLite file; pass `--database-url postgresql://user@localhost/bench`
+(or `postgresql+asyncpg://...`) to run on a local Postgres. Nothing needs
+network access beyond localhost.
+
+Reports p50/p95/p99 latency per operation and the throughput. `--output`
+writes the results as JSON. `--baseline` compares against a stored result and
+exits with status 1 when an operation's p95 or a mode's throughput is worse
+by more than `--threshold`; it refuses (status 2, before running anything)
+when the baseline was recorded with a different configuration or database,
+unless `--force` is given. Baselines live in scripts/baselines/ (SQLite
+only). Run from the repo root:
+
+    python scripts/bench_api.py [--mode both] [--users 20] [--todos 200] [--requests 3000]
+    python scripts/bench_api.py --baseline scripts/baselines/bench_api_sqlite.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND = ROOT / "phases" / "phase-1" / "backend"
+sys.path.insert(0, str(BACKEND))
+
+import httpx
+
+DEFAULT_MIX = "list=50,create=20,update=15,delete=10,chat=5"
+SEED_BATCH = 1000
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("list", "create", "update", "delete", "chat"):
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        mix[name] = int(weight)
+    return mix
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of sorted `values`."""
+    return values[max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))]
+
+
+def reset_database(url: str) -> None:
+    from sqlalchemy import create_engine
+    from sqlmodel import SQLModel
+
+    from app.database import init_db, sync_url
+
+    engine = create_engine(sync_url(url))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS todo_fts")
+    SQLModel.metadata.drop_all(engine)
+    engine.dispose()
+    init_db(url)
+
+
+class Workload:
+    """Shared state of one run: the seeded users, their todo ids and the
+    latencies recorded per operation."""
+
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.users = []  # (auth headers, [todo ids])
+        self.latencies = {name: [] for name in self.mix}
+        self.errors = {name: 0 for name in self.mix}
+        self.issued = 0
+
+    async def seed(self) -> None:
+        tag = time.time_ns()
+        for u in range(self.args.users):
+            r = await self.client.post("/users", json={"username": f"bench-{tag}-{u}"})
+            r.raise_for_status()
+            headers = {"Authorization": f"Token {r.json()['token']}"}
+            ids = []
+            for start in range(0, self.args.todos, SEED_BATCH):
+                ops = [
+                    {"op": "create", "data": {"title": f"seed {i}", "description": "seeded", "priority": i % 5,
+                                              "status": "completed" if i % 4 == 0 else "pending"}}
+                    for i in range(start, min(start + SEED_BATCH, self.args.todos))
+                ]
+                r = await self.client.post("/todos:batch", json={"operations": ops}, headers=headers)
+                r.raise_for_status()
+                ids.extend(item["id"] for item in r.json()["results"])
+            self.users.append((headers, ids))
+
+    async def run_op(self, rng: random.Random, name: str) -> None:
+        headers, ids = rng.choice(self.users)
+        n = self.issued
+        if name in ("update", "delete") and not ids:
+            name = "create"
+        if name == "list":
+            params = {"limit": 50} if n % 2 else {"limit": 50, "completed": "false"}
+            call, expect = self.client.get("/todos", params=params, headers=headers), 200
+        elif name == "create":
+            call, expect = self.client.post("/todos", json={"title": f"bench {n}"}, headers=headers), 201
+        elif name == "update":
+            todo_id = rng.choice(ids)
+            body = {"title": f"updated {n}", "status": rng.choice(["pending", "completed"])}
+            call, expect = self.client.put(f"/todos/{todo_id}", json=body, headers=headers), 200
+        elif name == "delete":
+            todo_id = ids.pop(rng.randrange(len(ids)))
+            call, expect = self.client.delete(f"/todos/{todo_id}", headers=headers), 204
+        else:
+            message = "list todos" if n % 2 else f"add todo chat {n}"
+            call, expect = self.client.post("/chat", json={"message": message}, headers=headers), 200
+        start = time.perf_counter()
+        r = await call
+        self.latencies[name].append(time.perf_counter() - start)
+        if r.status_code != expect:
+            self.errors[name] += 1
+        elif name == "create":
+            ids.append(r.json()["id"])
+
+    async def worker(self, index: int, count: int) -> None:
+        rng = random.Random(self.args.seed * 1000 + index)
+        names, weights = list(self.mix), list(self.mix.values())
+        for _ in range(count):
+            self.issued += 1
+            await self.run_op(rng, rng.choices(names, weights)[0])
+
+    async def run(self) -> dict:
+        await self.seed()
+        if self.args.warmup:
+            await asyncio.gather(*(self.worker(-1 - i, self.args.warmup // self.args.concurrency)
+                                   for i in range(self.args.concurrency)))
+            self.latencies = {name: [] for name in self.mix}
+            self.errors = {name: 0 for name in self.mix}
+        per_worker, extra = divmod(self.args.requests, self.args.concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*(self.worker(i, per_worker + (i < extra)) for i in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - start
+        ops = {}
+        for name, values in self.latencies.items():
+            if not values:
+                continue
+            values.sort()
+            ops[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+            }
+        total = sum(op["count"] for op in ops.values())
+        return {"requests": total, "seconds": round(elapsed, 3), "throughput": round(total / elapsed, 1), "ops": ops}
+
+
+def start_server(url: str, port: int, workers: int = 1):
+    env = dict(os.environ, DATABASE_URL=url)
+    env.pop("AI_API_KEY", None)
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning", "--workers", str(workers)]
+    proc = subprocess.Popen(cmd, cwd=BACKEND, env=env)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{base}/health", timeout=1)
+            return proc, base
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server failed to start")
+
+
+async def run_http(args) -> dict:
+    proc, base = start_server(args.database_url, args.port)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+            return await Workload(client, args).run()
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def run_inprocess(args) -> dict:
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+            return await Workload(client, args).run()
+    finally:
+        await app.router.shutdown()
+
+
+def compare(results: dict, baseline: dict, threshold: float, noise_ms: float) -> list:
+    """Regressions of `results` against `baseline` as printable lines."""
+    problems = []
+    for mode, current in results["modes"].items():
+        base = baseline.get("modes", {}).get(mode)
+        if base is None:
+            continue
+        if current["throughput"] < base["throughput"] * (1 - threshold):
+            problems.append(f"{mode}: throughput {current['throughput']}/s vs baseline {base['throughput']}/s")
+        for name, op in current["ops"].items():
+            base_op = base["ops"].get(name)
+            if base_op is None:
+                continue
+            limit = max(base_op["p95_ms"] * (1 + threshold), base_op["p95_ms"] + noise_ms)
+            if op["p95_ms"] > limit:
+                problems.append(f"{mode} {name}: p95 {op['p95_ms']} ms vs baseline {base_op['p95_ms']} ms")
+            if op["errors"]:
+                problems.append(f"{mode} {name}: {op['errors']} unexpected responses")
+    return problems
+
+
+def report(mode: str, result: dict) -> None:
+    print(f"\n{mode}: {result['requests']} requests in {result['seconds']}s, {result['throughput']} req/s")
+    print(f"  {'op':<8}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, op in result["ops"].items():
+        print(f"  {name:<8}{op['count']:>7}{op['errors']:>8}{op['p50_ms']:>10.2f}{op['p95_ms']:>10.2f}{op['p99_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("http", "inprocess", "both"), default="both")
+    parser.add_argument("--database-url", help="default: a temporary SQLite file")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--todos", type=int, default=200, help="seeded todos per user")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8130)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--noise-ms", type=float, default=2.0, help="p95 changes below this are ignored")
+    parser.add_argument("--force", action="store_true", help="compare even when the baseline config differs")
+    args = parser.parse_args()
+
+    tmp = None
+    if not args.database_url:
+        fd, tmp = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        args.database_url = f"sqlite:///{tmp}"
+    # Read by app.database at import, so set before the app is imported.
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.pop("AI_API_KEY", None)
+
+    modes = ("http", "inprocess") if args.mode == "both" else (args.mode,)
+    config = {k: getattr(args, k) for k in ("users", "todos", "requests", "warmup", "concurrency", "mix", "seed")}
+    config["database"] = args.database_url.split(":", 1)[0]
+    results = {"config": config, "modes": {}}
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    if baseline is not None and baseline.get("config") != config:
+        print(f"baseline was recorded with {baseline.get('config')}")
+        print(f"this run uses          {config}")
+        if not args.force:
+            if tmp:
+                os.remove(tmp)
+            print("refusing to compare different configurations (--force to compare anyway)", file=sys.stderr)
+            sys.exit(2)
+        print("comparing anyway (--force)")
+    try:
+        for mode in modes:
+            reset_database(args.database_url)
+            runner = run_http if mode == "http" else run_inprocess
+            results["modes"][mode] = asyncio.run(runner(args))
+            report(mode, results["modes"][mode])
+    finally:
+        if tmp:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(tmp + suffix):
+                    os.remove(tmp + suffix)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+    if baseline is not None:
+        problems = compare(results, baseline, args.threshold, args.noise_ms)
+        print("\nregressions:" if problems else f"\nno regressions beyond {args.threshold:.0%} of {args.baseline}")
+        for line in problems:
+            print(f"  {line}")
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Micro-benchmark: rule-based chat parser throughput (messages/second).
+
+Compares the single-pass parser in `app.intents` (what `chat._rule_based_parse`
+uses) with the previous startswith/split implementation, kept below as the
+baseline, both on their own and through `parse_chat` (which used to
+round-trip every intent through `handle_chat` and `TodoCreate`). Run from the
+repo root with `AI_API_KEY` unset:
+
+    python scripts/bench_chat_parser.py [--seconds 1.0]
+
+Measured here (--seconds 2): the table parser alone is a little slower than
+the startswith chain (about 425k vs 460-500k msg/s); `parse_chat` runs about
+140k msg/s against 68k for the previous path, about 2x; a message of 8
+commands parses at about 330k commands/s.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND = ROOT / "phases" / "phase-1" / "backend"
+sys.path.insert(0, str(BACKEND))
+
+from app import intents, metrics
+from app.chat import _call_llm, parse_chat
+from app.models import TodoCreate
+
+
+def legacy_rule_based_parse(message: str):
+    """The parser `chat._rule_based_parse` used before `app.intents`."""
+    m = message.strip().lower()
+    if m.startswith("create todo") or m.startswith("add todo"):
+        if ":" in message:
+            parts = message.split(":", 1)
+            if len(parts) == 2:
+                title_desc = parts[1].split("|", 1)
+                title = title_desc[0].strip()
+                desc = title_desc[1].strip() if len(title_desc) > 1 else ""
+                return ("create", {"title": title, "description": desc})
+        tokens = message.split()
+        if len(tokens) >= 3:
+            title = " ".join(tokens[2:]).strip()
+            return ("create", {"title": title, "description": ""})
+    if m.startswith("list todos") or m.startswith("show todos"):
+        return ("list", {})
+    if m.startswith("delete todo"):
+        parts = message.split()
+        if len(parts) >= 3:
+            return ("delete", {"id": parts[2]})
+    if m.startswith("update todo"):
+        parts = message.split(":", 1)
+        if len(parts) == 2:
+            left = parts[0].split()
+            tid = left[2] if len(left) >= 3 else None
+            fields = parts[1].split("|")
+            title = fields[0].strip() if len(fields) > 0 else None
+            desc = fields[1].strip() if len(fields) > 1 else None
+            status = fields[2].strip() if len(fields) > 2 else None
+            data = {k: v for k, v in [("title", title), ("description", desc), ("status", status)] if v}
+            return ("update", {"id": tid, "data": data})
+        tokens = message.split()
+        if len(tokens) >= 5:
+            tid = tokens[2]
+            field = tokens[3].lower()
+            value = " ".join(tokens[4:]).strip()
+            if field in ("title", "description", "status"):
+                return ("update", {"id": tid, "data": {field: value}})
+    return ("unknown", {})
+
+
+def legacy_parse_chat(message: str):
+    """The previous `parse_chat`: build the LLM prompt and try `_call_llm`
+    (an `AI_API_KEY` lookup when unset), parse, build a result dict through
+    `handle_chat` (validating creates with `TodoCreate`), then translate the
+    result back into (intent, payload). It also counts the fallback as
+    `parse_chat` now does, so both pay the same fixed costs."""
+    llm_prompt = f"Interpret this user message as a Todo intent and return a JSON object with intent and payload: {message}"
+    if _call_llm(llm_prompt) is None:
+        metrics.CHAT_FALLBACKS.inc("sync", "disabled")
+    intent, payload = legacy_rule_based_parse(message)
+    if intent == "create":
+        todo_in = TodoCreate(**payload)
+        out = {"result": "created", "todo": {"title": todo_in.title, "description": todo_in.description}}
+    elif intent == "list":
+        out = {"result": "list", "todos": []}
+    elif intent == "delete":
+        out = {"result": "delete_requested", "id": payload.get("id")}
+    elif intent == "update":
+        out = {"result": "update_requested", "payload": payload}
+    else:
+        out = {"result": "unknown"}
+    if out.get("result") == "created":
+        return "create", {"title": out["todo"]["title"], "description": out["todo"].get("description", "")}
+    if out.get("result") == "list":
+        return "list", {}
+    if out.get("result") == "delete_requested":
+        return "delete", {"id": out.get("id")}
+    if out.get("result") == "update_requested":
+        return "update", out.get("payload", {})
+    return "unknown", {}
+
+
+TID = "5f0c6a9e-3b1d-4a62-9f43-1c2d3e4f5a6b"
+CORPUS = [
+    "create todo: Buy milk | 2L semi-skimmed",
+    "add todo Buy AI milk",
+    "List todos",
+    "show todos",
+    f"delete todo {TID}",
+    f"update todo {TID}: Buy bread | wholemeal | completed",
+    f"update todo {TID} title Buy bread",
+    "what is the weather like today",
+]
+
+
+def throughput(parse, seconds: float) -> float:
+    """Calls of `parse` per second, over the messages of `CORPUS`."""
+    n, deadline = 0, time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for message in CORPUS:
+            parse(message)
+        n += len(CORPUS)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per parser")
+    args = parser.parse_args()
+
+    mismatches = [m for m in CORPUS if legacy_rule_based_parse(m) != intents.parse_first(m)]
+    if mismatches:
+        print("parsers disagree on:", mismatches)
+        sys.exit(1)
+
+    rows = [
+        ("legacy _rule_based_parse", throughput(legacy_rule_based_parse, args.seconds), "msg/s"),
+        ("intents.parse_first", throughput(intents.parse_first, args.seconds), "msg/s"),
+        ("legacy parse_chat", throughput(legacy_parse_chat, args.seconds), "msg/s"),
+        ("parse_chat", throughput(parse_chat, args.seconds), "msg/s"),
+    ]
+    multi_msg = "; ".join(CORPUS)
+    # Each call parses one message holding every corpus command.
+    multi = throughput(lambda _m: intents.parse_commands(multi_msg), args.seconds) * len(CORPUS)
+    rows.append((f"intents.parse_commands ({len(CORPUS)} cmds/msg)", multi, "cmd/s"))
+    for name, rate, unit in rows:
+        print(f"{name:<40} {rate:12,.0f} {unit}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Create throughput with and without group commit (`GROUP_COMMIT`).
+
+Starts the backend under uvicorn twice on a fresh temporary SQLite file,
+once committing every `POST /todos` on its own and once with group commit,
+and fires `--requests` creates from `--concurrency` concurrent clients
+spread over `--users` users. Reports creates per second, p50/p95/p99
+latency and, for group commit, the average group size read from
+`/metrics`. `--synchronous` sets `SQLITE_SYNCHRONOUS` for both runs (FULL by
+default, i.e. an fsync per commit). Run from the repo root:
+
+    python scripts/bench_group_commit.py [--requests 5000] [--concurrency 64] [--window-ms 2]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from bench_api import percentile, reset_database, start_server
+
+
+async def drive(base: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+        users = []
+        for u in range(args.users):
+            r = await client.post("/users", json={"username": f"group-{time.time_ns()}-{u}"})
+            r.raise_for_status()
+            users.append({"Authorization": f"Token {r.json()['token']}"})
+        latencies, errors = [], 0
+        counter = iter(range(args.requests))
+
+        async def worker():
+            nonlocal errors
+            for n in counter:
+                start = time.perf_counter()
+                try:
+                    r = await client.post("/todos", json={"title": f"create {n}"}, headers=users[n % len(users)])
+                    errors += r.status_code != 201
+                except httpx.TransportError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        metrics = {}
+        for line in (await client.get("/metrics")).text.splitlines():
+            if line.startswith("group_commit_size_"):
+                name, value = line.rsplit(" ", 1)
+                metrics[name] = float(value)
+    latencies.sort()
+    result = {
+        "throughput": round(len(latencies) / elapsed, 1),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+    if metrics.get("group_commit_size_count"):
+        result["avg_group"] = round(metrics["group_commit_size_sum"] / metrics["group_commit_size_count"], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--window-ms", default="2", help="GROUP_COMMIT_WINDOW_MS for the group commit run")
+    parser.add_argument("--max-items", default="256", help="GROUP_COMMIT_MAX_ITEMS for the group commit run")
+    parser.add_argument("--synchronous", default="FULL", help="SQLITE_SYNCHRONOUS for both runs")
+    parser.add_argument("--port", type=int, default=8131)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    url = f"sqlite:///{path}"
+    # start_server passes os.environ on to uvicorn; requests must not wait
+    # for a pooled connection behind the clients' own.
+    os.environ.update(SQLITE_SYNCHRONOUS=args.synchronous, DB_POOL_SIZE=str(args.concurrency),
+                      GROUP_COMMIT_WINDOW_MS=args.window_ms, GROUP_COMMIT_MAX_ITEMS=args.max_items)
+    results = {}
+    try:
+        for name, enabled in (("per-request", "0"), ("group", "1")):
+            reset_database(url)
+            os.environ["GROUP_COMMIT"] = enabled
+            proc, base = start_server(url, args.port)
+            try:
+                results[name] = asyncio.run(drive(base, args))
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"\n{args.requests} creates, {args.concurrency} clients, synchronous={args.synchronous}")
+    print(f"  {'commit':<13}{'creates/s':>10}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'avg group':>11}")
+    for name, r in results.items():
+        print(f"  {name:<13}{r['throughput']:>10}{r['errors']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+              f"{r.get('avg_group', 1):>11}")
+    base, group = results["per-request"]["throughput"], results["group"]["throughput"]
+    print(f"\ngroup commit: {group / base:.1f}x the creates per second")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark: `GET /todos` list serialization at 1k, 10k and 100k rows.
+
+Compares, on an in-memory SQLite database with one owner's todos:
+
+- response_model: ORM objects through FastAPI's `serialize_response` for
+  `List[TodoRead]` (validation + `jsonable_encoder`) and `JSONResponse`,
+  i.e. what the endpoint did before;
+- rows + stdlib: `crud.list_todos(..., as_rows=True)` encoded with `json`;
+- rows + orjson: the same rows encoded with orjson (the default path).
+
+Times include the query. Run from the repo root:
+
+    python scripts/bench_serialization.py [--sizes 1000 10000 100000] [--repeat 3]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+from uuid import uuid4
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND = ROOT / "phases" / "phase-1" / "backend"
+sys.path.insert(0, str(BACKEND))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import crud, serialization
+from app.models import Status, Todo, TodoRead, User
+
+RESPONSE_FIELD = create_response_field(name="Response_list_todos", type_=List[TodoRead])
+
+
+def make_session(rows: int) -> Session:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+    owner = User(username="bench", token="bench")
+    session.add(owner)
+    session.commit()
+    now = datetime(2026, 1, 1)
+    session.execute(Todo.__table__.insert(), [
+        {
+            "id": uuid4(), "owner_id": owner.id, "title": f"todo {i}", "description": "some description text",
+            "status": Status.completed if i % 3 == 0 else Status.pending, "priority": i % 5,
+            "due_date": now + timedelta(hours=i) if i % 2 else None,
+            "created_at": now, "updated_at": now, "change_version": 1,
+        }
+        for i in range(rows)
+    ])
+    session.commit()
+    session.owner_id = owner.id
+    return session
+
+
+def response_model(session: Session) -> bytes:
+    session.expunge_all()  # force hydration every run, as a fresh request would
+    todos = crud.list_todos(session, owner=session.get(User, session.owner_id))
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=todos))
+    return JSONResponse(content).body
+
+
+def rows_stdlib(session: Session) -> bytes:
+    rows = crud.list_todos(session, owner=session.get(User, session.owner_id), as_rows=True)
+    return serialization.dumps_stdlib(serialization.todo_row_dicts(rows))
+
+
+def rows_orjson(session: Session) -> bytes:
+    rows = crud.list_todos(session, owner=session.get(User, session.owner_id), as_rows=True)
+    return serialization.encode_todo_rows(rows)
+
+
+def best_of(fn, session: Session, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(session)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = [("response_model", response_model), ("rows + stdlib", rows_stdlib)]
+    if serialization.orjson is not None:
+        paths.append(("rows + orjson", rows_orjson))
+    print(f"{'rows':>8}  " + "  ".join(f"{name:>16}" for name, _ in paths) + "  speedup")
+    for size in args.sizes:
+        session = make_session(size)
+        timings = [best_of(fn, session, args.repeat) for _, fn in paths]
+        session.close()
+        cells = "  ".join(f"{t * 1000:13.1f} ms" for t in timings)
+        print(f"{size:>8}  {cells}  {timings[0] / timings[-1]:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Create throughput against the shard count (`DB_SHARDS`).
+
+Starts the backend under uvicorn once per `--shards` value, each time on a
+fresh temporary directory (the main `database.db` plus its shard files), and
+fires `--requests` creates from `--concurrency` concurrent clients spread
+over `--users` users, so that every shard gets writers. Reports creates per
+second and p50/p95/p99 latency per shard count. `--synchronous` sets
+`SQLITE_SYNCHRONOUS` (FULL by default: every commit waits for its fsync
+while holding its database's write lock, which is the lock sharding
+splits). `--workers` runs several uvicorn workers; `--group-commit` turns on
+`GROUP_COMMIT` for every run. Run from the repo root:
+
+    python scripts/bench_shards.py [--shards 0,2,4] [--requests 5000] [--concurrency 64] [--workers 1]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+
+from bench_api import start_server
+from bench_group_commit import drive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", default="0,2,4", help="comma-separated DB_SHARDS values to compare")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--group-commit", action="store_true", help="run with GROUP_COMMIT=1")
+    parser.add_argument("--synchronous", default="FULL", help="SQLITE_SYNCHRONOUS for every run")
+    parser.add_argument("--port", type=int, default=8132)
+    args = parser.parse_args()
+
+    # start_server passes os.environ on to uvicorn; requests must not wait
+    # for a pooled connection behind the clients' own.
+    os.environ.update(SQLITE_SYNCHRONOUS=args.synchronous, DB_POOL_SIZE=str(args.concurrency),
+                      GROUP_COMMIT="1" if args.group_commit else "0")
+    results = {}
+    for spec in args.shards.split(","):
+        tmp = tempfile.mkdtemp()
+        os.environ["DB_SHARDS"] = spec
+        proc, base = start_server(f"sqlite:///{os.path.join(tmp, 'database.db')}", args.port, args.workers)
+        try:
+            results[spec] = asyncio.run(drive(base, args))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"\n{args.requests} creates, {args.concurrency} clients, {args.users} users, {args.workers} worker(s), "
+          f"synchronous={args.synchronous}, group commit {'on' if args.group_commit else 'off'}")
+    print(f"  {'shards':<8}{'creates/s':>10}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for spec, r in results.items():
+        print(f"  {spec:<8}{r['throughput']:>10}{r['errors']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+    first = next(iter(results.values()))["throughput"]
+    for spec, r in list(results.items())[1:]:
+        print(f"\n{spec} shards: {r['throughput'] / first:.1f}x the creates per second of {args.shards.split(',')[0]}",
+              end="")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Check that the todo list and filter queries are served by indexes.
+
+Builds a temporary SQLite database with `alembic upgrade head`, seeds it
+(`--todos` per user, then ANALYZE so the planner sees realistic statistics),
+runs each list/filter path through the real `crud`, `sync` and `stats` code
+while capturing the SQL it emits, and prints `EXPLAIN QUERY PLAN` for every
+statement. A statement that scans `todo` or `user` without an index fails
+the check (exit status 1); sorts done in a temp B-tree instead of by an
+index are reported but allowed. Run from the repo root:
+
+    python scripts/check_query_plans.py [--todos 2000] [--verbose]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND = ROOT / "phases" / "phase-1" / "backend"
+sys.path.insert(0, str(BACKEND))
+
+FULL_SCAN = re.compile(r"^SCAN (todo|user)$")
+TEMP_SORT = "USE TEMP B-TREE"
+
+
+def migrate(url: str) -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(BACKEND / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND / "alembic"))
+    command.upgrade(config, "head")
+
+
+def seed(engine, todos: int):
+    from sqlmodel import Session
+
+    from app.models import Status, Todo, User
+    from app.stats import ensure_todo_stats
+
+    now = datetime(2026, 1, 1)
+    with Session(engine) as session:
+        users = [User(username=f"plans-{i}") for i in range(5)]
+        session.add_all(users)
+        session.commit()
+        for user in users:
+            session.execute(Todo.__table__.insert(), [
+                {
+                    "id": uuid4(), "owner_id": user.id, "title": f"todo {i}", "description": None,
+                    "status": Status.completed if i % 4 == 0 else Status.pending, "priority": i % 5,
+                    "due_date": now + timedelta(days=i % 30) if i % 3 else None,
+                    "created_at": now + timedelta(minutes=i), "updated_at": now, "change_version": i,
+                }
+                for i in range(todos)
+            ])
+        session.commit()
+        token, owner_id = users[0].token, users[0].id
+    ensure_todo_stats(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return token, owner_id
+
+
+def query_paths(token: str, owner_id):
+    """(label, fn(session)) for every list and filter path."""
+    from app import crud, stats, sync
+    from app.models import User
+
+    def owner(session):
+        return session.get(User, owner_id)
+
+    def page(sort, completed=None, anonymous=False):
+        def run(session):
+            who = None if anonymous else owner(session)
+            _, cursor = crud.list_todos_page(session, owner=who, completed=completed, sort_by=sort, limit=50)
+            crud.list_todos_page(session, owner=who, completed=completed, sort_by=sort, limit=50, after=cursor)
+        return run
+
+    paths = [
+        ("get_user_by_token", lambda s: crud.get_user_by_token(s, token)),
+        ("list_todos owner", lambda s: crud.list_todos(s, owner=owner(s), as_rows=True)),
+        ("list_todos owner completed", lambda s: crud.list_todos(s, owner=owner(s), completed=True, as_rows=True)),
+        ("list_todos owner pending", lambda s: crud.list_todos(s, owner=owner(s), completed=False, as_rows=True)),
+        ("list_todos owner sort=due_date", lambda s: crud.list_todos(s, owner=owner(s), sort_by="due_date")),
+        ("list_todos owner sort=-due_date", lambda s: crud.list_todos(s, owner=owner(s), sort_by="-due_date")),
+        ("list_todos owner completed sort=due_date",
+         lambda s: crud.list_todos(s, owner=owner(s), completed=True, sort_by="due_date")),
+    ]
+    for field in crud.SORT_FIELDS:
+        for sort in (field, f"-{field}"):
+            paths.append((f"list_todos_page owner sort={sort}", page(sort)))
+        paths.append((f"list_todos_page owner completed sort={field}", page(field, completed=True)))
+    paths += [
+        ("list_todos_page anonymous sort=created_at", page("created_at", anonymous=True)),
+        ("changes_since owner", lambda s: sync.changes_since(s, owner(s), 10)),
+        ("todo_stats owner", lambda s: stats.todo_stats(s, owner(s))),
+    ]
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--todos", type=int, default=2000, help="todos per user")
+    parser.add_argument("--verbose", action="store_true", help="print every plan, not just the summary")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = url  # read by alembic/env.py and app.database
+    try:
+        migrate(url)
+        from sqlalchemy import event
+        from sqlmodel import Session
+
+        from app.database import create_app_engine
+
+        engine = create_app_engine(url)
+        token, owner_id = seed(engine, args.todos)
+        captured = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                captured.append((statement, parameters))
+
+        failures = 0
+        for label, fn in query_paths(token, owner_id):
+            captured.clear()
+            with Session(engine) as session:
+                fn(session)
+            statements = list(captured)
+            with engine.connect() as conn:
+                plans = [
+                    [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)]
+                    for sql, params in statements
+                ]
+            steps = [step for plan in plans for step in plan]
+            scans = [s for s in steps if FULL_SCAN.match(s)]
+            sorts = [s for s in steps if s.startswith(TEMP_SORT)]
+            status = "FAIL" if scans else ("sort" if sorts else "ok")
+            failures += bool(scans)
+            print(f"{status:>4}  {label}")
+            if args.verbose or scans or sorts:
+                for (sql, _), plan in zip(statements, plans):
+                    if args.verbose:
+                        print("        " + " ".join(sql.split())[:160])
+                    for step in plan:
+                        print(f"          {step}")
+        engine.dispose()
+    finally:
+        os.remove(path)
+    print(f"\n{failures} path(s) with full table scans" if failures else "\nevery path uses an index")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,36 @@
 
 Run with the workspace Python virtualenv from the repo root:
 
-    python scripts/console_app.py
+    python scripts/console_app.py [--memory]
 
-This imports the app's DB helpers and performs CRUD directly in-process.
+This imports the app's storage layer and performs CRUD directly in-process,
+on the database by default or, with `--memory` (or `STORAGE_BACKEND=memory`),
+on a throwaway in-memory store.
 """
 from pathlib import Path
 import sys
+from uuid import UUID
 ROOT = Path(__file__).resolve().parents[1]
 BACKEND = ROOT / "phases" / "phase-1" / "backend"
 sys.path.insert(0, str(BACKEND))
 
-from app.database import init_db, get_session
-from app import crud
-from app.models import TodoCreate
+from app.database import init_db
+from app.models import TodoCreate, User
+from app.storage import SQLStore, load_store
 
-def repl():
-    init_db()
+def find(store, tid):
+    try:
+        return store.get_todo(UUID(tid))
+    except ValueError:
+        return None
+
+def as_owner(t):
+    # The console acts for whoever owns the todo.
+    return User(id=t.owner_id) if t.owner_id else None
+
+def repl(store):
+    if isinstance(store, SQLStore):
+        init_db()
     print("Todo console (type 'help')")
     while True:
         try:
@@ -34,28 +48,27 @@ def repl():
             print('commands: list, create <title>|<desc>, delete <id>, update <id>|<title>|<desc>')
             continue
         if cmd == 'list':
-            with get_session() as s:
-                todos = crud.list_todos(s)
-                for t in todos:
-                    print(f"{t.id} {t.title} [{t.status}] - {t.description}")
+            for t in store.list_todos():
+                print(f"{t.id} {t.title} [{t.status}] - {t.description}")
             continue
         if cmd.startswith('create '):
             rest = cmd[len('create '):]
             parts = rest.split('|',1)
             title = parts[0].strip()
             desc = parts[1].strip() if len(parts)>1 else ''
-            with get_session() as s:
-                todo = crud.create_todo(s, TodoCreate(title=title, description=desc))
-                print('created', todo.id)
+            todo = store.create_todo(TodoCreate(title=title, description=desc))
+            print('created', todo.id)
             continue
         if cmd.startswith('delete '):
             tid = cmd.split()[1]
-            with get_session() as s:
-                t = crud.get_todo(s, tid)
-                if not t:
-                    print('not found')
+            t = find(store, tid)
+            if not t:
+                print('not found')
+            else:
+                error = store.delete_todo_by_id(t.id, owner=as_owner(t))
+                if error:
+                    print('error', *error)
                 else:
-                    crud.delete_todo(s,t)
                     print('deleted')
             continue
         if cmd.startswith('update '):
@@ -67,15 +80,17 @@ def repl():
             tid = parts[0].strip()
             title = parts[1].strip() if len(parts)>1 else ''
             desc = parts[2].strip() if len(parts)>2 else ''
-            with get_session() as s:
-                t = crud.get_todo(s, tid)
-                if not t:
-                    print('not found')
+            t = find(store, tid)
+            if not t:
+                print('not found')
+            else:
+                _, error = store.update_todo_by_id(t.id, {'title': title or t.title, 'description': desc or t.description}, owner=as_owner(t))
+                if error:
+                    print('error', *error)
                 else:
-                    updated = crud.update_todo(s, t, TodoCreate(title=title or t.title, description=desc or t.description))
-                    print('updated', updated.id)
+                    print('updated', t.id)
             continue
         print('unknown command')
 
 if __name__ == '__main__':
-    repl()
+    repl(load_store('memory' if '--memory' in sys.argv[1:] else None))
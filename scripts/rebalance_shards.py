@@ -0,0 +1,151 @@
+"""Move owners' todos between shard layouts (`DB_SHARDS`).
+
+`--from` and `--to` take `DB_SHARDS` values: a shard count, a list of shard
+URLs, or `0` for the main database itself (the unsharded layout). Every
+owner found in the source layout whose place in the target layout is a
+different database is moved there with its todos, counters, tombstones and
+search entries. Typical uses:
+
+    # shard an existing database.db into four files
+    python scripts/rebalance_shards.py --from 0 --to 4
+    # add a fifth shard; consistent hashing moves only ~1/5 of the owners
+    python scripts/rebalance_shards.py --from 4 --to 5
+
+Each owner is copied in one transaction on the target (replacing anything
+already there for that owner) and then removed from the source in another,
+so an interrupted run can simply be repeated. Users stay in the main
+database. Stop the API while this runs: a write to an owner being moved
+would be lost. Run from the repo root; `--database-url` defaults to
+`DATABASE_URL` (or the app's default database file).
+"""
+import argparse
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+from uuid import UUID
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND = ROOT / "phases" / "phase-1" / "backend"
+sys.path.insert(0, str(BACKEND))
+
+
+def layout(spec: str, main_url: str) -> Dict[str, str]:
+    """{name: URL} for a `DB_SHARDS` value; the main database for `0`."""
+    from app.shards import shard_urls
+
+    return shard_urls(spec, main_url) or {"main": main_url}
+
+
+def owners_of(engine) -> set:
+    """Owner keys ("" for unowned) with counters or todos in `engine`."""
+    from sqlmodel import select
+
+    from app.models import Todo, TodoStats
+    from app.stats import owner_key
+
+    with engine.connect() as conn:
+        keys = set(conn.execute(select(TodoStats.owner_key)).scalars())
+        keys.update(owner_key(owner_id) for owner_id in conn.execute(select(Todo.owner_id).distinct()).scalars())
+    return keys
+
+
+def _owner_filter(column, owner_id: Optional[UUID]):
+    return column == owner_id if owner_id else column.is_(None)
+
+
+def move_owner(source, target, key: str) -> int:
+    """Copy owner `key`'s rows from `source` to `target`, then delete them
+    from `source`. Returns the number of todos moved."""
+    from sqlmodel import Session, select
+
+    from app import search
+    from app.models import Todo, TodoPriorityStats, TodoStats, TodoTombstone
+
+    todo, counters, tombstones = Todo.__table__, TodoStats.__table__, TodoTombstone.__table__
+    priorities = TodoPriorityStats.__table__
+    owner_id = UUID(hex=key) if key else None
+    with Session(source) as src:
+        rows = [dict(r) for r in src.execute(select(todo).where(_owner_filter(todo.c.owner_id, owner_id))).mappings()]
+        stat = src.execute(select(counters).where(counters.c.owner_key == key)).mappings().first()
+        by_priority = [dict(r) for r in src.execute(select(priorities).where(priorities.c.owner_key == key)).mappings()]
+        graves = [dict(r) for r in src.execute(select(tombstones).where(tombstones.c.owner_key == key)).mappings()]
+
+    with Session(target) as dst:
+        stale = dst.execute(select(todo.c.id).where(_owner_filter(todo.c.owner_id, owner_id))).scalars().all()
+        search.unindex_todos(dst, stale)
+        dst.execute(todo.delete().where(_owner_filter(todo.c.owner_id, owner_id)))
+        dst.execute(counters.delete().where(counters.c.owner_key == key))
+        dst.execute(priorities.delete().where(priorities.c.owner_key == key))
+        dst.execute(tombstones.delete().where(tombstones.c.owner_key == key))
+        if rows:
+            dst.execute(todo.insert(), rows)
+            search.index_todos(dst, rows)
+        if stat is not None:
+            dst.execute(counters.insert(), [dict(stat)])
+        if by_priority:
+            dst.execute(priorities.insert(), by_priority)
+        if graves:
+            dst.execute(tombstones.insert(), graves)
+        dst.commit()
+
+    with Session(source) as src:
+        search.unindex_todos(src, [row["id"] for row in rows])
+        src.execute(todo.delete().where(_owner_filter(todo.c.owner_id, owner_id)))
+        src.execute(counters.delete().where(counters.c.owner_key == key))
+        src.execute(priorities.delete().where(priorities.c.owner_key == key))
+        src.execute(tombstones.delete().where(tombstones.c.owner_key == key))
+        src.commit()
+    return len(rows)
+
+
+def rebalance(source_urls: Dict[str, str], target_urls: Dict[str, str], dry_run: bool = False) -> Dict[tuple, Counter]:
+    """Move every owner to its database in `target_urls`; returns the owners
+    and todos moved per (source, target) name pair."""
+    from app.database import create_app_engine, init_db
+    from app.shards import HashRing
+
+    ring = HashRing(list(target_urls))
+    if not dry_run:
+        for url in target_urls.values():
+            init_db(url)
+    engines = {url: create_app_engine(url) for url in {*source_urls.values(), *target_urls.values()}}
+    moved: Dict[tuple, Counter] = defaultdict(Counter)
+    try:
+        for source_name, source_url in source_urls.items():
+            for key in sorted(owners_of(engines[source_url])):
+                target_name = ring.node_for(key)
+                target_url = target_urls[target_name]
+                if target_url == source_url:
+                    continue
+                counts = moved[(source_name, target_name)]
+                counts["owners"] += 1
+                if not dry_run:
+                    counts["todos"] += move_owner(engines[source_url], engines[target_url], key)
+    finally:
+        for engine in engines.values():
+            engine.dispose()
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--from", dest="source", required=True, help="current DB_SHARDS value (0: unsharded)")
+    parser.add_argument("--to", dest="target", required=True, help="new DB_SHARDS value (0: back to unsharded)")
+    parser.add_argument("--database-url", help="main database URL (default: DATABASE_URL)")
+    parser.add_argument("--dry-run", action="store_true", help="only report which shards owners would move between")
+    args = parser.parse_args()
+
+    from app.database import SYNC_DATABASE_URL, sync_url
+
+    main_url = sync_url(args.database_url) if args.database_url else SYNC_DATABASE_URL
+    moved = rebalance(layout(args.source, main_url), layout(args.target, main_url), dry_run=args.dry_run)
+    if not moved:
+        print("nothing to move")
+    for (source, target), counts in sorted(moved.items()):
+        todos = " (dry run)" if args.dry_run else f", {counts['todos']} todos"
+        print(f"{source} -> {target}: {counts['owners']} owners{todos}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Drive many idle SSE subscribers against one uvicorn worker.
+
+Starts the backend on a temporary SQLite database (or uses --base), opens
+--subscribers connections to `GET /todos/events` for one user, creates a
+todo and measures how long it takes until every subscriber has received the
+`created` event. Reports connect time, fan-out latency and the server's RSS.
+Raise the open-file limit first (`ulimit -n 20000`). Run from the repo root:
+
+    python scripts/sse_idle_subscribers.py [--subscribers 10000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND = ROOT / "phases" / "phase-1" / "backend"
+
+
+def _request(base: str, method: str, path: str, body=None, token=None) -> dict:
+    req = urllib.request.Request(f"{base}{path}", method=method, data=json.dumps(body).encode() if body else None)
+    req.add_header("Content-Type", "application/json")
+    if token:
+        req.add_header("Authorization", f"Token {token}")
+    with urllib.request.urlopen(req, timeout=10) as r:
+        return json.loads(r.read() or b"null")
+
+
+def start_server(port: int):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning", "--backlog", "16384"]
+    proc = subprocess.Popen(cmd, cwd=BACKEND, env=env)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            _request(base, "GET", "/health")
+            return proc, base, path
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server failed to start")
+
+
+def rss_mib(pid: int) -> float:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+async def subscribe(host: str, port: int, token: str, ready: asyncio.Event, got: list, counter: dict):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"GET /todos/events HTTP/1.1\r\nHost: {host}\r\nAuthorization: Token {token}\r\n"
+        "Accept: text/event-stream\r\n\r\n".encode()
+    )
+    await writer.drain()
+    buf = b""
+    while b"retry:" not in buf:
+        buf += await reader.read(4096)
+    counter["connected"] += 1
+    if counter["connected"] == counter["target"]:
+        ready.set()
+    while b"event: created" not in buf:
+        chunk = await reader.read(4096)
+        if not chunk:
+            break
+        buf += chunk
+    got.append(time.perf_counter())
+    writer.close()
+
+
+async def run(base: str, subscribers: int):
+    host, port = base.split("//", 1)[1].split(":")
+    token = _request(base, "POST", "/users", {"username": f"sse-{time.time_ns()}"})["token"]
+    ready, got, counter = asyncio.Event(), [], {"connected": 0, "target": subscribers}
+    start = time.perf_counter()
+    tasks = []
+    for i in range(subscribers):
+        tasks.append(asyncio.create_task(subscribe(host, int(port), token, ready, got, counter)))
+        if i % 500 == 499:
+            await asyncio.sleep(0)  # let connects progress instead of one huge burst
+    await asyncio.wait_for(ready.wait(), 120)
+    connected = time.perf_counter() - start
+    await asyncio.sleep(1.0)
+    sent = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, _request, base, "POST", "/todos", {"title": "fan out"}, token)
+    await asyncio.wait_for(asyncio.gather(*tasks), 120)
+    latencies = sorted(t - sent for t in got)
+    return connected, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--base", help="use a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8120)
+    args = parser.parse_args()
+
+    proc = path = None
+    base = args.base
+    if not base:
+        proc, base, path = start_server(args.port)
+    try:
+        idle_rss = rss_mib(proc.pid) if proc else float("nan")
+        connected, latencies = asyncio.run(run(base, args.subscribers))
+        loaded_rss = rss_mib(proc.pid) if proc else float("nan")
+        n = len(latencies)
+        print(f"subscribers            : {n}")
+        print(f"connect all            : {connected:.2f}s")
+        print(f"fan-out p50 / p99 / max: {latencies[n // 2] * 1000:.0f} / {latencies[int(n * 0.99) - 1] * 1000:.0f} / {latencies[-1] * 1000:.0f} ms")
+        if proc:
+            print(f"server RSS idle/loaded : {idle_rss:.0f} / {loaded_rss:.0f} MiB")
+    finally:
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()